@@ -1,36 +1,114 @@
 # Holds the RULES dictionary with prompt templates, criteria metadata, and maps everything together
 
+import asyncio
+import json
 import os
+import re
 import sys
+import time
+from datetime import datetime, timedelta
+from functools import lru_cache
 
-from dotenv import load_dotenv
-load_dotenv(".env.local")
-
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, Header, HTTPException
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
-from agents import Agent, Runner, WebSearchTool, ModelSettings
 
 # givve access to the rule evaluation and prompt templates
 from .rules.rules_logic import RULES, RULES_BY_MODULE
-from .rules.rule_engine import evaluate_rule
+from .rules.rule_engine import RuleEngine, template_consistency
+from .rules.incremental import reevaluate
+from .rules.summary import LLM_FLAGS, compile_summary
+from .extract import JSON_BLOCK, IncrementalJSONParser, extract_json_from_markdown
+from .cache import build_content_cache, build_research_cache
+from .store import build_vetting_store
+from .companies import NameIndex, SingleFlight, canonicalize
+from .deals import DEAL_MAX_ENTITIES, DealSession
+from .gapfill import fill_gaps, missing_field_groups
+from .metrics import metrics, stage, usage_summary
+from .jobs import JOB_WORKERS, TERMINAL, WorkerPool, build_job_queue
+from .runner import run_agent_streamed
+from . import routing
+from .routing import ROUTE_MAX_UNKNOWN, route_stats, run_routed
+from .replay import AGENTS_REPLAY
+from .search import search_proxy, search_tools
 
 # Load OpenAI API key from environment
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 if not OPENAI_API_KEY:
     print("OPENAI_API_KEY not found in environment variables", file=sys.stderr)
-    raise ValueError("OPENAI_API_KEY must be set")
+
+def require_api_key():
+    # checked when an agent is first built rather than at import, so /ping still answers without a key
+    # replayed runs (AGENTS_REPLAY=replay) never reach the API and don't need one
+    if not OPENAI_API_KEY and AGENTS_REPLAY != "replay":
+        raise ValueError("OPENAI_API_KEY must be set")
 
 # Define request schemas
 class TopicsRequest(BaseModel):
     topics: list[str]
+    refresh: bool = False  # skip the research cache and re-vet from scratch
+    trace: bool = False  # add rule_trace: which case of each rule fired and on which values
+
+class BatchRequest(BaseModel):
+    topics: list[str]  # one "dealer: name" entry per company
+    concurrency: int = 8
+    timeout: float = 300.0  # seconds allowed per company
+    refresh: bool = False
+    trace: bool = False
+
+class DealRequest(BaseModel):
+    topics: list[str]  # the entities of one deal, e.g. ["manufacturer: x", "dealer: y", "asset: z"]
+    refresh: bool = False
+    trace: bool = False
+
+class ReevaluateRequest(BaseModel):
+    entity_type: str
+    company_name: str
+    structured_data: dict  # refreshed data, diffed against the latest stored result
 
 class FormatRequest(BaseModel):
     raw_content: str
     topics: list[str]
 
+class JobRequest(BaseModel):
+    kind: str = "research"  # "research", "report" or "deal"
+    topics: list[str]
+    refresh: bool = False
+    priority: int = 0  # higher runs first
+    trace: bool = False  # research jobs only
+    idempotency_key: str | None = None  # same key -> same job, never enqueued twice
+
 # Initialize FastAPI app with root path for Vercel
 app = FastAPI(title="AI Company Analysis Agents", root_path="/api/agents")
 
+# Caches, stores and the name index are opened on first use, not at import (same as the agents below)
+
+@lru_cache(maxsize=None)
+def get_research_cache():
+    # Cache of finished /research payloads, keyed on (entity_type, company_name) + research instructions hash
+    return build_research_cache()
+
+@lru_cache(maxsize=None)
+def get_section_cache():
+    # Per-rule risk summary sections, keyed on the rendered explanation so unchanged rules are never re-prompted
+    return build_content_cache("risk-section")
+
+@lru_cache(maxsize=None)
+def get_vetting_store():
+    # Append-only history of every finished vetting run, indexed for flag queries
+    return build_vetting_store()
+
+@lru_cache(maxsize=None)
+def get_company_index():
+    # Canonical names of every vetted company, so "OLYMPUS Corporation" resolves to the existing "olympus" entry
+    index = NameIndex()
+    for entity_type, company_name in get_vetting_store().companies():
+        index.add(entity_type, company_name)
+    return index
+
+# Concurrent requests for the same company share one research run instead of each paying for it
+inflight = SingleFlight()
+
 @app.get("/ping")
 async def health_check():
     """Health check endpoint"""
@@ -40,250 +118,781 @@ async def health_check():
         "vercel_url": os.getenv("VERCEL_URL", "not set"),
         "python_version": sys.version,
         "agents_imported": "agents" in sys.modules,
+        "research_cache": get_research_cache().stats(),
+        "format_cache": get_format_cache().stats(),
+        "known_companies": len(get_company_index()),
+        "inflight": inflight.stats(),
+        "search": search_proxy.stats() if search_proxy is not None else {"mode": "hosted"},
+        "jobs": get_job_queue().stats(),
     }
 
+@app.get("/routing")
+async def routing_report():
+    """per stage and route: calls, escalations, mean latency, estimated cost and what the cheaper routes saved"""
+    return {"router": type(routing.router).__name__, "routes": route_stats.report()}
+
+@app.get("/metrics")
+async def prometheus_metrics():
+    """Per-stage latency, tokens, web searches and retries in Prometheus text format"""
+    return PlainTextResponse(metrics.render_prometheus(), media_type="text/plain; version=0.0.4")
+
+# Agent instructions are plain module constants: hashing them for cache keys doesn't require building the agents
+
 # Research Agent: Searches web and generates company analysis
-research_agent = Agent(
-    name="Research Agent",
-    model="gpt-4.1",
-    instructions=(
-        #todo: preventhallucination
-        #perplexity
-        "You are an AI assistant that creates comprehensive company analysis reports.\n\n"
-        "Your process:\n"
-        "1. Search the web comprehensively for information about the given company:\n"
-        "   - Company overview and history\n"
-        "   - Recent financial performance and stock data\n"
-        "   - Latest news and developments\n"
-        "   - Market position and competitors\n"
-        "   - Key products/services\n"
-        "   - Leadership team and organizational structure\n"
-        "   - Future outlook and strategic initiatives\n"
-        "2. Perform multiple searches with different query variations to ensure broad coverage\n"
-        "3. If you don't find the information required, sometimes it may be useful to search again for the company information by its legal name (for e.g. Veridion's legal name is Dataworks Research SRL and you can find the last financial report date by this name on listafirme.ro) or ultimately the company's parent company or subsidiaries\n. Include this information in the structured data summary if you found it."
-        "4. Prioritize recent information (last 30 days) but include historical context\n"
-        "5. Look for both general news and specific expert analysis\n"
-        "6. If initial results are insufficient, refine your search queries and search again\n\n"
-        "If there is no company under the name provided, please do not hallucinate and clearly state 'Company could not be found'"
-        "Your output structure:\n"
-        "**[Company Name] - Comprehensive Risk Analysis**\n\n"
-        "*[One impactful sentence summarizing the company's current position and outlook]*\n\n"
-        "**Executive Summary**\n"
-        "A concise 2-3 paragraph overview that:\n"
-        "- Summarizes the company's core business and market position\n"
-        "- Highlights recent significant developments\n"
-        "- Outlines key challenges and opportunities\n\n"
-        "**Company Overview**\n"
-        "- Brief history and founding story\n"
-        "- Core business model and main products/services\n"
-        "- Key markets and customer segments\n\n"
-        "**Recent Developments**\n"
-        "- Latest news and announcements\n"
-        "- Recent financial performance\n"
-        "- Strategic initiatives and partnerships\n\n"
-        "**Market Position**\n"
-        "- Competitive landscape\n"
-        "- Market share and industry standing\n"
-        "- Key differentiators\n\n"
-        "**Leadership & Organization**\n"
-        "- Key executives and their backgrounds\n"
-        "- Organizational structure\n"
-        "- Corporate culture highlights\n\n"
-        "**Future Outlook**\n"
-        "- Growth strategies and initiatives\n"
-        "- Potential challenges and risks\n"
-        "- Market opportunities\n\n"
-        "**Key Metrics & Financials**\n"
-        "- Recent financial highlights\n"
-        "- Important KPIs\n"
-        "- Stock performance (if public)\n\n"
-        "Use clear, professional language throughout.\n"
-        "Focus on providing actionable insights and a balanced view of the company's position."
-        "\n\nAfter your full company analysis, include the following section:\n\n"
-        "**Structured Data Summary**\n"
-        "Return a dictionary-like block that provides the following fields if possible:\n"
-        "- registration_year: Year the company was officially registered.\n"
-        "- status: Current legal status of the company (active, inactive, bankrupt, etc.)\n"
-        "- last_report_year: Last year in which a public business report was avaiblable.\n"
-
-        "- market_presence: Describe how well-known the company is in its market.\n"
-        "- dealer_network: Size and scope of the company's distributor or reseller network (e.g. '20 authorized delaers across Europe').\n"
-        "- revenue_trends: Summary of recent revenue growth or decline.\n"
-
-        "- top_product_revenue_share: % of total revenue coming from the top-selling product.\n"
-        "- product_lines: Main product or service categories the company offers.\n"
-
-        "- top_50_percent_revenue: List of products or clients that together make up the top 50% of the company's revenue.\n"
-        "- num_clients: Estimated number of active clients or buyers.\n"
-        "- top3_clients_share: % of revenue that comes from the top 3 clients.\n"
-
-        "- top_50_percent_cogs: Number of suppliers or products that account for the top 50% of the company’s Cost of Goods Sold (COGS).\n"
-        "- top3_suppliers_share: Estimated combined share of purchases or COGS coming from the top three suppliers.\n"
-
-        "- traceability_system: Description of whether the company uses tools like GPS, QR codes, RFID, or ERP systems for asset tracking.\n"
-        "- methods: Technologies or operational procedures used to trace or track the location of financed or leased assets.\n"
-        "- since: Year or period since the traceability system has been implemented.\n"
-
-        "- esg_policy: Existence and description of any formal Environmental, Social, and Governance (ESG) policy or report.\n"
-        "- certifications: ESG- or security-related certifications (e.g., ISO 14001, ISO 27001, SA8000).\n"
-        "- incidents: Notable ESG violations, controversies, fines, or security breaches the company has faced.\n"
-
-        "- credit_rating: Official rating (e.g. BBB, A-, etc.) from recognized agencies such as Moody's, S&P, or Fitch.\n"
-        "- agency: Name of the credit rating agency that assigned the credit rating.\n"
-
-        "- info_sources: List of key websites or source (websites, databases, filings) you used to extract the above data (e.g., 'crunchbase.com', 'company investor page', 'listafirme.ro', 'bloomberg.com', 'opencorporates.com' - but do not be limited to these examples)\n\n"
-        "If any value is unknown or not found, clearly write 'Unknown'.\n"
-        "Return the summary inside a code block like this:\n"
-        "```json\n"
-        "{\n"
-        "  \"registration_year\": 2010,\n"
-        "  \"status\": \"active\",\n"
-        "  ...\n"
-        "}\n"
-        "```"
-        "7. If the first 1–2 sources do not contain enough information, look for alternative sources such as:\n"
-        "   - Industry publications and reports\n"
-        "   - Company investor relations pages\n"
-        "   - Analyst insights on financial portals\n"
-        "   - Global distributor lists or supplier directories\n"
-        "8. If you still cannot find any data, state 'Unknown' but explain what sources were checked.\n"
-
-    ),
-    tools=[ WebSearchTool() ]
+RESEARCH_INSTRUCTIONS = (
+    #todo: preventhallucination
+    #perplexity
+    "You are an AI assistant that creates comprehensive company analysis reports.\n\n"
+    "Your process:\n"
+    "1. Search the web comprehensively for information about the given company:\n"
+    "   - Company overview and history\n"
+    "   - Recent financial performance and stock data\n"
+    "   - Latest news and developments\n"
+    "   - Market position and competitors\n"
+    "   - Key products/services\n"
+    "   - Leadership team and organizational structure\n"
+    "   - Future outlook and strategic initiatives\n"
+    "2. Perform multiple searches with different query variations to ensure broad coverage\n"
+    "3. If you don't find the information required, sometimes it may be useful to search again for the company information by its legal name (for e.g. Veridion's legal name is Dataworks Research SRL and you can find the last financial report date by this name on listafirme.ro) or ultimately the company's parent company or subsidiaries\n. Include this information in the structured data summary if you found it."
+    "4. Prioritize recent information (last 30 days) but include historical context\n"
+    "5. Look for both general news and specific expert analysis\n"
+    "6. If initial results are insufficient, refine your search queries and search again\n\n"
+    "If there is no company under the name provided, please do not hallucinate and clearly state 'Company could not be found'"
+    "Your output structure:\n"
+    "**[Company Name] - Comprehensive Risk Analysis**\n\n"
+    "*[One impactful sentence summarizing the company's current position and outlook]*\n\n"
+    "**Executive Summary**\n"
+    "A concise 2-3 paragraph overview that:\n"
+    "- Summarizes the company's core business and market position\n"
+    "- Highlights recent significant developments\n"
+    "- Outlines key challenges and opportunities\n\n"
+    "**Company Overview**\n"
+    "- Brief history and founding story\n"
+    "- Core business model and main products/services\n"
+    "- Key markets and customer segments\n\n"
+    "**Recent Developments**\n"
+    "- Latest news and announcements\n"
+    "- Recent financial performance\n"
+    "- Strategic initiatives and partnerships\n\n"
+    "**Market Position**\n"
+    "- Competitive landscape\n"
+    "- Market share and industry standing\n"
+    "- Key differentiators\n\n"
+    "**Leadership & Organization**\n"
+    "- Key executives and their backgrounds\n"
+    "- Organizational structure\n"
+    "- Corporate culture highlights\n\n"
+    "**Future Outlook**\n"
+    "- Growth strategies and initiatives\n"
+    "- Potential challenges and risks\n"
+    "- Market opportunities\n\n"
+    "**Key Metrics & Financials**\n"
+    "- Recent financial highlights\n"
+    "- Important KPIs\n"
+    "- Stock performance (if public)\n\n"
+    "Use clear, professional language throughout.\n"
+    "Focus on providing actionable insights and a balanced view of the company's position."
+    "\n\nAfter your full company analysis, include the following section:\n\n"
+    "**Structured Data Summary**\n"
+    "Return a dictionary-like block that provides the following fields if possible:\n"
+    "- registration_year: Year the company was officially registered.\n"
+    "- status: Current legal status of the company (active, inactive, bankrupt, etc.)\n"
+    "- last_report_year: Last year in which a public business report was avaiblable.\n"
+
+    "- market_presence: Describe how well-known the company is in its market.\n"
+    "- dealer_network: Size and scope of the company's distributor or reseller network (e.g. '20 authorized delaers across Europe').\n"
+    "- revenue_trends: Summary of recent revenue growth or decline.\n"
+
+    "- top_product_revenue_share: % of total revenue coming from the top-selling product.\n"
+    "- product_lines: Main product or service categories the company offers.\n"
+
+    "- top_50_percent_revenue: List of products or clients that together make up the top 50% of the company's revenue.\n"
+    "- num_clients: Estimated number of active clients or buyers.\n"
+    "- top3_clients_share: % of revenue that comes from the top 3 clients.\n"
+
+    "- top_50_percent_cogs: Number of suppliers or products that account for the top 50% of the company’s Cost of Goods Sold (COGS).\n"
+    "- top3_suppliers_share: Estimated combined share of purchases or COGS coming from the top three suppliers.\n"
+
+    "- traceability_system: Description of whether the company uses tools like GPS, QR codes, RFID, or ERP systems for asset tracking.\n"
+    "- methods: Technologies or operational procedures used to trace or track the location of financed or leased assets.\n"
+    "- since: Year or period since the traceability system has been implemented.\n"
+
+    "- esg_policy: Existence and description of any formal Environmental, Social, and Governance (ESG) policy or report.\n"
+    "- certifications: ESG- or security-related certifications (e.g., ISO 14001, ISO 27001, SA8000).\n"
+    "- incidents: Notable ESG violations, controversies, fines, or security breaches the company has faced.\n"
+
+    "- credit_rating: Official rating (e.g. BBB, A-, etc.) from recognized agencies such as Moody's, S&P, or Fitch.\n"
+    "- agency: Name of the credit rating agency that assigned the credit rating.\n"
+
+    "- info_sources: List of key websites or source (websites, databases, filings) you used to extract the above data (e.g., 'crunchbase.com', 'company investor page', 'listafirme.ro', 'bloomberg.com', 'opencorporates.com' - but do not be limited to these examples)\n\n"
+    "If any value is unknown or not found, clearly write 'Unknown'.\n"
+    "Return the summary inside a code block like this:\n"
+    "```json\n"
+    "{\n"
+    "  \"registration_year\": 2010,\n"
+    "  \"status\": \"active\",\n"
+    "  ...\n"
+    "}\n"
+    "```"
+    "7. If the first 1–2 sources do not contain enough information, look for alternative sources such as:\n"
+    "   - Industry publications and reports\n"
+    "   - Company investor relations pages\n"
+    "   - Analyst insights on financial portals\n"
+    "   - Global distributor lists or supplier directories\n"
+    "8. If you still cannot find any data, state 'Unknown' but explain what sources were checked.\n"
+
 )
 
 # Formatting Agent: Transforms content into polished markdown
-formatting_agent = Agent(
-    name="Formatting Agent", 
-    # model="gpt-4.1",
-    model='o3',
-    instructions=(
-        "You are an expert editor and markdown formatter who transforms research content into beautiful, readable newsletters.\n\n"
-        "Your task:\n"
-        "1. Take the provided research content and transform it into a polished newsletter\n"
-        "2. Apply professional markdown formatting:\n"
-        "   - Use **bold** for the main title\n"
-        "   - Use *italics* for the one-sentence summary\n"
-        "   - Structure content with clear hierarchical headers (##, ###)\n"
-        "   - Create visually appealing lists with bullet points or numbers\n"
-        "   - Add pull quotes using > blockquote syntax for key insights\n"
-        "   - Use horizontal rules (---) to separate major sections\n"
-        "   - Format links properly: [text](url)\n"
-        "   - Add emphasis with **bold** and *italic* text strategically\n"
-        "3. Enhance readability:\n"
-        "   - Break up long paragraphs\n"
-        "   - Add spacing between sections\n"
-        "   - Create clear visual hierarchy\n"
-        "   - Ensure smooth flow between sections\n"
-        "4. Maintain all the original content and insights\n"
-        "5. The output should be publication-ready markdown that looks professional when rendered\n\n"
-        "Transform the content into an engaging, visually appealing newsletter while preserving all information."
-    ),
-    tools=[]
+FORMATTING_INSTRUCTIONS = (
+    "You are an expert editor and markdown formatter who transforms research content into beautiful, readable newsletters.\n\n"
+    "Your task:\n"
+    "1. Take the provided research content and transform it into a polished newsletter\n"
+    "2. Apply professional markdown formatting:\n"
+    "   - Use **bold** for the main title\n"
+    "   - Use *italics* for the one-sentence summary\n"
+    "   - Structure content with clear hierarchical headers (##, ###)\n"
+    "   - Create visually appealing lists with bullet points or numbers\n"
+    "   - Add pull quotes using > blockquote syntax for key insights\n"
+    "   - Use horizontal rules (---) to separate major sections\n"
+    "   - Format links properly: [text](url)\n"
+    "   - Add emphasis with **bold** and *italic* text strategically\n"
+    "3. Enhance readability:\n"
+    "   - Break up long paragraphs\n"
+    "   - Add spacing between sections\n"
+    "   - Create clear visual hierarchy\n"
+    "   - Ensure smooth flow between sections\n"
+    "4. Maintain all the original content and insights\n"
+    "5. The output should be publication-ready markdown that looks professional when rendered\n\n"
+    "Transform the content into an engaging, visually appealing newsletter while preserving all information."
 )
 
-@app.post("/research")
-async def generate_research(request: TopicsRequest):
-    topics = request.topics
-    if not topics:
-        return {"error": "No topics provided."}
+# RESEARCH_OUTPUT_MODE=structured: the research agent returns a typed ResearchOutput (see schema.py)
+# through the SDK's output_type instead of a markdown report ending in a ```json block that has to be scraped
+RESEARCH_OUTPUT_MODE = os.getenv("RESEARCH_OUTPUT_MODE", "markdown").lower()
+STRUCTURED_OUTPUT_INSTRUCTIONS = (
+    "\n\nOutput format override: reply with the JSON object requested by the response schema. "
+    "Put the complete markdown report in report_markdown (without the ```json block) "
+    "and the Structured Data Summary values in structured_data, one key per field. "
+    "Use numbers for years and percentages, lists of strings for lists, and 'Unknown' when a value was not found."
+)
+if RESEARCH_OUTPUT_MODE == "structured":
+    RESEARCH_AGENT_INSTRUCTIONS = RESEARCH_INSTRUCTIONS + STRUCTURED_OUTPUT_INSTRUCTIONS
+else:
+    RESEARCH_AGENT_INSTRUCTIONS = RESEARCH_INSTRUCTIONS
+
+# The agents themselves are built on first use, so a cold start (and /ping) never pays for importing the agents SDK
+@lru_cache(maxsize=None)
+def get_research_agent():
+    from agents import Agent, ModelSettings
+    from .client import prompt_cache_key
+    require_api_key()
+    output_type = None
+    if RESEARCH_OUTPUT_MODE == "structured":
+        from .schema import ResearchOutput
+        output_type = ResearchOutput
+    return Agent(
+        name="Research Agent",
+        model="gpt-4.1",
+        instructions=RESEARCH_AGENT_INSTRUCTIONS,
+        tools=search_tools(),
+        output_type=output_type,
+        model_settings=ModelSettings(extra_body={"prompt_cache_key": prompt_cache_key("Research Agent", RESEARCH_AGENT_INSTRUCTIONS)}),
+    )
+
+@lru_cache(maxsize=None)
+def get_formatting_agent():
+    from agents import Agent, ModelSettings
+    from .client import prompt_cache_key
+    require_api_key()
+    return Agent(
+        name="Formatting Agent", 
+        # model="gpt-4.1",
+        model='o3',
+        instructions=FORMATTING_INSTRUCTIONS,
+        tools=[],
+        model_settings=ModelSettings(extra_body={"prompt_cache_key": prompt_cache_key("Formatting Agent", FORMATTING_INSTRUCTIONS)}),
+    )
+
+@app.on_event("startup")
+async def warm_agents():
+    # AGENTS_EAGER_INIT=1 trades a slower cold start for a faster first request
+    if os.getenv("AGENTS_EAGER_INIT") == "1":
+        get_research_agent()
+        get_formatting_agent()
 
+# Fields the research prompt asks for; a rule template reading anything else renders it as 'Unknown'
+RESEARCH_FIELDS = frozenset(re.findall(r"^- (\w+):", RESEARCH_INSTRUCTIONS, re.MULTILINE))
+
+@app.on_event("startup")
+async def check_rule_templates():
+    issues = template_consistency(RESEARCH_FIELDS)
+    if issues:
+        fields = ", ".join(f"{issue['rule']}.{issue['field']}" for issue in issues)
+        print(f"rule template fields not requested from research (rendered as Unknown when missing): {fields}", file=sys.stderr)
+
+@app.get("/rules/consistency")
+async def rule_template_consistency():
+    """template fields of the active rules that REQUIRED_DATA or the research prompt don't ask for"""
+    return {"research_fields": sorted(RESEARCH_FIELDS), "issues": template_consistency(RESEARCH_FIELDS)}
+
+# --- Shared research pipeline helpers (used by /research and /research/stream) ---
+
+def resolve_topics(topics: list[str]) -> tuple[str, str, dict]:
+    """
+    Turn ["manufacturer: OLYMPUS Corporation"] into ("manufacturer", "olympus", {}), the dict is
+    {"resolved_from", "match_score"} when the name was fuzzily matched to another vetted company
+    """
     # Combine into one string like: "manufacturer: Olympus"
-    combined = " ".join(topics).strip().lower()
+    combined = " ".join(topics).strip()
 
     # Determine entity type and name
-    import re
     match = re.match(r"(manufacturer|dealer|asset):\s*(.+)", combined, re.IGNORECASE)
     if match:
-        entity_type = match.group(1).lower()
-        company_name = match.group(2).strip()
+        entity_type, name = match.group(1).lower(), match.group(2)
     else:
         # fallback if no prefix given
-        entity_type = "manufacturer"
-        company_name = combined
+        entity_type, name = "manufacturer", combined
+    # canonical name, or the already vetted company it is a close spelling of (NAME_MATCH=fuzzy)
+    company_name, score = get_company_index().resolve_with_score(entity_type, name)
+    resolution = {} if score is None else {"resolved_from": name.strip(), "match_score": round(score, 3)}
+    return entity_type, company_name, resolution
+
+# Prompts keep their static text first and the per-call values (date, company, content) last:
+# the provider's prompt cache matches on the longest identical prefix (instructions + start of the input)
+RESEARCH_PROMPT_PREFIX = (
+    "I need you to research and analyze the company below for a risk vetting file. "
+    "IMPORTANT: Include a structured JSON at the end with key data points for vetting. "
+    "Focus on recent developments from the last 30 days, but include historical context too.\n\n"
+)
 
-    from datetime import datetime, timedelta
+def build_research_prompt(entity_type: str, company_name: str, context: str = "") -> str:
     today = datetime.now()
-    yesterday = today - timedelta(days=1)
-    today_str = today.strftime("%B %d, %Y")
-    yesterday_str = yesterday.strftime("%B %d, %Y")
-
-    user_prompt = (
-        f"Today is {today_str}. I need you to research and analyze {company_name} as a {entity_type} company. "
-        f"IMPORTANT: Include a structured JSON at the end with key data points for vetting. "
-        f"Focus on recent developments from the last 30 days (since {yesterday_str}), "
-        f"but include historical context too."
+    since = today - timedelta(days=30)
+    return (
+        RESEARCH_PROMPT_PREFIX
+        + f"Today: {today.strftime('%B %d, %Y')}\n"
+        + f"Recent developments since: {since.strftime('%B %d, %Y')}\n"
+        + f"Company: {company_name}\n"
+        + f"Analyze it as a {entity_type} company."
+        # findings of the other entities of a deal session (see deals.py), last so the prefix stays cacheable
+        + (f"\n\n{context}" if context else "")
+    )
+
+def evaluate_flags(entity_type: str, structured_data: dict) -> tuple[dict, list[str]]:
+    """Run every rule of the entity's module, returns flags and the per-rule explanation sections"""
+    if entity_type not in RULES_BY_MODULE:
+        return {}, []
+    with stage("rules", entity_type=entity_type):
+        return RuleEngine.compile(entity_type).evaluate_with_explanations(structured_data)
+
+def with_rule_trace(entity_type: str, response: dict) -> dict:
+    """Response plus rule_trace (rule key -> trace of its flag), computed from its structured_data so cached results get one too"""
+    if not response.get("structured_data") or entity_type not in RULES_BY_MODULE:
+        return response
+    with stage("rules_trace", entity_type=entity_type):
+        return {**response, "rule_trace": RuleEngine.compile(entity_type).trace(response["structured_data"])}
+
+def build_summary_prompt(explanations: list[str]) -> str:
+    return (
+        "Based on the following company evaluation flags, write a markdown risk summary section explaining each risk in plain English. "
+        "Use 🚩 for 'Review', ⚠️ for 'Monitor', ✅ for 'OK'. Format nicely with headers and bullet points if needed.\n\n"
+    + "\n\n".join(explanations))
+
+def build_research_response(entity_type, company_name, raw_content, structured_data, flags, risk_summary) -> dict:
+    return {
+        "content": raw_content,
+        "structured_data": structured_data,
+        "flags": flags,
+        "risk_summary": risk_summary,
+        "error": None,
+        "topics": [f"{entity_type}: {company_name}"],
+        "entity_type": entity_type,
+        "company_name": company_name
+    }
+
+# Follow-up searches for required fields that came back Unknown, opt in with GAP_FILL=1
+GAP_FILL_ENABLED = os.getenv("GAP_FILL", "0") == "1"
+
+async def complete_structured_data(entity_type: str, company_name: str, structured_data: dict) -> tuple[dict, dict]:
+    if not GAP_FILL_ENABLED or entity_type not in RULES_BY_MODULE:
+        return structured_data, None
+    return await fill_gaps(entity_type, company_name, structured_data)
+
+def read_research_output(final_output) -> tuple[str, dict]:
+    """(markdown report, structured_data) from the research agent's final output, in either output mode"""
+    with stage("extract_json", mode=RESEARCH_OUTPUT_MODE) as span:
+        if isinstance(final_output, str):
+            raw_content, structured_data = final_output, extract_json_from_markdown(final_output)
+        else:
+            raw_content, structured_data = final_output.report_markdown, final_output.structured_data.model_dump()
+        span.set(parsed=structured_data is not None)
+        return raw_content, structured_data
+
+def save_research(response: dict) -> None:
+    """Cache a finished payload and append it to the vetting history"""
+    get_research_cache().set(response["entity_type"], response["company_name"], RESEARCH_AGENT_INSTRUCTIONS, response)
+    get_vetting_store().record(response)
+    get_company_index().add(response["entity_type"], response["company_name"])
+
+def parse_error_response(raw_content) -> dict:
+    return {
+        "content": raw_content,
+        "structured_data": None,
+        "flags": None,
+        "risk_summary": None,
+        "error": "Structured JSON could not be parsed."
+    }
+
+# --- Model routing: a cheap model first, the stage's own model when the cheap answer doesn't pass (see routing.py) ---
+
+def count_unknown(entity_type: str, structured_data: dict) -> int:
+    """how many fields the entity's rules read are missing or Unknown"""
+    if entity_type not in RULES_BY_MODULE:
+        return 0
+    return sum(len(fields) for fields in missing_field_groups(entity_type, structured_data).values())
+
+def research_validator(entity_type: str):
+    def validate(result) -> bool:
+        final_output = result.final_output
+        if isinstance(final_output, str):
+            structured_data = extract_json_from_markdown(final_output)
+        else:
+            structured_data = final_output.structured_data.model_dump()
+        return bool(structured_data) and count_unknown(entity_type, structured_data) <= ROUTE_MAX_UNKNOWN
+    return validate
+
+def summary_validator(explanations: list[str]):
+    # one 🚩 / ⚠️ / ✅ per evaluated rule
+    def validate(result) -> bool:
+        text = result.final_output or ""
+        return sum(text.count(marker) for marker in ("🚩", "⚠", "✅")) >= len(explanations)
+    return validate
+
+def newsletter_validator(raw_content: str):
+    # restyling keeps the content, a much shorter answer dropped part of it
+    def validate(result) -> bool:
+        text = result.final_output or ""
+        return "#" in text and len(text) >= 0.4 * len(raw_content)
+    return validate
+
+async def run_research_agent(entity_type: str, company_name: str, session: DealSession | None = None):
+    """One research agent run per company at a time, /research, /report and batch callers share it"""
+    known = get_company_index().match(entity_type, company_name)[0] is not None
+    context = session.context_for(entity_type, company_name) if session is not None else ""
+    return await inflight.do(
+        ("research_agent", entity_type, company_name) + ((session.id,) if session is not None else ()),
+        lambda: run_routed(
+            get_research_agent(),
+            build_research_prompt(entity_type, company_name, context),
+            "research",
+            {"known": known},
+            research_validator(entity_type),
+        ),
     )
 
+async def run_risk_summary(entity_type: str, structured_data: dict, explanations: list[str]):
+    return await run_routed(
+        get_formatting_agent(),
+        build_summary_prompt(explanations),
+        "risk_summary",
+        {"unknown_fields": count_unknown(entity_type, structured_data)},
+        summary_validator(explanations),
+    )
+
+# --- Risk summary: rendered locally from rule metadata, the formatting agent only writes up Review / Flag findings ---
+# RISK_SUMMARY_MODE=hybrid (default) | template (never calls the agent) | llm (the whole summary by the agent, as before)
+RISK_SUMMARY_MODE = os.getenv("RISK_SUMMARY_MODE", "hybrid").lower()
+
+async def template_sections(entity_type: str, structured_data: dict, flags: dict, explanations: dict) -> tuple[dict, list]:
+    """Markdown section per rule plus the rule keys that went to the formatting agent"""
+    written, reprompted = {}, []
+    if RISK_SUMMARY_MODE == "hybrid":
+        flagged = {key: explanations[key] for key, flag in flags.items() if flag in LLM_FLAGS}
+        if flagged:
+            written, reprompted = await summarize_sections(flagged)
+    with stage("risk_summary_template", entity_type=entity_type):
+        sections = compile_summary(entity_type).render_sections(flags, structured_data)
+    return {**sections, **written}, reprompted
+
+async def write_risk_summary(entity_type: str, structured_data: dict, flags: dict, explanations: list[str]) -> tuple:
+    """(markdown risk summary, formatting agent result or None when it was rendered locally)"""
+    if RISK_SUMMARY_MODE == "llm" or entity_type not in RULES_BY_MODULE:
+        result = await run_risk_summary(entity_type, structured_data, explanations)
+        return result.final_output, result
+    # explanations come in rule order, the same order as flags
+    sections, _ = await template_sections(entity_type, structured_data, flags, dict(zip(flags, explanations)))
+    return "\n\n".join(sections.values()), None
+
+async def run_research(entity_type: str, company_name: str, refresh: bool = False, session: DealSession | None = None) -> dict:
+    """Full research -> JSON extraction -> rules -> risk summary pipeline for one company"""
+    # Repeat lookups are served from the cache instead of a full research run
+    if not refresh:
+        cached = get_research_cache().get(entity_type, company_name, RESEARCH_AGENT_INSTRUCTIONS)
+        if cached is not None:
+            if session is not None:
+                session.add(entity_type, company_name, cached["content"])
+            return {**cached, "cached": True}
+    # Concurrent identical requests wait for the same pipeline run (within a deal session: the session's run)
+    key = ("research", entity_type, company_name) + ((session.id,) if session is not None else ())
+    return await inflight.do(key, lambda: research_pipeline(entity_type, company_name, session))
+
+async def research_pipeline(entity_type: str, company_name: str, session: DealSession | None = None) -> dict:
     # Run the research agent
-    result = await Runner.run(research_agent, user_prompt)
-    raw_content = result.final_output
-
-    import json
-    import re
-    def extract_json_from_markdown(text):
-        match = re.search(r"```json\s*(\{.*?\})\s*```", text, re.DOTALL)
-        if match:
-            try:
-                return json.loads(match.group(1))
-            except json.JSONDecodeError:
-                return None
-        return None
-
-    structured_data = extract_json_from_markdown(raw_content)
+    result = await run_research_agent(entity_type, company_name, session)
+    raw_content, structured_data = read_research_output(result.final_output)
+    if session is not None:
+        # what it found and searched for goes to the entities of the deal that run after it
+        session.add(entity_type, company_name, raw_content, result)
 
     if not structured_data:
-        return {
-            "content": raw_content,
-            "structured_data": None,
-            "flags": None,
-            "risk_summary": None,
-            "error": "Structured JSON could not be parsed."
-        }
+        return parse_error_response(raw_content)
+
+    structured_data, gap_fill = await complete_structured_data(entity_type, company_name, structured_data)
+
+    flags, explanations = evaluate_flags(entity_type, structured_data)
+
+    risk_summary, _ = await write_risk_summary(entity_type, structured_data, flags, explanations)
+
+    response = build_research_response(entity_type, company_name, raw_content, structured_data, flags, risk_summary)
+    save_research(response)
+    return {**response, "cached": False, "gap_fill": gap_fill}
+
+@app.post("/research")
+async def generate_research(request: TopicsRequest):
+    topics = request.topics
+    if not topics:
+        return {"error": "No topics provided."}
+
+    entity_type, company_name, resolution = resolve_topics(topics)
+    response = await run_research(entity_type, company_name, request.refresh)
+    response = {**response, **resolution}
+    return with_rule_trace(entity_type, response) if request.trace else response
+
+# --- Deal sessions: manufacturer, dealer and asset of one deal, the later runs reuse what the first one found ---
+
+async def run_deal(topics: list[str], refresh: bool = False, trace: bool = False) -> dict:
+    """The anchor (manufacturer) first, then the related entities concurrently with its findings in their prompt"""
+    resolved = [resolve_topics([topic]) for topic in topics]
+    session = DealSession([(entity_type, company_name) for entity_type, company_name, _ in resolved])
+    resolutions = {(entity_type, company_name): resolution for entity_type, company_name, resolution in resolved}
+    started = time.perf_counter()
+    try:
+        anchor = await run_research(*session.anchor, refresh, session)
+    except Exception as e:
+        # the related entities are still vetted, just without its findings
+        anchor = e
+    related = await asyncio.gather(
+        *(run_research(entity_type, company_name, refresh, session) for entity_type, company_name in session.related),
+        return_exceptions=True,
+    )
+    results = []
+    for (entity_type, company_name), response in zip(session.entities, [anchor, *related]):
+        if isinstance(response, Exception):
+            response = {"error": str(response)}
+        elif trace:
+            response = with_rule_trace(entity_type, response)
+        results.append({"topic": f"{entity_type}: {company_name}", **response, **resolutions.get((entity_type, company_name), {})})
+    return {
+        "results": results,
+        "session": session.report(),
+        "elapsed_seconds": round(time.perf_counter() - started, 3),
+    }
+
+@app.post("/research/deal")
+async def generate_research_deal(request: DealRequest):
+    if not request.topics:
+        return {"error": "No topics provided."}
+    if len(request.topics) > DEAL_MAX_ENTITIES:
+        raise HTTPException(status_code=400, detail=f"At most {DEAL_MAX_ENTITIES} entities per deal")
+    return await run_deal(request.topics, request.refresh, request.trace)
+
+# --- Server-Sent Events variant of /research ---
 
-    flags = {}
-    explanations = []
-    criteria_list = RULES_BY_MODULE.get(entity_type, [])
-    for key in criteria_list:
-        rule = RULES[key]
+def sse_event(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+def describe_tool_call(raw_item) -> dict:
+    """Small JSON-safe summary of a tool call item (web searches for the research agent)"""
+    info = {"id": getattr(raw_item, "id", None), "type": getattr(raw_item, "type", type(raw_item).__name__)}
+    action = getattr(raw_item, "action", None)
+    query = getattr(action, "query", None) if action is not None else None
+    if query:
+        info["query"] = query
+    return info
+
+async def stream_research(entity_type: str, company_name: str, refresh: bool = False, resolution: dict = None):
+    yield sse_event("status", {"stage": "started", "entity_type": entity_type, "company_name": company_name, **(resolution or {})})
+
+    if not refresh:
+        cached = get_research_cache().get(entity_type, company_name, RESEARCH_AGENT_INSTRUCTIONS)
+        if cached is not None:
+            yield sse_event("structured_data", cached["structured_data"])
+            for key, flag in cached["flags"].items():
+                yield sse_event("flag", {"rule": key, "name": RULES[key]["name"], "flag": flag})
+            yield sse_event("done", {**cached, "cached": True})
+            return
+
+    research_run = run_agent_streamed(get_research_agent(), build_research_prompt(entity_type, company_name), "research")
+    summary_run = None
+    try:
+        yield sse_event("status", {"stage": "research"})
+        buffer = ""
+        structured_data = None
+        # structured mode streams JSON, only the growing report_markdown value is forwarded as text
+        output_parser = IncrementalJSONParser() if RESEARCH_OUTPUT_MODE == "structured" else None
+        streamed_report = ""
+        async for event in research_run.stream_events():
+            if event.type == "raw_response_event":
+                data_type = getattr(event.data, "type", "")
+                if data_type == "response.output_text.delta" and output_parser is not None:
+                    output_parser.feed(event.data.delta)
+                    report = (output_parser.snapshot() or {}).get("report_markdown")
+                    if isinstance(report, str) and len(report) > len(streamed_report) and report.startswith(streamed_report):
+                        yield sse_event("delta", {"stage": "research", "text": report[len(streamed_report):]})
+                        streamed_report = report
+                elif data_type == "response.output_text.delta":
+                    buffer += event.data.delta
+                    yield sse_event("delta", {"stage": "research", "text": event.data.delta})
+                    # the JSON block is emitted as soon as its closing fence arrives; an open block is never
+                    # parsed here, the tolerant parser would read the half that arrived as the whole block
+                    if structured_data is None and "`" in event.data.delta and JSON_BLOCK.search(buffer):
+                        structured_data = extract_json_from_markdown(buffer) or None
+                        if structured_data:
+                            yield sse_event("structured_data", structured_data)
+                elif data_type == "response.web_search_call.completed":
+                    yield sse_event("tool", {"status": "completed", "id": getattr(event.data, "item_id", None)})
+            elif event.type == "run_item_stream_event" and event.name == "tool_called":
+                yield sse_event("tool", {"status": "started", **describe_tool_call(event.item.raw_item)})
+
+        if structured_data is None:
+            raw_content, structured_data = read_research_output(research_run.final_output)
+            if structured_data:
+                yield sse_event("structured_data", structured_data)
+        else:
+            raw_content = research_run.final_output
+        if streamed_report and len(raw_content) > len(streamed_report) and raw_content.startswith(streamed_report):
+            # tail of the report that arrived after the last snapshot
+            yield sse_event("delta", {"stage": "research", "text": raw_content[len(streamed_report):]})
+        if not structured_data:
+            yield sse_event("done", parse_error_response(raw_content))
+            return
+
+        if GAP_FILL_ENABLED:
+            yield sse_event("status", {"stage": "gap_fill"})
+            structured_data, gap_fill = await complete_structured_data(entity_type, company_name, structured_data)
+            if gap_fill and gap_fill["filled"]:
+                yield sse_event("structured_data", structured_data)
+
+        flags, explanations = evaluate_flags(entity_type, structured_data)
+        for key, flag in flags.items():
+            yield sse_event("flag", {"rule": key, "name": RULES[key]["name"], "flag": flag})
+
+        yield sse_event("status", {"stage": "risk_summary"})
+        if RISK_SUMMARY_MODE == "llm":
+            summary_run = run_agent_streamed(get_formatting_agent(), build_summary_prompt(explanations), "risk_summary")
+            async for event in summary_run.stream_events():
+                if event.type == "raw_response_event" and getattr(event.data, "type", "") == "response.output_text.delta":
+                    yield sse_event("delta", {"stage": "risk_summary", "text": event.data.delta})
+            risk_summary = summary_run.final_output
+        else:
+            # rendered locally (Review / Flag sections may still be written by the agent), sent in one piece
+            risk_summary, _ = await write_risk_summary(entity_type, structured_data, flags, explanations)
+            yield sse_event("delta", {"stage": "risk_summary", "text": risk_summary})
+
+        response = build_research_response(
+            entity_type, company_name, raw_content, structured_data, flags, risk_summary
+        )
+        save_research(response)
+        yield sse_event("done", {**response, "cached": False})
+    except Exception as e:
+        yield sse_event("error", {"error": str(e)})
+    finally:
+        # client went away or something failed: stop paying for tokens nobody will read
+        research_run.cancel()
+        if summary_run is not None:
+            summary_run.cancel()
+
+@app.post("/research/stream")
+async def generate_research_stream(request: TopicsRequest):
+    if not request.topics:
+        return {"error": "No topics provided."}
+    entity_type, company_name, resolution = resolve_topics(request.topics)
+    return StreamingResponse(
+        stream_research(entity_type, company_name, request.refresh, resolution),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+# --- Stored results: history and flag queries without re-running research ---
+
+@app.get("/history/{company}")
+async def company_history(company: str, entity_type: str = None, limit: int = 50):
+    company_name = get_company_index().resolve(entity_type, company) if entity_type else canonicalize(company)
+    return {"company_name": company_name, "results": get_vetting_store().history(company_name, entity_type, limit)}
+
+@app.get("/query")
+async def query_flags(rule: str, flag: str, entity_type: str = None, current: bool = True, limit: int = 500):
+    """e.g. /query?flag=Flag&rule=sanctions_watchlists&entity_type=dealer"""
+    if rule not in RULES:
+        raise HTTPException(status_code=400, detail=f"Unknown rule '{rule}'")
+    return {"rule": rule, "flag": flag, "results": get_vetting_store().query(rule, flag, entity_type, current, limit)}
+
+# --- Incremental re-evaluation: only changed rules are re-run and re-prompted ---
+
+SECTION_MARKER = re.compile(r"<!--\s*rule:\s*(\w+)\s*-->")
+
+def build_sections_prompt(explanations: dict) -> str:
+    return (
+        "Based on the following company evaluation flags, write one markdown risk summary section per rule explaining the risk in plain English. "
+        "Use 🚩 for 'Review', ⚠️ for 'Monitor', ✅ for 'OK'. Format nicely with headers and bullet points if needed. "
+        "Start every section with its marker line exactly as given (e.g. <!-- rule: business_age -->) and do not write anything outside the sections.\n\n"
+    + "\n\n".join(f"<!-- rule: {key} -->\n{explanation}" for key, explanation in explanations.items()))
+
+def split_sections(text: str) -> dict:
+    parts = SECTION_MARKER.split(text)
+    # parts = [preamble, key1, body1, key2, body2, ...]
+    return {parts[i]: parts[i + 1].strip() for i in range(1, len(parts) - 1, 2)}
+
+async def summarize_sections(explanations: dict) -> tuple[dict, list]:
+    """Markdown section per rule, only cache misses go to the formatting agent (in one call)"""
+    sections = {}
+    missing = {}
+    for key, explanation in explanations.items():
+        cached = get_section_cache().get(FORMATTING_INSTRUCTIONS, key, explanation)
+        if cached is not None:
+            sections[key] = cached
+        else:
+            missing[key] = explanation
+
+    if missing:
+        result = await run_routed(
+            get_formatting_agent(),
+            build_sections_prompt(missing),
+            "risk_sections",
+            validate=lambda result: set(missing) <= set(split_sections(result.final_output or "")),
+        )
+        written = split_sections(result.final_output)
+        for key, explanation in missing.items():
+            if written.get(key):
+                get_section_cache().set(FORMATTING_INSTRUCTIONS, key, explanation, value=written[key])
+                sections[key] = written[key]
+            else:
+                # the model dropped the marker: show the plain explanation rather than nothing
+                sections[key] = explanation
+    return sections, list(missing)
+
+@app.post("/reevaluate")
+async def reevaluate_company(request: ReevaluateRequest):
+    """Refresh flags and risk summary for new structured_data, reusing everything the diff doesn't touch"""
+    if request.entity_type not in RULES_BY_MODULE:
+        raise HTTPException(status_code=400, detail=f"Unknown entity type '{request.entity_type}'")
+    plan = RuleEngine.compile(request.entity_type)
+    company_name = get_company_index().resolve(request.entity_type, request.company_name)
+    previous = get_vetting_store().latest(company_name, request.entity_type)
+
+    outcome = reevaluate(
+        plan,
+        previous["structured_data"] if previous else {},
+        request.structured_data,
+        previous["flags"] if previous else {},
+        datetime.fromtimestamp(previous["created_at"]).year if previous else None,
+    )
+    if RISK_SUMMARY_MODE == "llm":
+        sections, reprompted = await summarize_sections(outcome["explanations"])
+    else:
+        sections, reprompted = await template_sections(
+            request.entity_type, request.structured_data, outcome["flags"], outcome["explanations"]
+        )
+    risk_summary = "\n\n".join(sections[rule.key] for rule in plan.rules)
+
+    response = build_research_response(
+        request.entity_type,
+        company_name,
+        previous["content"] if previous else None,
+        request.structured_data,
+        outcome["flags"],
+        risk_summary,
+    )
+    save_research(response)
+    return {
+        **response,
+        "changed_fields": outcome["changed_fields"],
+        "rerun_rules": outcome["rerun_rules"],
+        "reused_rules": outcome["reused_rules"],
+        "reprompted_sections": reprompted,
+    }
+
+# --- Batch vetting: many companies, bounded concurrency, NDJSON results as they complete ---
+
+# in-flight batch items, cancelled when the server shuts down
+batch_tasks: set[asyncio.Task] = set()
+
+@app.on_event("shutdown")
+async def cancel_batch_tasks():
+    for task in list(batch_tasks):
+        task.cancel()
+
+async def vet_batch_item(index: int, topic: str, semaphore: asyncio.Semaphore, timeout: float, refresh: bool, trace: bool = False) -> dict:
+    entity_type, company_name, resolution = resolve_topics([topic])
+    async with semaphore:
+        started = time.perf_counter()
         try:
-            result = evaluate_rule(key, structured_data)
-            flags[key] = result["flag"]
-            explanation = result["prompt"].format(flag=result["flag"], **structured_data)
-            explanations.append(f"### {rule['name']} ({result['flag']})\n{explanation}")
+            result = await asyncio.wait_for(run_research(entity_type, company_name, refresh), timeout)
+            status = "error" if result.get("error") else "ok"
+            if trace:
+                result = with_rule_trace(entity_type, result)
+        except asyncio.TimeoutError:
+            result, status = {"error": f"Timed out after {timeout}s"}, "timeout"
         except Exception as e:
-            flags[key] = "Error"
-            explanations.append(f"### {rule['name']} (Error)\n{str(e)}\n")
+            result, status = {"error": str(e)}, "error"
+        return {
+            "index": index,
+            "topic": topic,
+            "status": status,
+            "elapsed_seconds": round(time.perf_counter() - started, 3),
+            **result,
+            **resolution,
+        }
 
-    summary_prompt = (
-        "Based on the following company evaluation flags, write a markdown risk summary section explaining each risk in plain English. "
-        "Use 🚩 for 'Review', ⚠️ for 'Monitor', ✅ for 'OK'. Format nicely with headers and bullet points if needed.\n\n"
-    + "\n\n".join(explanations))
+async def stream_batch(request: BatchRequest):
+    semaphore = asyncio.Semaphore(max(1, request.concurrency))
+    started = time.perf_counter()
+    tasks = [
+        asyncio.create_task(vet_batch_item(i, topic, semaphore, request.timeout, request.refresh, request.trace))
+        for i, topic in enumerate(request.topics)
+    ]
+    batch_tasks.update(tasks)
+    counts = {"ok": 0, "error": 0, "timeout": 0}
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            item = await next_done
+            counts[item["status"]] += 1
+            yield json.dumps(item) + "\n"
+    finally:
+        # the client disconnected or the server is stopping: don't keep researching
+        for task in tasks:
+            task.cancel()
+        batch_tasks.difference_update(tasks)
 
-    summary_result = await Runner.run(formatting_agent, summary_prompt)
-    risk_summary = summary_result.final_output
+    elapsed = time.perf_counter() - started
+    yield json.dumps({
+        "summary": {
+            "total": len(tasks),
+            **counts,
+            "elapsed_seconds": round(elapsed, 3),
+            "companies_per_minute": round(len(tasks) / elapsed * 60, 2) if elapsed > 0 else None,
+        }
+    }) + "\n"
 
-    return {
-    "content": raw_content,
-    "structured_data": structured_data,
-    "flags": flags,
-    "risk_summary": risk_summary,
-    "error": None,
-    "topics": [f"{entity_type}: {company_name}"],
-    "entity_type": entity_type,
-    "company_name": company_name
-}
-
-            
-@app.post("/format")
-async def format_newsletter(request: FormatRequest):
-    import re  
-    raw_content = request.raw_content
-    
-    if not raw_content:
-        return {"error": "No content provided."}
-    
-    raw_topic = request.topics[0]  # e.g., "dealer: totalsoft"
+@app.post("/research/batch")
+async def generate_research_batch(request: BatchRequest):
+    if not request.topics:
+        return {"error": "No topics provided."}
+    return StreamingResponse(stream_batch(request), media_type="application/x-ndjson")
+
+def format_title(raw_topic: str) -> tuple[str, str, str]:
+    """ "dealer: totalsoft" -> ("dealer", "totalsoft", "Comprehensive Risk Analysis of Dealer: Totalsoft") """
     match = re.match(r"(manufacturer|dealer|asset):\s*(.+)", raw_topic, re.IGNORECASE)
     if match:
         entity_type = match.group(1).lower()
@@ -294,27 +903,233 @@ async def format_newsletter(request: FormatRequest):
     else:
         entity_type = "manufacturer"
         company_name = raw_topic.strip()
-        entity = entity_type.capitalize()
         company = company_name.title()
         formatted_title = f"Comprehensive Risk Analysis of {company}"
+    return entity_type, company_name, formatted_title
 
-    # Create formatting prompt
-    user_prompt = (
-        f"Transform this research content into a beautifully formatted company analysis report titled '{formatted_title}'. "
-        f"Apply professional markdown formatting:\n\n{raw_content}"
+def build_format_prompt(formatted_title: str, raw_content: str) -> str:
+    return (
+        "Transform the research content below into a beautifully formatted company analysis report "
+        "with the given title. Apply professional markdown formatting.\n\n"
+        f"Title: {formatted_title}\n\n{raw_content}"
     )
+
+@lru_cache(maxsize=None)
+def get_format_cache():
+    # Same title + same research content -> reuse the formatted newsletter instead of paying for another o3 call
+    return build_content_cache("format")
+
+async def format_content(formatted_title: str, raw_content: str) -> dict:
+    """{"content", "cached", "usage"} of the formatted newsletter, the formatting agent only runs on a cache miss"""
+    agent = get_formatting_agent()
+    parts = (FORMATTING_INSTRUCTIONS, str(agent.model), formatted_title, raw_content)
+    cached = get_format_cache().get(*parts)
+    if cached is not None:
+        return {"content": cached, "cached": True, "usage": None}
+
+    async def run():
+        result = await run_routed(
+            agent, build_format_prompt(formatted_title, raw_content), "newsletter", validate=newsletter_validator(raw_content)
+        )
+        get_format_cache().set(*parts, value=result.final_output)
+        return {"content": result.final_output, "cached": False, "usage": usage_summary(result)}
+
+    return await inflight.do(("format", get_format_cache().key(*parts)), run)
+
+@app.post("/format")
+async def format_newsletter(request: FormatRequest):
+    raw_content = request.raw_content
     
-    # Run the formatting agent
-    result = await Runner.run(formatting_agent, user_prompt)
-    formatted_content = result.final_output
+    if not raw_content:
+        return {"error": "No content provided."}
     
+    raw_topic = request.topics[0]  # e.g., "dealer: totalsoft"
+    entity_type, company_name, formatted_title = format_title(raw_topic)
+
+    # Run the formatting agent (or reuse the newsletter formatted from the same content)
+    formatted = await format_content(formatted_title, raw_content)
+
     return {
-        "content": formatted_content,
+        "content": formatted["content"],
         "title": formatted_title,
         "entity_type": entity_type,
         "company_name": company_name,
+        "cached": formatted["cached"],
+        "usage": formatted["usage"],
     }
 
+# --- Combined report: research once, then risk summary + newsletter formatting in parallel ---
+
+async def timed(timings: dict, stage: str, coro):
+    started = time.perf_counter()
+    try:
+        return await coro
+    finally:
+        timings[stage] = round(time.perf_counter() - started, 3)
+
+async def run_report(topics: list[str], refresh: bool = False) -> dict:
+    started = time.perf_counter()
+    timings = {}
+    usage = {}
+    entity_type, company_name, resolution = resolve_topics(topics)
+    _, _, formatted_title = format_title(" ".join(topics))
+
+    cached = None if refresh else get_research_cache().get(entity_type, company_name, RESEARCH_AGENT_INSTRUCTIONS)
+    gap_fill = None
+    if cached is not None:
+        research = cached
+        # only the newsletter formatting is left to do (and usually cached as well)
+        newsletter = await timed(timings, "newsletter", format_content(formatted_title, cached["content"]))
+        risk_summary = cached["risk_summary"]
+    else:
+        result = await timed(timings, "research", run_research_agent(entity_type, company_name))
+        usage["research"] = usage_summary(result)
+        # rules are deterministic, they run as soon as the JSON block is parsed (and gaps are filled)
+        stage_started = time.perf_counter()
+        raw_content, structured_data = read_research_output(result.final_output)
+        timings["extract_json"] = round(time.perf_counter() - stage_started, 3)
+        if not structured_data:
+            newsletter = await timed(timings, "newsletter", format_content(formatted_title, raw_content))
+            usage["newsletter"] = newsletter["usage"]
+            timings["total"] = round(time.perf_counter() - started, 3)
+            return {
+                **parse_error_response(raw_content),
+                "raw_content": raw_content,
+                "content": newsletter["content"],
+                "title": formatted_title,
+                "timings": timings,
+                "usage": usage,
+                **resolution,
+            }
+
+        # the newsletter only needs raw_content, start it now so it overlaps gap filling and the risk summary
+        newsletter_task = asyncio.create_task(timed(timings, "newsletter", format_content(formatted_title, raw_content)))
+        try:
+            structured_data, gap_fill = await timed(
+                timings, "gap_fill", complete_structured_data(entity_type, company_name, structured_data)
+            )
+
+            stage_started = time.perf_counter()
+            flags, explanations = evaluate_flags(entity_type, structured_data)
+            timings["rules"] = round(time.perf_counter() - stage_started, 3)
+
+            (risk_summary, summary_result), newsletter = await asyncio.gather(
+                timed(timings, "risk_summary", write_risk_summary(entity_type, structured_data, flags, explanations)),
+                newsletter_task,
+            )
+        finally:
+            newsletter_task.cancel()
+        if summary_result is not None:
+            usage["risk_summary"] = usage_summary(summary_result)
+        research = build_research_response(entity_type, company_name, raw_content, structured_data, flags, risk_summary)
+        save_research(research)
+
+    usage["newsletter"] = newsletter["usage"]
+    timings["total"] = round(time.perf_counter() - started, 3)
+    return {
+        **research,
+        "raw_content": research["content"],
+        "content": newsletter["content"],
+        "title": formatted_title,
+        "cached": cached is not None,
+        "newsletter_cached": newsletter["cached"],
+        "gap_fill": gap_fill,
+        "timings": timings,
+        "usage": usage,  # per agent call, including how much of each prompt was a provider cache hit
+        **resolution,
+    }
+
+@app.post("/report")
+async def generate_report(request: TopicsRequest):
+    """Research + risk summary + newsletter formatting in one call (replaces /research followed by /format)"""
+    if not request.topics:
+        return {"error": "No topics provided."}
+    return await run_report(request.topics, request.refresh)
+
+# --- Jobs: enqueue now, poll /jobs/{id} for the result, no connection held open for the run ---
+
+@lru_cache(maxsize=None)
+def get_job_queue():
+    return build_job_queue()
+
+async def research_job(payload: dict, emit) -> dict:
+    entity_type, company_name, resolution = resolve_topics(payload["topics"])
+    emit("resolved", {"entity_type": entity_type, "company_name": company_name, **resolution})
+    response = {**await run_research(entity_type, company_name, payload.get("refresh", False)), **resolution}
+    return with_rule_trace(entity_type, response) if payload.get("trace") else response
+
+async def report_job(payload: dict, emit) -> dict:
+    return await run_report(payload["topics"], payload.get("refresh", False))
+
+async def deal_job(payload: dict, emit) -> dict:
+    return await run_deal(payload["topics"], payload.get("refresh", False), payload.get("trace", False))
+
+JOB_HANDLERS = {"research": research_job, "report": report_job, "deal": deal_job}
+
+@lru_cache(maxsize=None)
+def get_job_workers():
+    return WorkerPool(get_job_queue(), JOB_HANDLERS, concurrency=JOB_WORKERS)
+
+@app.on_event("startup")
+async def start_job_workers():
+    # JOB_WORKERS=0 only accepts jobs, e.g. on a serverless instance that is frozen between requests
+    if JOB_WORKERS > 0:
+        get_job_workers().start()
+
+@app.on_event("shutdown")
+async def stop_job_workers():
+    # running jobs go back to the queue instead of waiting for their lease to expire
+    await get_job_workers().stop()
+
+@app.post("/jobs", status_code=202)
+async def create_job(request: JobRequest, idempotency_key: str | None = Header(default=None)):
+    if request.kind not in JOB_HANDLERS:
+        raise HTTPException(status_code=400, detail=f"Unknown job kind '{request.kind}'")
+    if not request.topics:
+        raise HTTPException(status_code=400, detail="No topics provided.")
+    if request.kind == "deal" and len(request.topics) > DEAL_MAX_ENTITIES:
+        raise HTTPException(status_code=400, detail=f"At most {DEAL_MAX_ENTITIES} entities per deal")
+    job, created = get_job_queue().enqueue(
+        request.kind,
+        {"topics": request.topics, "refresh": request.refresh, "trace": request.trace},
+        priority=request.priority,
+        idempotency_key=request.idempotency_key or idempotency_key,
+    )
+    return {"id": job["id"], "status": job["status"], "created": created}
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    job = get_job_queue().get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@app.get("/jobs/{job_id}/events")
+async def get_job_events(job_id: str, after: int = 0, follow: bool = False):
+    """progress events after seq `after`; follow=true keeps an SSE stream open until the job is finished"""
+    if get_job_queue().get(job_id) is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if not follow:
+        return {"id": job_id, "events": get_job_queue().events(job_id, after)}
+
+    async def tail():
+        last = after
+        while True:
+            for event in get_job_queue().events(job_id, last):
+                last = event["seq"]
+                yield sse_event(event["event"], {"seq": event["seq"], **event["data"]})
+            if get_job_queue().get(job_id)["status"] in TERMINAL and not get_job_queue().events(job_id, last):
+                return
+            await asyncio.sleep(0.5)
+
+    return StreamingResponse(tail(), media_type="text/event-stream")
+
+@app.delete("/jobs/{job_id}")
+async def cancel_job(job_id: str):
+    if not get_job_queue().cancel(job_id):
+        raise HTTPException(status_code=409, detail="Only queued jobs can be cancelled")
+    return get_job_queue().get(job_id)
+
 # IMPORTANT: Handler for Vercel serverless functions
 # Vercel's Python runtime will automatically handle FastAPI apps
 # No additional configuration needed - just export the 'app' variable
@@ -0,0 +1,297 @@
+# content-addressed cache for research results
+# a key is built from the normalized (entity_type, company_name) pair plus a hash of the agent instructions,
+# so editing the research prompt automatically invalidates every older entry
+# backends:
+#   - MemoryBackend: in-process LRU (default, lives as long as the serverless instance)
+#   - SQLiteBackend: on-disk LRU shared by every worker on the same machine, one table per cache namespace
+#   - RedisBackend: anything speaking the redis get/set/delete subset (redis-py or LocalRedis)
+# every backend stores plain strings; the ResearchCache wrapper takes care of JSON and TTL
+
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+
+def normalize_name(name: str) -> str:
+    """lowercase, trim and collapse whitespace so 'Olympus  ' and 'olympus' share an entry"""
+    return re.sub(r"\s+", " ", (name or "").strip().lower())
+
+
+def instructions_hash(instructions: str) -> str:
+    return hashlib.sha256((instructions or "").encode("utf-8")).hexdigest()[:16]
+
+
+def make_key(entity_type: str, company_name: str, instructions: str) -> str:
+    payload = json.dumps([normalize_name(entity_type), normalize_name(company_name), instructions_hash(instructions)])
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class MemoryBackend:
+    """in-process LRU with per-entry expiry"""
+
+    def __init__(self, max_entries: int = 1024):
+        self.max_entries = max_entries
+        self.evictions = 0
+        self._data = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+
+    def get(self, key: str):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at <= time.time():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: str, ttl: float) -> None:
+        with self._lock:
+            self._data[key] = (time.time() + ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    def __len__(self):
+        return len(self._data)
+
+
+class SQLiteBackend:
+    """
+    on-disk LRU, last_access is bumped on every hit and the oldest rows are dropped past max_entries
+    each cache namespace gets its own table in the file, so one namespace filling up never evicts another's entries
+    """
+
+    def __init__(self, path: str, max_entries: int = 10000, table: str = "cache"):
+        if not re.fullmatch(r"[A-Za-z_]\w*", table):
+            raise ValueError(f"Invalid cache table name '{table}'")
+        self.path = path
+        self.max_entries = max_entries
+        self.table = table
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            f"CREATE TABLE IF NOT EXISTS {table} ("
+            " key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL, last_access REAL NOT NULL)"
+        )
+        self._conn.execute(f"CREATE INDEX IF NOT EXISTS {table}_last_access ON {table}(last_access)")
+        self._conn.commit()
+
+    def get(self, key: str):
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(f"SELECT value, expires_at FROM {self.table} WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            value, expires_at = row
+            if expires_at <= now:
+                self._conn.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+                self._conn.commit()
+                return None
+            self._conn.execute(f"UPDATE {self.table} SET last_access = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            return value
+
+    def set(self, key: str, value: str, ttl: float) -> None:
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                f"INSERT OR REPLACE INTO {self.table} (key, value, expires_at, last_access) VALUES (?, ?, ?, ?)",
+                (key, value, now + ttl, now),
+            )
+            (count,) = self._conn.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()
+            overflow = count - self.max_entries
+            if overflow > 0:
+                self._conn.execute(
+                    f"DELETE FROM {self.table} WHERE key IN (SELECT key FROM {self.table} ORDER BY last_access LIMIT ?)",
+                    (overflow,),
+                )
+                self.evictions += overflow
+            self._conn.commit()
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._conn.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+            self._conn.commit()
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0]
+
+
+class LocalRedis:
+    """
+    minimal in-process stand-in for the redis-py client (get / set(ex=) / delete)
+    lets the redis code path run locally and in tests without a server
+    """
+
+    def __init__(self, max_entries: int = 1024):
+        self._store = MemoryBackend(max_entries)
+
+    @property
+    def evictions(self):
+        return self._store.evictions
+
+    def get(self, name):
+        value = self._store.get(name)
+        return value.encode("utf-8") if value is not None else None
+
+    def set(self, name, value, ex=None):
+        if isinstance(value, bytes):
+            value = value.decode("utf-8")
+        self._store.set(name, value, ex if ex is not None else float("inf"))
+        return True
+
+    def delete(self, *names):
+        for name in names:
+            self._store.delete(name)
+        return len(names)
+
+
+class RedisBackend:
+    """expiry and LRU eviction are left to the server (maxmemory-policy allkeys-lru)"""
+
+    def __init__(self, client, prefix: str = "research-cache:"):
+        self.client = client
+        self.prefix = prefix
+
+    @property
+    def evictions(self):
+        # a real server evicts on its own; only the local stand-in can report it
+        return getattr(self.client, "evictions", 0)
+
+    def get(self, key: str):
+        value = self.client.get(self.prefix + key)
+        if isinstance(value, bytes):
+            value = value.decode("utf-8")
+        return value
+
+    def set(self, key: str, value: str, ttl: float) -> None:
+        self.client.set(self.prefix + key, value, ex=max(1, int(ttl)))
+
+    def delete(self, key: str) -> None:
+        self.client.delete(self.prefix + key)
+
+
+class ResearchCache:
+    def __init__(self, backend, ttl: float = 6 * 3600, namespace: str = "research"):
+        self.backend = backend
+        self.ttl = ttl
+        self.namespace = namespace
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, entity_type: str, company_name: str, instructions: str) -> str:
+        return f"{self.namespace}:{make_key(entity_type, company_name, instructions)}"
+
+    def get(self, entity_type: str, company_name: str, instructions: str):
+        raw = self.backend.get(self.key(entity_type, company_name, instructions))
+        if raw is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return json.loads(raw)
+
+    def set(self, entity_type: str, company_name: str, instructions: str, value) -> None:
+        self.backend.set(self.key(entity_type, company_name, instructions), json.dumps(value), self.ttl)
+
+    def invalidate(self, entity_type: str, company_name: str, instructions: str) -> None:
+        self.backend.delete(self.key(entity_type, company_name, instructions))
+
+    def stats(self) -> dict:
+        return {
+            "backend": type(self.backend).__name__,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.backend.evictions,
+            "ttl_seconds": self.ttl,
+        }
+
+
+class ContentCache:
+    """generic exact-match cache keyed by a hash of arbitrary JSON-able parts (prompt sections, formatted output...)"""
+
+    def __init__(self, backend, ttl: float = 7 * 24 * 3600, namespace: str = "content"):
+        self.backend = backend
+        self.ttl = ttl
+        self.namespace = namespace
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, *parts) -> str:
+        digest = hashlib.sha256(json.dumps(parts, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+        return f"{self.namespace}:{digest}"
+
+    def get(self, *parts):
+        raw = self.backend.get(self.key(*parts))
+        if raw is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return json.loads(raw)
+
+    def set(self, *parts, value) -> None:
+        self.backend.set(self.key(*parts), json.dumps(value), self.ttl)
+
+    def stats(self) -> dict:
+        return {
+            "backend": type(self.backend).__name__,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.backend.evictions,
+            "ttl_seconds": self.ttl,
+        }
+
+
+def build_backend(kind: str, max_entries: int, path: str = None, namespace: str = None):
+    """
+    kind is one of memory / sqlite / redis / local-redis
+    redis needs the optional `redis` package and REDIS_URL
+    a namespace gets its own sqlite table (and its own max_entries), "cache" is the research cache's table
+    """
+    kind = (kind or "memory").lower()
+    if kind == "sqlite":
+        table = "cache_" + re.sub(r"\W", "_", namespace) if namespace else "cache"
+        return SQLiteBackend(path or os.path.join(tempfile.gettempdir(), "research_cache.db"), max_entries, table)
+    if kind == "redis":
+        import redis  # optional dependency, only needed for this backend
+        return RedisBackend(redis.Redis.from_url(os.getenv("REDIS_URL", "redis://localhost:6379/0")))
+    if kind == "local-redis":
+        return RedisBackend(LocalRedis(max_entries))
+    if kind == "memory":
+        return MemoryBackend(max_entries)
+    raise ValueError(f"Unknown cache backend '{kind}'")
+
+
+def backend_from_env(namespace: str = None):
+    """backend configured from RESEARCH_CACHE_BACKEND / _MAX_ENTRIES / _PATH"""
+    return build_backend(
+        os.getenv("RESEARCH_CACHE_BACKEND", "memory"),
+        int(os.getenv("RESEARCH_CACHE_MAX_ENTRIES", "1024")),
+        os.getenv("RESEARCH_CACHE_PATH"),
+        namespace,
+    )
+
+
+def build_research_cache() -> ResearchCache:
+    return ResearchCache(backend_from_env(), ttl=float(os.getenv("RESEARCH_CACHE_TTL", str(6 * 3600))))
+
+
+def build_content_cache(namespace: str, ttl: float = 7 * 24 * 3600) -> ContentCache:
+    """same backend settings as the research cache, separate key namespace (and sqlite table)"""
+    return ContentCache(backend_from_env(namespace), ttl=ttl, namespace=namespace)
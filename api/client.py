@@ -0,0 +1,240 @@
+# process-wide OpenAI client shared by every agent run
+# - one pooled httpx client: keep-alive connections, HTTP/2 when the optional `h2` package is installed
+# - 429 / 5xx / dropped connections are retried with jittered exponential backoff (Retry-After is honoured)
+#   at the HTTP level, so a retry repeats one model call and not the whole agent run
+# - per-model admission control: a requests-per-minute and a tokens-per-minute bucket per model; calls over
+#   the limit are queued (they wait for their reservation) instead of being sent and failing with 429;
+#   off unless OPENAI_RATE_LIMITS is set, and a call queued for long is reported on stderr
+# OPENAI_BASE_URL points the client at any OpenAI-compatible server, e.g. benchmarks/fake_openai.py
+
+import asyncio
+import hashlib
+import importlib.util
+import json
+import os
+import random
+import sys
+import threading
+import time
+from functools import lru_cache
+
+import httpx
+
+from .metrics import _current_span, metrics
+
+OPENAI_MAX_CONNECTIONS = int(os.getenv("OPENAI_MAX_CONNECTIONS", "64"))
+OPENAI_MAX_RETRIES = int(os.getenv("OPENAI_MAX_RETRIES", "5"))
+OPENAI_BACKOFF_BASE = float(os.getenv("OPENAI_BACKOFF_BASE", "0.5"))
+OPENAI_BACKOFF_MAX = float(os.getenv("OPENAI_BACKOFF_MAX", "30"))
+OPENAI_TIMEOUT = float(os.getenv("OPENAI_TIMEOUT", "600"))
+
+RETRY_STATUS = {408, 409, 429, 500, 502, 503, 504}
+RETRY_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.ReadError, httpx.RemoteProtocolError)
+
+# (requests per minute, tokens per minute) per model, set to the account's tier, e.g.
+# OPENAI_RATE_LIMITS="gpt-4.1=500:30000,gpt-4.1-mini=500:200000,o3=500:30000"; models not listed are not throttled
+OPENAI_RATE_LIMITS = os.getenv("OPENAI_RATE_LIMITS", "")
+# a call queued longer than this is reported, the limits are probably set below what the account allows
+OPENAI_QUEUE_WARN_SECONDS = float(os.getenv("OPENAI_QUEUE_WARN_SECONDS", "10"))
+# output budget assumed for a request that doesn't set max_output_tokens
+DEFAULT_OUTPUT_TOKENS = int(os.getenv("OPENAI_OUTPUT_TOKEN_ESTIMATE", "2000"))
+
+
+def parse_rate_limits(value: str) -> dict:
+    limits = {}
+    for item in filter(None, (part.strip() for part in (value or "").split(","))):
+        model, _, numbers = item.partition("=")
+        rpm, _, tpm = numbers.partition(":")
+        limits[model.strip()] = (float(rpm), float(tpm))
+    return limits
+
+
+class TokenBucket:
+    """
+    reservation-style bucket: a caller always takes its amount and gets back how long to wait,
+    the level can go negative, so callers are served in arrival order
+    """
+
+    def __init__(self, per_minute: float):
+        self.capacity = per_minute
+        self.rate = per_minute / 60
+        self.level = per_minute
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self.level = min(self.capacity, self.level + max(0.0, now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self, amount: float, now: float) -> float:
+        self._refill(now)
+        # a single request bigger than the whole minute budget would otherwise never get in
+        self.level -= min(amount, self.capacity)
+        return max(0.0, -self.level / self.rate)
+
+    def limit(self, remaining: float, now: float) -> None:
+        """the server's view (x-ratelimit-remaining-*) wins when it is lower than ours"""
+        self._refill(now)
+        self.level = min(self.level, remaining)
+
+
+class ModelLimiter:
+    def __init__(self, rpm: float, tpm: float):
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.paused_until = 0.0
+
+    def reserve(self, tokens: int, now: float) -> float:
+        return max(self.paused_until - now, self.requests.reserve(1, now), self.tokens.reserve(tokens, now))
+
+
+class RateLimiter:
+    def __init__(self, limits: dict, warn_after: float = OPENAI_QUEUE_WARN_SECONDS):
+        self.limits = dict(limits)
+        self.warn_after = warn_after
+        self._models = {}
+        self._lock = threading.Lock()
+
+    def _limiter(self, model: str):
+        if model not in self._models:
+            if model not in self.limits:
+                return None
+            self._models[model] = ModelLimiter(*self.limits[model])
+        return self._models[model]
+
+    async def acquire(self, model: str, tokens: int) -> float:
+        """waits until the model has room for the call, returns the seconds spent queued"""
+        with self._lock:
+            limiter = self._limiter(model)
+            wait = limiter.reserve(tokens, time.monotonic()) if limiter else 0.0
+        if wait > self.warn_after:
+            print(f"{model} call queued {wait:.1f}s by OPENAI_RATE_LIMITS ({self.limits[model]})", file=sys.stderr)
+        if wait > 0:
+            await asyncio.sleep(wait)
+        return wait
+
+    def pause(self, model: str, seconds: float) -> None:
+        """after a 429 nobody gets through to that model until the server's retry time has passed"""
+        with self._lock:
+            limiter = self._limiter(model)
+            if limiter:
+                limiter.paused_until = max(limiter.paused_until, time.monotonic() + seconds)
+
+    def observe(self, model: str, headers) -> None:
+        with self._lock:
+            limiter = self._limiter(model)
+            if limiter is None:
+                return
+            now = time.monotonic()
+            for header, bucket in (("x-ratelimit-remaining-requests", limiter.requests), ("x-ratelimit-remaining-tokens", limiter.tokens)):
+                if header in headers:
+                    try:
+                        bucket.limit(float(headers[header]), now)
+                    except ValueError:
+                        pass
+
+
+rate_limiter = RateLimiter(parse_rate_limits(OPENAI_RATE_LIMITS))
+
+
+def request_cost(request: httpx.Request) -> tuple:
+    """(model, estimated tokens) of an API call: ~4 characters per input token plus the output budget"""
+    try:
+        body = json.loads(request.content or b"{}")
+    except (ValueError, httpx.RequestNotRead):
+        return None, 0
+    if not isinstance(body, dict):
+        return None, 0
+    output = body.get("max_output_tokens") or body.get("max_completion_tokens") or body.get("max_tokens") or DEFAULT_OUTPUT_TOKENS
+    return body.get("model"), len(request.content) // 4 + output
+
+
+def prompt_cache_key(agent_name: str, instructions: str) -> str:
+    """
+    sent as `prompt_cache_key`: requests with the same key are routed to the same cache shard,
+    so every run of an agent hits the prompt cache for its (long, static) instructions
+    """
+    digest = hashlib.sha256(instructions.encode("utf-8")).hexdigest()[:16]
+    return f"{agent_name.lower().replace(' ', '-')}-{digest}"
+
+
+def retry_after(headers) -> float:
+    for header, scale in (("retry-after-ms", 0.001), ("retry-after", 1.0)):
+        try:
+            return float(headers[header]) * scale
+        except (KeyError, ValueError):
+            continue
+    return None
+
+
+def backoff(attempt: int, base: float = OPENAI_BACKOFF_BASE, cap: float = OPENAI_BACKOFF_MAX) -> float:
+    """full jitter: uniform between 0 and base * 2^attempt (capped), spreads out a burst of failed calls"""
+    return random.uniform(0, min(cap, base * 2**attempt))
+
+
+class RetryTransport(httpx.AsyncBaseTransport):
+    """admission control + retries around any httpx transport (the real pool, or an ASGI fake in tests)"""
+
+    def __init__(self, transport: httpx.AsyncBaseTransport, limiter: RateLimiter = None, max_retries: int = OPENAI_MAX_RETRIES):
+        self.transport = transport
+        self.limiter = limiter or rate_limiter
+        self.max_retries = max_retries
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        model, tokens = request_cost(request)
+        span = _current_span.get()
+        for attempt in range(self.max_retries + 1):
+            if model:
+                queued = await self.limiter.acquire(model, tokens)
+                if queued and span is not None:
+                    span.set(queued_seconds=round(span.attributes.get("queued_seconds", 0) + queued, 3))
+            try:
+                response = await self.transport.handle_async_request(request)
+            except RETRY_ERRORS:
+                if attempt == self.max_retries:
+                    raise
+                delay = backoff(attempt)
+            else:
+                if model:
+                    self.limiter.observe(model, response.headers)
+                if response.status_code not in RETRY_STATUS or attempt == self.max_retries:
+                    return response
+                delay = retry_after(response.headers)
+                if delay is None:
+                    delay = backoff(attempt)
+                if response.status_code == 429 and model:
+                    self.limiter.pause(model, delay)
+                await response.aclose()
+            metrics.add_retry(span.attributes["stage"] if span is not None else "", model or "")
+            await asyncio.sleep(delay)
+
+    async def aclose(self) -> None:
+        await self.transport.aclose()
+
+
+def build_http_client(transport: httpx.AsyncBaseTransport = None) -> httpx.AsyncClient:
+    if transport is None:
+        transport = httpx.AsyncHTTPTransport(
+            http2=importlib.util.find_spec("h2") is not None,
+            limits=httpx.Limits(
+                max_connections=OPENAI_MAX_CONNECTIONS,
+                max_keepalive_connections=OPENAI_MAX_CONNECTIONS,
+                keepalive_expiry=60,
+            ),
+        )
+    return httpx.AsyncClient(transport=RetryTransport(transport), timeout=httpx.Timeout(OPENAI_TIMEOUT, connect=10))
+
+
+@lru_cache(maxsize=None)
+def get_openai_client():
+    from openai import AsyncOpenAI
+
+    # retries are done by RetryTransport, the SDK's own retry loop would multiply them
+    return AsyncOpenAI(http_client=build_http_client(), max_retries=0)
+
+
+@lru_cache(maxsize=None)
+def install_openai_client() -> None:
+    """make the shared client the agents SDK default, must run before the first agent call"""
+    from agents import set_default_openai_client
+
+    set_default_openai_client(get_openai_client(), use_for_tracing=False)
@@ -0,0 +1,168 @@
+# company name resolution and in-flight request coalescing
+# "Olympus", "olympus corp" and "OLYMPUS Corporation" are the same company: names are canonicalized
+# (accents, punctuation, legal suffixes) and then looked up among the companies already vetted
+# opt in with NAME_MATCH=fuzzy to also match a close spelling against a character trigram index, so it reuses
+# the existing cache / history entry; off by default, "alpha ones" and "alpha one" can be different companies
+# SingleFlight makes N concurrent requests for the same key share one running coroutine
+
+import asyncio
+import os
+import re
+import threading
+import unicodedata
+from collections import defaultdict
+
+NAME_MATCH = os.getenv("NAME_MATCH", "exact").lower()
+NAME_MATCH_THRESHOLD = float(os.getenv("NAME_MATCH_THRESHOLD", "0.85"))
+
+# matched as whole trailing words after punctuation is removed, longest first
+LEGAL_SUFFIXES = sorted(
+    {
+        "corporation", "corp", "incorporated", "inc", "company", "co", "limited", "ltd", "llc", "llp", "lp",
+        "plc", "gmbh", "ag", "kg", "se", "sa", "sas", "sarl", "srl", "spa", "bv", "nv", "ab", "as", "asa",
+        "oy", "oyj", "kk", "pte", "pty", "sl", "sro", "zrt", "kft", "sp z o o", "co ltd", "gmbh co kg",
+    },
+    key=len,
+    reverse=True,
+)
+_SUFFIX = re.compile(r"(?:\s+(?:" + "|".join(re.escape(suffix) for suffix in LEGAL_SUFFIXES) + r"))+$")
+
+
+def canonicalize(name: str) -> str:
+    """'OLYMPUS Corporation' -> 'olympus', 'Société Générale S.A.' -> 'societe generale'"""
+    text = unicodedata.normalize("NFKD", name or "").encode("ascii", "ignore").decode("ascii").lower()
+    text = text.replace("&", " and ")
+    text = re.sub(r"\.", "", text)  # s.r.l. -> srl, co. -> co
+    text = re.sub(r"[^a-z0-9]+", " ", text).strip()
+    text = re.sub(r"^the\s+", "", text)
+    stripped = re.sub(r"\s+and$", "", _SUFFIX.sub("", text)).strip()  # "Smith & Co" -> "smith"
+    # a name that is nothing but a suffix ("AG") stays as it is
+    return stripped or text
+
+
+def trigrams(name: str) -> set:
+    padded = f"  {name} "
+    return {padded[i : i + 3] for i in range(len(padded) - 2)}
+
+
+def similarity(a: set, b: set) -> float:
+    """Dice coefficient of two trigram sets"""
+    if not a or not b:
+        return 0.0
+    return 2 * len(a & b) / (len(a) + len(b))
+
+
+class NameIndex:
+    """
+    names already vetted, per entity type, with a trigram -> names inverted index
+    a match returns the name as it was stored, so rows written before canonicalization are still found
+    only the canonical name is matched unless `fuzzy`, then the closest name above `threshold` as well
+    """
+
+    def __init__(self, threshold: float = NAME_MATCH_THRESHOLD, fuzzy: bool = NAME_MATCH == "fuzzy"):
+        self.threshold = threshold
+        self.fuzzy = fuzzy
+        self._names = defaultdict(dict)  # entity_type -> {canonical name: (stored name, trigrams)}
+        self._postings = defaultdict(lambda: defaultdict(set))  # entity_type -> trigram -> names
+        self._lock = threading.Lock()
+
+    def add(self, entity_type: str, name: str) -> None:
+        canonical = canonicalize(name)
+        with self._lock:
+            if canonical in self._names[entity_type]:
+                return
+            grams = trigrams(canonical)
+            self._names[entity_type][canonical] = (name, grams)
+            for gram in grams:
+                self._postings[entity_type][gram].add(canonical)
+
+    def match(self, entity_type: str, name: str):
+        """(known name, score) of the same canonical name (1.0), else of the closest one if fuzzy, or (None, 0.0)"""
+        canonical = canonicalize(name)
+        with self._lock:
+            names = self._names[entity_type]
+            if canonical in names:
+                return names[canonical][0], 1.0
+            if not self.fuzzy:
+                return None, 0.0
+            grams = trigrams(canonical)
+            # only names sharing at least one trigram are scored
+            candidates = set()
+            for gram in grams:
+                candidates |= self._postings[entity_type].get(gram, set())
+            best, best_score = None, 0.0
+            for candidate in candidates:
+                score = similarity(grams, names[candidate][1])
+                if score > best_score or (score == best_score and best is not None and candidate < best):
+                    best, best_score = candidate, score
+            if best_score >= self.threshold:
+                return names[best][0], best_score
+        return None, 0.0
+
+    def resolve(self, entity_type: str, name: str) -> str:
+        """canonical key for a submitted name: a known match, else the canonical form itself"""
+        return self.resolve_with_score(entity_type, name)[0]
+
+    def resolve_with_score(self, entity_type: str, name: str) -> tuple:
+        """(canonical key, similarity) where the similarity is None unless the key is a different name matched fuzzily"""
+        canonical = canonicalize(name)
+        match, score = self.match(entity_type, name)
+        if match is None:
+            return canonical, None
+        return match, None if canonicalize(match) == canonical else score
+
+    def __len__(self):
+        return sum(len(names) for names in self._names.values())
+
+
+class _Flight:
+    __slots__ = ("task", "waiters")
+
+    def __init__(self, task):
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    concurrent callers with the same key share one task; the task is shielded, so a caller that
+    times out or disconnects doesn't cancel the run for the others. when the last caller still waiting
+    leaves, the task is cancelled: nobody is left to read its result
+    """
+
+    def __init__(self):
+        self._flights = {}
+        self.started = 0
+        self.coalesced = 0
+        self.abandoned = 0
+
+    async def do(self, key, make_coro):
+        flight = self._flights.get(key)
+        if flight is None:
+            self.started += 1
+            flight = _Flight(asyncio.ensure_future(make_coro()))
+            self._flights[key] = flight
+            flight.task.add_done_callback(lambda done: self._land(key, done))
+        else:
+            self.coalesced += 1
+        flight.waiters += 1
+        try:
+            return await asyncio.shield(flight.task)
+        finally:
+            flight.waiters -= 1
+            if not flight.waiters and not flight.task.done():
+                # a caller arriving from now on starts a new run instead of joining a cancelled one
+                if self._flights.get(key) is flight:
+                    del self._flights[key]
+                flight.task.cancel()
+                self.abandoned += 1
+
+    def _land(self, key, task) -> None:
+        flight = self._flights.get(key)
+        if flight is not None and flight.task is task:
+            del self._flights[key]
+        if not task.cancelled():
+            task.exception()  # retrieved here in case every caller gave up waiting
+
+    def stats(self) -> dict:
+        return {"in_flight": len(self._flights), "started": self.started, "coalesced": self.coalesced, "abandoned": self.abandoned}
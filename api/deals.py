@@ -0,0 +1,105 @@
+# deal sessions: the manufacturer, its dealer and the financed asset of one deal researched together
+# WebSearchTool runs inside the Responses API, its results never pass through this process, so they can't be
+# replayed into another run. What one run hands to the next is what it found: its report, the searches it
+# ran and the sources it cited. The anchor entity (the manufacturer, else the first one) is researched first,
+# the related entities then run concurrently with those findings at the end of their prompt and only search
+# for what is specific to them instead of re-discovering the parent company, its news and filings
+# (with SEARCH_PROXY set the searches themselves are cached across runs as well, see search.py)
+
+import os
+import secrets
+
+from .metrics import is_web_search, search_query
+
+DEAL_CONTEXT_CHARS = int(os.getenv("DEAL_CONTEXT_CHARS", "6000"))  # report excerpt handed on per entity
+DEAL_MAX_ENTITIES = int(os.getenv("DEAL_MAX_ENTITIES", "6"))
+
+ANCHOR_ORDER = ("manufacturer", "dealer", "asset")
+
+
+def search_log(result) -> tuple[list, list]:
+    """(queries, cited urls) of a finished agent run, in order"""
+    queries, urls = [], []
+    for item in getattr(result, "new_items", None) or []:
+        raw_item = getattr(item, "raw_item", None)
+        if is_web_search(raw_item):
+            query = search_query(raw_item)
+            if query:
+                queries.append(query)
+        for part in getattr(raw_item, "content", None) or []:
+            for annotation in getattr(part, "annotations", None) or []:
+                if getattr(annotation, "type", None) == "url_citation" and getattr(annotation, "url", None):
+                    urls.append(annotation.url)
+    return queries, urls
+
+
+def report_excerpt(raw_content: str, limit: int = DEAL_CONTEXT_CHARS) -> str:
+    """the report without its ```json block, cut at a paragraph within `limit` characters"""
+    text = (raw_content or "").split("```json")[0].strip()
+    if len(text) <= limit:
+        return text
+    cut = text.rfind("\n\n", 0, limit)
+    return text[: cut if cut > limit // 2 else limit].rstrip() + "\n[...]"
+
+
+class DealSession:
+    """what the runs of one deal have found so far, handed to the runs that start after them"""
+
+    def __init__(self, entities: list[tuple[str, str]]):
+        # (entity_type, company_name), duplicates dropped, the anchor first and the rest in request order
+        unique = list(dict.fromkeys(entities))
+        anchor = min(unique, key=lambda entity: ANCHOR_ORDER.index(entity[0]) if entity[0] in ANCHOR_ORDER else len(ANCHOR_ORDER))
+        self.entities = [anchor] + [entity for entity in unique if entity != anchor]
+        self.id = secrets.token_hex(8)
+        self.findings = {}  # (entity_type, company_name) -> report excerpt
+        self.queries = {}  # query -> entity that ran it first
+        self.sources = {}  # url -> entity that cited it first
+        self.searches = {}  # (entity_type, company_name) -> web searches of its run (0 when cached)
+
+    @property
+    def anchor(self) -> tuple[str, str]:
+        return self.entities[0]
+
+    @property
+    def related(self) -> list[tuple[str, str]]:
+        return self.entities[1:]
+
+    def add(self, entity_type: str, company_name: str, raw_content: str, result=None) -> None:
+        """findings of a finished run (result=None for a cached one: no searches)"""
+        entity = (entity_type, company_name)
+        queries, urls = search_log(result) if result is not None else ([], [])
+        self.findings[entity] = report_excerpt(raw_content)
+        self.searches[entity] = len(queries)
+        for query in queries:
+            self.queries.setdefault(query, entity)
+        for url in urls:
+            self.sources.setdefault(url, entity)
+
+    def context_for(self, entity_type: str, company_name: str) -> str:
+        """prompt tail for one entity: the rest of the deal and everything the earlier runs found"""
+        others = [f"{other_type}: {other_name}" for other_type, other_name in self.entities if (other_type, other_name) != (entity_type, company_name)]
+        if not others:
+            return ""
+        lines = [f"Deal context: this company is vetted together with {', '.join(others)}."]
+        found = {entity: text for entity, text in self.findings.items() if entity != (entity_type, company_name) and text}
+        if found:
+            lines.append(
+                "Already researched in this session, reuse these findings and only search for what is specific to this company:"
+            )
+            for (other_type, other_name), text in found.items():
+                lines.append(f"### {other_type}: {other_name}\n{text}")
+        if self.queries:
+            lines.append("Web searches already run: " + "; ".join(f'"{query}"' for query in self.queries))
+        if self.sources:
+            lines.append("Sources already cited: " + ", ".join(self.sources))
+        return "\n\n".join(lines)
+
+    def report(self) -> dict:
+        return {
+            "id": self.id,
+            "anchor": f"{self.anchor[0]}: {self.anchor[1]}",
+            "web_searches": {f"{entity_type}: {name}": count for (entity_type, name), count in self.searches.items()},
+            "total_web_searches": sum(self.searches.values()),
+            "shared_queries": len(self.queries),
+            "shared_sources": len(self.sources),
+        }
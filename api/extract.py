@@ -0,0 +1,170 @@
+# pulls the structured data block out of the research agent's markdown (or its structured JSON output)
+# strict json.loads first; when the block is malformed or cut off (truncated output, trailing commas,
+# a missing closing fence) a tolerant parser repairs it instead of throwing the whole run away
+# IncrementalJSONParser gives best-effort snapshots of a JSON document while it is still streaming in
+
+import json
+import re
+
+JSON_BLOCK = re.compile(r"```json\s*(\{.*?\})\s*```", re.DOTALL)
+JSON_BLOCK_START = re.compile(r"```json\s*", re.DOTALL)
+
+_CLOSERS = {"{": "}", "[": "]"}
+
+
+def repair_json(text: str, partial_values: bool = False) -> str:
+    """
+    best-effort repair of a truncated or sloppy JSON document:
+    drops trailing commas, closes every open object/array and cuts a dangling key.
+    an object value the text stops inside of becomes "Unknown" ("act" may have been "active", 6 may have been 65),
+    a cut-off array item is dropped; partial_values=True closes an open string / number instead (streamed previews)
+    """
+    out = []
+    frames = []  # one [opener, expecting] per open container, expecting is "key" or "value"
+    in_string = False
+    string_is_key = False
+    escaped = False
+    token = ""  # number / true / false / null being read
+    safe = 0  # length of `out` after the last complete value, everything up to here can be closed
+    value_start = 0  # length of `out` before the string / literal being read
+
+    def finish_token():
+        nonlocal token, safe
+        if token:
+            safe = len(out)
+            token = ""
+
+    for ch in text:
+        if in_string:
+            out.append(ch)
+            if escaped:
+                escaped = False
+            elif ch == "\\":
+                escaped = True
+            elif ch == '"':
+                in_string = False
+                if not string_is_key:
+                    safe = len(out)
+            continue
+        if ch in " \t\r\n":
+            finish_token()
+            out.append(ch)
+        elif ch == '"':
+            finish_token()
+            in_string = True
+            string_is_key = bool(frames) and frames[-1][0] == "{" and frames[-1][1] == "key"
+            value_start = len(out)
+            out.append(ch)
+        elif ch in "{[":
+            finish_token()
+            frames.append([ch, "key" if ch == "{" else "value"])
+            out.append(ch)
+            safe = len(out)
+        elif ch in "}]":
+            finish_token()
+            if not frames:
+                break  # trailing junk after the document
+            while out and out[-1] in " \t\r\n,":
+                out.pop()
+            frames.pop()
+            out.append(ch)
+            safe = len(out)
+            if not frames:
+                break
+        elif ch == ",":
+            finish_token()
+            if frames:
+                frames[-1][1] = "key" if frames[-1][0] == "{" else "value"
+            out.append(ch)
+        elif ch == ":":
+            finish_token()
+            if frames:
+                frames[-1][1] = "value"
+            out.append(ch)
+        else:
+            if not token:
+                value_start = len(out)
+            token += ch
+            out.append(ch)
+
+    if not frames:
+        return "".join(out)
+    cut_value = (in_string and not string_is_key) or (token and token not in ("true", "false", "null"))
+    if token in ("true", "false", "null"):
+        safe = len(out)
+    elif cut_value and partial_values:
+        if in_string:
+            if escaped:
+                out.pop()
+            out.append('"')
+            safe = len(out)
+        else:
+            try:
+                json.loads(token)
+                safe = len(out)
+            except json.JSONDecodeError:
+                pass
+    elif cut_value and frames[-1][0] == "{":
+        del out[value_start:]
+        out.append('"Unknown"')
+        safe = len(out)
+    # nothing opened or closed after `safe`, so the open frames are still the ones to close
+    repaired = "".join(out[:safe]).rstrip().rstrip(",")
+    return repaired + "".join(_CLOSERS[opener] for opener, _ in reversed(frames))
+
+
+def parse_partial_json(text: str, partial_values: bool = False):
+    """dict parsed from a possibly incomplete JSON object, or None (partial_values: see repair_json)"""
+    start = (text or "").find("{")
+    if start < 0:
+        return None
+    try:
+        return json.loads(text[start:])
+    except json.JSONDecodeError:
+        pass
+    try:
+        value = json.loads(repair_json(text[start:], partial_values))
+    except json.JSONDecodeError:
+        return None
+    return value if isinstance(value, dict) else None
+
+
+def extract_json_from_markdown(text):
+    text = text or ""
+    match = JSON_BLOCK.search(text)
+    if match:
+        try:
+            return json.loads(match.group(1))
+        except json.JSONDecodeError:
+            pass
+    # fallback: malformed or unterminated ```json block
+    start = JSON_BLOCK_START.search(text)
+    if start:
+        body = text[start.end():]
+        fence = body.find("```")
+        return parse_partial_json(body if fence < 0 else body[:fence])
+    return None
+
+
+class IncrementalJSONParser:
+    """
+    feed streamed text deltas, snapshot() returns the best current reading of the document
+    the buffer is re-parsed at most once per `parse_every` new characters so a long stream stays linear-ish
+    """
+
+    def __init__(self, parse_every: int = 128):
+        self.buffer = ""
+        self.parse_every = parse_every
+        self._snapshot = None
+        self._parsed_length = -1
+
+    def feed(self, delta: str) -> None:
+        self.buffer += delta
+
+    def snapshot(self, force: bool = False):
+        grown = len(self.buffer) - self._parsed_length
+        if grown and (force or grown >= self.parse_every or self._parsed_length < 0):
+            self._parsed_length = len(self.buffer)
+            # a preview: the string still being written is shown as far as it got
+            self._snapshot = parse_partial_json(self.buffer, partial_values=True) or self._snapshot
+        return self._snapshot
@@ -0,0 +1,109 @@
+# targeted follow-up searches for fields the research agent left as 'Unknown'
+# instead of re-running the whole research agent, every rule with missing inputs gets its own
+# small, narrowly scoped agent run (cheap model, low search context, tight token budget), all in parallel
+# answers are merged back into structured_data only where the field was missing
+
+import asyncio
+import json
+import os
+from functools import lru_cache
+
+from .extract import extract_json_from_markdown
+from .runner import run_agent
+from .search import search_tools
+from .rules.rule_engine import RuleEngine
+
+UNKNOWN_VALUES = {"", "unknown", "n/a", "na", "none found", "not found", "not available"}
+
+GAP_FILL_MODEL = os.getenv("GAP_FILL_MODEL", "gpt-4.1-mini")
+GAP_FILL_MAX_TOKENS = int(os.getenv("GAP_FILL_MAX_TOKENS", "600"))
+GAP_FILL_MAX_GROUPS = int(os.getenv("GAP_FILL_MAX_GROUPS", "6"))
+GAP_FILL_TIMEOUT = float(os.getenv("GAP_FILL_TIMEOUT", "45"))
+
+GAP_FILL_INSTRUCTIONS = (
+    "You look up a few specific data points about a company for a risk vetting file.\n"
+    "Search the web only for the fields you are asked about, prefer official registries, filings and the company's own pages.\n"
+    "Do not write any analysis. Reply with a single ```json block containing exactly the requested keys.\n"
+    "Use numbers for years and percentages (e.g. 35 for 35%). If a value cannot be found, write 'Unknown'. Never guess."
+)
+
+
+@lru_cache(maxsize=None)
+def get_gap_fill_agent():
+    # built on first use, see get_research_agent in agents.py
+    from agents import Agent, ModelSettings
+    from .client import prompt_cache_key
+
+    return Agent(
+        name="Gap Fill Agent",
+        model=GAP_FILL_MODEL,
+        instructions=GAP_FILL_INSTRUCTIONS,
+        tools=search_tools(search_context_size="low"),
+        model_settings=ModelSettings(
+            max_tokens=GAP_FILL_MAX_TOKENS,
+            extra_body={"prompt_cache_key": prompt_cache_key("Gap Fill Agent", GAP_FILL_INSTRUCTIONS)},
+        ),
+    )
+
+
+def is_missing(value) -> bool:
+    return value is None or (isinstance(value, str) and value.strip().lower() in UNKNOWN_VALUES)
+
+
+def missing_field_groups(entity_type: str, data: dict) -> dict:
+    """{rule: [missing fields]} for the entity's rules, each field asked for once"""
+    groups = {}
+    seen = set()
+    for rule in RuleEngine.compile(entity_type).rules:
+        fields = sorted(field for field in rule.fields - seen if is_missing(data.get(field)))
+        seen.update(fields)
+        if fields:
+            groups[rule.key] = fields
+    return groups
+
+
+def build_gap_prompt(entity_type: str, company_name: str, rule_name: str, fields: list) -> str:
+    return (
+        f"Company: {company_name} (vetted as a {entity_type}).\n"
+        f"Needed for the '{rule_name}' risk check. Find only these fields: {', '.join(fields)}.\n"
+        "Return them as:\n```json\n" + json.dumps({field: "..." for field in fields}, indent=2) + "\n```"
+    )
+
+
+async def fill_group(entity_type: str, company_name: str, rule_key: str, fields: list, timeout: float) -> dict:
+    rule_name = next(rule.name for rule in RuleEngine.compile(entity_type).rules if rule.key == rule_key)
+    try:
+        result = await asyncio.wait_for(
+            run_agent(get_gap_fill_agent(), build_gap_prompt(entity_type, company_name, rule_name, fields), "gap_fill"),
+            timeout,
+        )
+    except Exception:
+        # a failed follow-up never fails the research request, the field just stays Unknown
+        return {}
+    answer = extract_json_from_markdown(result.final_output) or {}
+    return {field: answer[field] for field in fields if field in answer and not is_missing(answer[field])}
+
+
+async def fill_gaps(entity_type: str, company_name: str, data: dict, timeout: float = GAP_FILL_TIMEOUT) -> tuple:
+    """returns (merged structured_data, report) where report lists what was missing, filled and still missing"""
+    groups = missing_field_groups(entity_type, data)
+    selected = dict(list(groups.items())[:GAP_FILL_MAX_GROUPS])
+    answers = await asyncio.gather(
+        *(fill_group(entity_type, company_name, key, fields, timeout) for key, fields in selected.items())
+    )
+
+    merged = dict(data)
+    filled = {}
+    for answer in answers:
+        for field, value in answer.items():
+            if is_missing(merged.get(field)):
+                merged[field] = value
+                filled[field] = value
+
+    missing_before = sorted({field for fields in groups.values() for field in fields})
+    return merged, {
+        "missing_before": missing_before,
+        "filled": sorted(filled),
+        "still_missing": [field for field in missing_before if field not in filled],
+        "runs": len(selected),
+    }
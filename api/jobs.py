@@ -0,0 +1,308 @@
+# durable job queue for long research runs, so no HTTP connection has to stay open for a whole agent run
+# POST /jobs enqueues and returns an id at once, a pool of in-process workers drains the queue
+# - SQLite in WAL mode: jobs survive restarts and other processes can read status while workers write
+# - higher priority first, then oldest first; a running job's lease is renewed by its worker, so only the job of
+#   a dead worker expires and is picked up again (and failed instead once it has used up its attempts)
+# - only the worker holding a job can record its outcome, a worker that lost its lease can't overwrite the new one
+# - an idempotency key returns the existing job instead of enqueueing the same work twice
+# - job_events keeps the progress of every job (stage started / finished, retries, outcome)
+
+import asyncio
+import json
+import os
+import secrets
+import sqlite3
+import tempfile
+import threading
+import time
+
+from .metrics import stage_listener
+
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "4"))
+JOB_LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", "900"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "2"))
+JOB_POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", "1.0"))
+
+TERMINAL = ("succeeded", "failed", "cancelled")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    priority INTEGER NOT NULL DEFAULT 0,
+    status TEXT NOT NULL,
+    idempotency_key TEXT UNIQUE,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL,
+    available_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL,
+    lease_expires_at REAL,
+    worker TEXT,
+    result TEXT,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS jobs_ready ON jobs(status, priority DESC, available_at, created_at);
+
+CREATE TABLE IF NOT EXISTS job_events (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    job_id TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    event TEXT NOT NULL,
+    data TEXT
+);
+CREATE INDEX IF NOT EXISTS job_events_job ON job_events(job_id, seq);
+"""
+
+COLUMNS = (
+    "id", "kind", "payload", "priority", "status", "idempotency_key", "attempts", "created_at", "available_at",
+    "started_at", "finished_at", "lease_expires_at", "worker", "result", "error",
+)
+
+
+def _row_to_job(row) -> dict:
+    job = dict(zip(COLUMNS, row))
+    job["payload"] = json.loads(job["payload"])
+    job["result"] = json.loads(job["result"]) if job["result"] else None
+    return job
+
+
+class JobQueue:
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("PRAGMA busy_timeout=5000")
+        self._conn.executescript(SCHEMA)
+        self.wakeup = None  # asyncio.Event set on enqueue, so idle in-process workers don't wait for the poll
+
+    def enqueue(self, kind: str, payload: dict, priority: int = 0, idempotency_key: str = None) -> tuple:
+        """returns (job, created); with a known idempotency key the existing job comes back with created=False"""
+        now = time.time()
+        job_id = secrets.token_hex(12)
+        with self._lock:
+            try:
+                self._conn.execute(
+                    "INSERT INTO jobs (id, kind, payload, priority, status, idempotency_key, created_at, available_at)"
+                    " VALUES (?, ?, ?, ?, 'queued', ?, ?, ?)",
+                    (job_id, kind, json.dumps(payload), priority, idempotency_key, now, now),
+                )
+            except sqlite3.IntegrityError:
+                row = self._conn.execute(
+                    f"SELECT {', '.join(COLUMNS)} FROM jobs WHERE idempotency_key = ?", (idempotency_key,)
+                ).fetchone()
+                return _row_to_job(row), False
+            self._add_event(job_id, "queued", {"priority": priority})
+        if self.wakeup is not None:
+            self.wakeup.set()
+        return self.get(job_id), True
+
+    def get(self, job_id: str):
+        with self._lock:
+            row = self._conn.execute(f"SELECT {', '.join(COLUMNS)} FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return _row_to_job(row) if row else None
+
+    def claim(self, worker: str, lease: float = JOB_LEASE_SECONDS, max_attempts: int = JOB_MAX_ATTEMPTS):
+        """
+        atomically take the next ready job (or one whose lease ran out), None when the queue is empty
+        a job whose lease ran out after its last attempt (its worker died running it) is failed, not run again
+        """
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                while True:
+                    row = self._conn.execute(
+                        "SELECT id, status, attempts FROM jobs"
+                        " WHERE (status = 'queued' AND available_at <= ?) OR (status = 'running' AND lease_expires_at < ?)"
+                        " ORDER BY priority DESC, available_at, created_at LIMIT 1",
+                        (now, now),
+                    ).fetchone()
+                    if row is None:
+                        self._conn.execute("COMMIT")
+                        return None
+                    job_id, status, attempts = row
+                    if status == "running":
+                        self._add_event(job_id, "lease_expired", {})
+                    if attempts < max_attempts:
+                        break
+                    error = f"lease expired after {attempts} attempts"
+                    self._conn.execute(
+                        "UPDATE jobs SET status = 'failed', error = ?, finished_at = ?, lease_expires_at = NULL WHERE id = ?",
+                        (error, now, job_id),
+                    )
+                    self._add_event(job_id, "failed", {"error": error})
+                self._conn.execute(
+                    "UPDATE jobs SET status = 'running', attempts = attempts + 1, started_at = ?, lease_expires_at = ?, worker = ?"
+                    " WHERE id = ?",
+                    (now, now + lease, worker, job_id),
+                )
+                self._add_event(job_id, "started", {"worker": worker})
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return self.get(job_id)
+
+    def heartbeat(self, job_id: str, worker: str, lease: float = JOB_LEASE_SECONDS) -> bool:
+        """extend the lease of a job the worker still holds, False once another worker has taken it over"""
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE jobs SET lease_expires_at = ? WHERE id = ? AND worker = ? AND status = 'running'",
+                (time.time() + lease, job_id, worker),
+            )
+            return bool(cursor.rowcount)
+
+    def finish(self, job_id: str, worker: str, status: str, result: dict = None, error: str = None) -> bool:
+        """record the outcome, dropped (False) when the worker no longer holds the job"""
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE jobs SET status = ?, result = ?, error = ?, finished_at = ?, lease_expires_at = NULL"
+                " WHERE id = ? AND worker = ? AND status = 'running'",
+                (status, json.dumps(result, default=str) if result is not None else None, error, time.time(), job_id, worker),
+            )
+            if cursor.rowcount:
+                self._add_event(job_id, status, {"error": error} if error else {})
+            return bool(cursor.rowcount)
+
+    def retry(self, job_id: str, worker: str, error: str, delay: float) -> bool:
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE jobs SET status = 'queued', error = ?, available_at = ?, lease_expires_at = NULL, worker = NULL"
+                " WHERE id = ? AND worker = ? AND status = 'running'",
+                (error, time.time() + delay, job_id, worker),
+            )
+            if cursor.rowcount:
+                self._add_event(job_id, "retry_scheduled", {"error": error, "delay": delay})
+            return bool(cursor.rowcount)
+
+    def release(self, worker: str) -> int:
+        """put a stopping worker's running jobs back in the queue"""
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE jobs SET status = 'queued', attempts = MAX(attempts - 1, 0), lease_expires_at = NULL, worker = NULL"
+                " WHERE status = 'running' AND worker = ?",
+                (worker,),
+            )
+            return cursor.rowcount
+
+    def cancel(self, job_id: str) -> bool:
+        """only queued jobs can be cancelled"""
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE jobs SET status = 'cancelled', finished_at = ? WHERE id = ? AND status = 'queued'", (time.time(), job_id)
+            )
+            if cursor.rowcount:
+                self._add_event(job_id, "cancelled", {})
+            return bool(cursor.rowcount)
+
+    def add_event(self, job_id: str, event: str, data: dict = None) -> None:
+        with self._lock:
+            self._add_event(job_id, event, data)
+
+    def _add_event(self, job_id: str, event: str, data: dict = None) -> None:
+        self._conn.execute(
+            "INSERT INTO job_events (job_id, created_at, event, data) VALUES (?, ?, ?, ?)",
+            (job_id, time.time(), event, json.dumps(data or {}, default=str)),
+        )
+
+    def events(self, job_id: str, after: int = 0) -> list:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT seq, created_at, event, data FROM job_events WHERE job_id = ? AND seq > ? ORDER BY seq",
+                (job_id, after),
+            ).fetchall()
+        return [{"seq": seq, "created_at": created_at, "event": event, "data": json.loads(data)} for seq, created_at, event, data in rows]
+
+    def stats(self) -> dict:
+        with self._lock:
+            rows = self._conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        return dict(rows)
+
+
+class WorkerPool:
+    """
+    `concurrency` asyncio workers draining the queue; handlers maps a job kind to
+    async handler(payload, emit) -> result dict, emit(event, data) appends a progress event
+    """
+
+    def __init__(self, queue: JobQueue, handlers: dict, concurrency: int = JOB_WORKERS,
+                 max_attempts: int = JOB_MAX_ATTEMPTS, poll_interval: float = JOB_POLL_INTERVAL, retry_base: float = 2.0,
+                 lease: float = JOB_LEASE_SECONDS):
+        self.queue = queue
+        self.handlers = handlers
+        self.concurrency = concurrency
+        self.max_attempts = max_attempts
+        self.lease = lease  # renewed every lease / 3 while the job runs, so only a dead worker's job expires
+        self.poll_interval = poll_interval
+        self.retry_base = retry_base  # a failed attempt is retried after retry_base * 2^(attempts - 1) seconds
+        self.name = f"worker-{os.getpid()}-{secrets.token_hex(3)}"
+        self._tasks = []
+
+    def start(self) -> None:
+        self.queue.wakeup = asyncio.Event()
+        self._tasks = [asyncio.create_task(self._work(f"{self.name}-{i}")) for i in range(self.concurrency)]
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        for i in range(self.concurrency):
+            self.queue.release(f"{self.name}-{i}")
+        self._tasks = []
+
+    async def _work(self, worker: str) -> None:
+        while True:
+            job = self.queue.claim(worker, self.lease, self.max_attempts)
+            if job is None:
+                self.queue.wakeup.clear()
+                try:
+                    await asyncio.wait_for(self.queue.wakeup.wait(), self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            await self.run_job(job)
+
+    async def run_job(self, job: dict) -> None:
+        worker = job["worker"]
+        handler = self.handlers.get(job["kind"])
+        if handler is None:
+            self.queue.finish(job["id"], worker, "failed", error=f"Unknown job kind '{job['kind']}'")
+            return
+
+        def emit(event: str, data: dict = None) -> None:
+            self.queue.add_event(job["id"], event, data)
+
+        # every pipeline stage the handler runs (research, gap_fill, rules, ...) becomes a progress event
+        token = stage_listener.set(emit)
+        heartbeat = asyncio.create_task(self._heartbeat(job["id"], worker))
+        try:
+            result = await handler(job["payload"], emit)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+            if job["attempts"] < self.max_attempts:
+                self.queue.retry(job["id"], worker, error, delay=min(60, self.retry_base * 2 ** (job["attempts"] - 1)))
+            else:
+                self.queue.finish(job["id"], worker, "failed", error=error)
+            return
+        finally:
+            heartbeat.cancel()
+            stage_listener.reset(token)
+        if isinstance(result, dict) and result.get("error"):
+            self.queue.finish(job["id"], worker, "failed", result=result, error=result["error"])
+        else:
+            self.queue.finish(job["id"], worker, "succeeded", result=result)
+
+    async def _heartbeat(self, job_id: str, worker: str) -> None:
+        while True:
+            await asyncio.sleep(self.lease / 3)
+            if not self.queue.heartbeat(job_id, worker, self.lease):
+                return  # taken over after all (e.g. this process was frozen), finish() will drop our result
+
+def build_job_queue() -> JobQueue:
+    return JobQueue(os.getenv("JOBS_DB_PATH", os.path.join(tempfile.gettempdir(), "agent_jobs.db")))
@@ -0,0 +1,216 @@
+# per-stage latency / token instrumentation for the agent pipeline
+# every stage (agent runs, JSON extraction, rule evaluation, ...) records wall time and outcome,
+# agent stages also record model, input/output/cached tokens, web search calls and retries
+# exposed as Prometheus text on /metrics; set AGENTS_TRACE_FILE to also write OpenTelemetry-style
+# spans (one JSON object per line) to a local file
+
+import contextvars
+import json
+import os
+import secrets
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+BUCKETS = (0.005, 0.01, 0.05, 0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+_current_span = contextvars.ContextVar("current_span", default=None)
+# optional callback(event, data) told about every stage start / finish in the current context (job progress)
+stage_listener = contextvars.ContextVar("stage_listener", default=None)
+
+
+class Span:
+    __slots__ = ("name", "trace_id", "span_id", "parent_id", "start", "end", "attributes", "status")
+
+    def __init__(self, name: str, parent=None, attributes: dict = None):
+        self.name = name
+        self.trace_id = parent.trace_id if parent else secrets.token_hex(16)
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent.span_id if parent else None
+        self.start = time.time_ns()
+        self.end = None
+        self.attributes = dict(attributes or {})
+        self.status = "OK"
+
+    def set(self, **attributes) -> None:
+        self.attributes.update(attributes)
+
+    @property
+    def seconds(self) -> float:
+        return ((self.end or time.time_ns()) - self.start) / 1e9
+
+    def to_dict(self) -> dict:
+        return {
+            "name": self.name,
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_span_id": self.parent_id,
+            "start_time_unix_nano": self.start,
+            "end_time_unix_nano": self.end,
+            "attributes": self.attributes,
+            "status": {"code": self.status},
+        }
+
+
+class FileSpanExporter:
+    """appends finished spans as JSON lines"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def export(self, span: Span) -> None:
+        line = json.dumps(span.to_dict(), default=str)
+        with self._lock, open(self.path, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+
+
+class Metrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.stage_seconds = defaultdict(lambda: [0] * (len(BUCKETS) + 1))  # (stage, model) -> bucket counts
+        self.stage_sum = defaultdict(float)
+        self.stage_count = defaultdict(int)  # (stage, model, outcome)
+        self.tokens = defaultdict(int)  # (stage, model, kind)
+        self.web_searches = defaultdict(int)  # (stage, model)
+        self.retries = defaultdict(int)  # (stage, model)
+
+    def observe_stage(self, stage: str, model: str, seconds: float, outcome: str) -> None:
+        with self._lock:
+            buckets = self.stage_seconds[(stage, model)]
+            for i, bound in enumerate(BUCKETS):
+                if seconds <= bound:
+                    buckets[i] += 1
+                    break
+            else:
+                buckets[-1] += 1
+            self.stage_sum[(stage, model)] += seconds
+            self.stage_count[(stage, model, outcome)] += 1
+
+    def add_tokens(self, stage: str, model: str, kind: str, count: int) -> None:
+        if count:
+            with self._lock:
+                self.tokens[(stage, model, kind)] += count
+
+    def add_web_searches(self, stage: str, model: str, count: int) -> None:
+        if count:
+            with self._lock:
+                self.web_searches[(stage, model)] += count
+
+    def add_retry(self, stage: str, model: str) -> None:
+        with self._lock:
+            self.retries[(stage, model)] += 1
+
+    def render_prometheus(self) -> str:
+        def labels(**values):
+            return "{" + ",".join(f'{k}="{v}"' for k, v in values.items()) + "}"
+
+        lines = [
+            "# HELP agents_stage_seconds Wall time per pipeline stage",
+            "# TYPE agents_stage_seconds histogram",
+        ]
+        with self._lock:
+            for (stage, model), buckets in sorted(self.stage_seconds.items()):
+                cumulative = 0
+                for bound, count in zip(BUCKETS + ("+Inf",), buckets):
+                    cumulative += count
+                    lines.append(f"agents_stage_seconds_bucket{labels(stage=stage, model=model, le=bound)} {cumulative}")
+                lines.append(f"agents_stage_seconds_sum{labels(stage=stage, model=model)} {self.stage_sum[(stage, model)]:.6f}")
+                lines.append(f"agents_stage_seconds_count{labels(stage=stage, model=model)} {cumulative}")
+
+            lines += ["# HELP agents_stage_runs_total Stage runs by outcome", "# TYPE agents_stage_runs_total counter"]
+            for (stage, model, outcome), count in sorted(self.stage_count.items()):
+                lines.append(f"agents_stage_runs_total{labels(stage=stage, model=model, outcome=outcome)} {count}")
+
+            lines += ["# HELP agents_tokens_total LLM tokens by kind (input, output, cached_input, reasoning)", "# TYPE agents_tokens_total counter"]
+            for (stage, model, kind), count in sorted(self.tokens.items()):
+                lines.append(f"agents_tokens_total{labels(stage=stage, model=model, kind=kind)} {count}")
+
+            lines += ["# HELP agents_web_search_calls_total Web search calls (hosted or through the search proxy)", "# TYPE agents_web_search_calls_total counter"]
+            for (stage, model), count in sorted(self.web_searches.items()):
+                lines.append(f"agents_web_search_calls_total{labels(stage=stage, model=model)} {count}")
+
+            lines += ["# HELP agents_retries_total Retried LLM calls", "# TYPE agents_retries_total counter"]
+            for (stage, model), count in sorted(self.retries.items()):
+                lines.append(f"agents_retries_total{labels(stage=stage, model=model)} {count}")
+        return "\n".join(lines) + "\n"
+
+
+metrics = Metrics()
+exporter = FileSpanExporter(os.environ["AGENTS_TRACE_FILE"]) if os.getenv("AGENTS_TRACE_FILE") else None
+
+
+@contextmanager
+def stage(name: str, model: str = "", **attributes):
+    """times a block as one pipeline stage, nested stages become child spans"""
+    span = Span(name, _current_span.get(), {"stage": name, "model": model, **attributes})
+    token = _current_span.set(span)
+    listener = stage_listener.get()
+    if listener is not None:
+        listener("stage_started", {"stage": name, "model": model})
+    try:
+        yield span
+    except BaseException as e:
+        span.status = "ERROR"
+        span.set(error=type(e).__name__)
+        raise
+    finally:
+        _current_span.reset(token)
+        span.end = time.time_ns()
+        metrics.observe_stage(name, model, span.seconds, "error" if span.status == "ERROR" else "ok")
+        if exporter is not None:
+            exporter.export(span)
+        if listener is not None:
+            listener("stage_finished", {"stage": name, "seconds": round(span.seconds, 3), "status": span.status})
+
+
+def is_web_search(raw_item) -> bool:
+    """a hosted web_search_call, or a call of the search proxy's web_search function tool (see search.py)"""
+    item_type = getattr(raw_item, "type", None)
+    return item_type == "web_search_call" or (item_type == "function_call" and getattr(raw_item, "name", None) == "web_search")
+
+
+def search_query(raw_item):
+    """the query of a web search item, None when it has none"""
+    if getattr(raw_item, "type", None) == "function_call":
+        try:
+            return json.loads(raw_item.arguments or "{}").get("query")
+        except (ValueError, AttributeError):
+            return None
+    return getattr(getattr(raw_item, "action", None), "query", None)
+
+
+def record_run_usage(span: Span, result) -> None:
+    """token and tool counts of a finished (or streamed and drained) agent run"""
+    stage_name = span.attributes["stage"]
+    model = span.attributes["model"]
+    usage = result.context_wrapper.usage
+    cached = getattr(getattr(usage, "input_tokens_details", None), "cached_tokens", 0) or 0
+    reasoning = getattr(getattr(usage, "output_tokens_details", None), "reasoning_tokens", 0) or 0
+    searches = sum(1 for item in result.new_items if is_web_search(getattr(item, "raw_item", None)))
+    metrics.add_tokens(stage_name, model, "input", usage.input_tokens)
+    metrics.add_tokens(stage_name, model, "output", usage.output_tokens)
+    metrics.add_tokens(stage_name, model, "cached_input", cached)
+    metrics.add_tokens(stage_name, model, "reasoning", reasoning)
+    metrics.add_web_searches(stage_name, model, searches)
+    span.set(
+        requests=usage.requests,
+        input_tokens=usage.input_tokens,
+        output_tokens=usage.output_tokens,
+        cached_input_tokens=cached,
+        cached_input_ratio=round(cached / usage.input_tokens, 3) if usage.input_tokens else 0.0,
+        web_search_calls=searches,
+    )
+
+
+def usage_summary(result) -> dict:
+    """tokens of one agent run; cached_input_ratio is the share of the prompt served from the provider's prompt cache"""
+    usage = result.context_wrapper.usage
+    cached = getattr(getattr(usage, "input_tokens_details", None), "cached_tokens", 0) or 0
+    return {
+        "input_tokens": usage.input_tokens,
+        "cached_input_tokens": cached,
+        "cached_input_ratio": round(cached / usage.input_tokens, 3) if usage.input_tokens else 0.0,
+        "output_tokens": usage.output_tokens,
+    }
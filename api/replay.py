@@ -0,0 +1,169 @@
+# offline stand-ins for live agent runs, so the pipeline can be tested and benchmarked without LLM calls
+# AGENTS_REPLAY=record  every run_agent call is also written to AGENTS_REPLAY_DIR as one JSON fixture
+# AGENTS_REPLAY=replay  run_agent answers from those fixtures only, a missing fixture is an error (never a live call)
+# fixtures are keyed on (stage, agent name, model, instructions, prompt) with calendar dates masked,
+# so a recording made today still replays tomorrow
+# StubRunner returns canned outputs after a configurable latency (used by benchmarks/pipeline.py)
+
+import asyncio
+import hashlib
+import json
+import os
+import re
+from types import SimpleNamespace
+
+AGENTS_REPLAY = os.getenv("AGENTS_REPLAY", "").lower()
+AGENTS_REPLAY_DIR = os.getenv("AGENTS_REPLAY_DIR", os.path.join("api", "fixtures", "replay"))
+
+_DATE = re.compile(
+    r"\b(?:January|February|March|April|May|June|July|August|September|October|November|December) \d{1,2}, \d{4}\b"
+)
+
+
+class ReplayMiss(LookupError):
+    pass
+
+
+def make_usage(input_tokens: int = 0, output_tokens: int = 0, cached_tokens: int = 0, requests: int = 1):
+    return SimpleNamespace(
+        requests=requests,
+        input_tokens=input_tokens,
+        output_tokens=output_tokens,
+        total_tokens=input_tokens + output_tokens,
+        input_tokens_details=SimpleNamespace(cached_tokens=cached_tokens),
+        output_tokens_details=SimpleNamespace(reasoning_tokens=0),
+    )
+
+
+class ReplayResult:
+    """the parts of RunResult the API reads: final_output, new_items and context_wrapper.usage"""
+
+    def __init__(self, final_output, usage=None):
+        self.final_output = final_output
+        self.new_items = []
+        self.context_wrapper = SimpleNamespace(usage=usage or make_usage())
+
+
+class ReplayStream(ReplayResult):
+    """RunResultStreaming look-alike: the output is re-emitted as text deltas"""
+
+    def __init__(self, final_output, usage=None, latency: float = 0.0, chunk: int = 64):
+        super().__init__(None, usage)
+        self._output = final_output
+        self._latency = latency
+        self._chunk = chunk
+
+    async def stream_events(self):
+        if self._latency:
+            await asyncio.sleep(self._latency)
+        text = self._output if isinstance(self._output, str) else self._output.model_dump_json()
+        for i in range(0, len(text), self._chunk):
+            yield SimpleNamespace(
+                type="raw_response_event",
+                data=SimpleNamespace(type="response.output_text.delta", delta=text[i : i + self._chunk]),
+            )
+            await asyncio.sleep(0)
+        self.final_output = self._output
+
+    def cancel(self) -> None:
+        pass
+
+
+def fixture_key(agent, prompt, stage_name: str) -> str:
+    prompt_text = prompt if isinstance(prompt, str) else json.dumps(prompt, sort_keys=True, default=str)
+    payload = json.dumps(
+        [stage_name, agent.name, str(agent.model), _DATE.sub("<date>", str(agent.instructions)), _DATE.sub("<date>", prompt_text)]
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _dump_output(output) -> dict:
+    if isinstance(output, str):
+        return {"type": "text", "value": output}
+    return {"type": "model", "value": output.model_dump(mode="json")}
+
+
+def _load_output(agent, stored: dict):
+    if stored["type"] == "model":
+        return agent.output_type.model_validate(stored["value"])
+    return stored["value"]
+
+
+class FixtureStore:
+    """one JSON file per recorded run: <dir>/<stage>-<key prefix>.json"""
+
+    def __init__(self, directory: str = AGENTS_REPLAY_DIR):
+        self.directory = directory
+
+    def path(self, agent, prompt, stage_name: str) -> str:
+        return os.path.join(self.directory, f"{stage_name}-{fixture_key(agent, prompt, stage_name)[:24]}.json")
+
+    def save(self, agent, prompt, stage_name: str, result) -> None:
+        usage = result.context_wrapper.usage
+        fixture = {
+            "stage": stage_name,
+            "agent": agent.name,
+            "model": str(agent.model),
+            "prompt": prompt if isinstance(prompt, str) else None,
+            "output": _dump_output(result.final_output),
+            "usage": {
+                "input_tokens": usage.input_tokens,
+                "output_tokens": usage.output_tokens,
+                "cached_tokens": getattr(getattr(usage, "input_tokens_details", None), "cached_tokens", 0) or 0,
+            },
+        }
+        os.makedirs(self.directory, exist_ok=True)
+        with open(self.path(agent, prompt, stage_name), "w", encoding="utf-8") as f:
+            json.dump(fixture, f, indent=2, ensure_ascii=False)
+
+    def load(self, agent, prompt, stage_name: str) -> dict:
+        path = self.path(agent, prompt, stage_name)
+        try:
+            with open(path, encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            raise ReplayMiss(f"no fixture for {stage_name} / {agent.name} at {path}, record it with AGENTS_REPLAY=record") from None
+
+
+class ReplayRunner:
+    def __init__(self, store: FixtureStore, latency: float = 0.0):
+        self.store = store
+        self.latency = latency
+
+    def _result(self, agent, prompt, stage_name: str):
+        fixture = self.store.load(agent, prompt, stage_name)
+        return _load_output(agent, fixture["output"]), make_usage(**fixture["usage"])
+
+    async def run(self, agent, prompt, stage_name: str, **kwargs) -> ReplayResult:
+        output, usage = self._result(agent, prompt, stage_name)
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return ReplayResult(output, usage)
+
+    def run_streamed(self, agent, prompt, stage_name: str, **kwargs) -> ReplayStream:
+        output, usage = self._result(agent, prompt, stage_name)
+        return ReplayStream(output, usage, self.latency)
+
+
+class StubRunner:
+    """
+    canned outputs: responder(agent, prompt, stage_name) -> final output,
+    every run takes `latency` seconds unless its stage has its own entry in `stage_latency`
+    """
+
+    def __init__(self, responder, latency: float = 0.0, stage_latency: dict = None):
+        self.responder = responder
+        self.latency = latency
+        self.stage_latency = stage_latency or {}
+
+    def _latency(self, stage_name: str) -> float:
+        return self.stage_latency.get(stage_name, self.latency)
+
+    async def run(self, agent, prompt, stage_name: str, **kwargs) -> ReplayResult:
+        await asyncio.sleep(self._latency(stage_name))
+        output = self.responder(agent, prompt, stage_name)
+        return ReplayResult(output, make_usage(len(str(prompt)) // 4, len(str(output)) // 4))
+
+    def run_streamed(self, agent, prompt, stage_name: str, **kwargs) -> ReplayStream:
+        output = self.responder(agent, prompt, stage_name)
+        return ReplayStream(output, make_usage(len(str(prompt)) // 4, len(str(output)) // 4), self._latency(stage_name))
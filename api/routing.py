@@ -0,0 +1,155 @@
+# per-stage model routing: try a cheap model first and escalate to the stage's own model
+# (gpt-4.1 for research, o3 for formatting and risk summaries) only when the cheap answer fails validation
+# - the router decides the tiers from rule-based signals (entity vetted before, Unknown fields, input size)
+# - every routed call is booked per route: calls, escalations, seconds and estimated cost, against the
+#   cost and mean latency of the stage's default model, so the savings are visible on /routing
+# opt in with MODEL_ROUTING=tiered, by default every stage goes straight to its default model;
+# use_router() plugs in another policy
+
+import os
+import threading
+import time
+from collections import defaultdict
+
+from .runner import run_agent
+
+MODEL_ROUTING = os.getenv("MODEL_ROUTING", "off").lower()
+ROUTE_CHEAP_MODEL = os.getenv("ROUTE_CHEAP_MODEL", "gpt-4.1-mini")
+# research answers with more required fields left Unknown than this are redone on the default model
+ROUTE_MAX_UNKNOWN = int(os.getenv("ROUTE_MAX_UNKNOWN", "4"))
+# prompts longer than this (characters) go straight to the default model
+ROUTE_LONG_INPUT = int(os.getenv("ROUTE_LONG_INPUT", "40000"))
+
+# USD per 1M tokens as (input, cached input, output), override with MODEL_PRICES="o3=2:0.5:8,..."
+DEFAULT_PRICES = {"gpt-4.1": (2.0, 0.5, 8.0), "gpt-4.1-mini": (0.4, 0.1, 1.6), "o3": (2.0, 0.5, 8.0)}
+
+
+def parse_prices(value: str) -> dict:
+    prices = {}
+    for item in filter(None, (part.strip() for part in (value or "").split(","))):
+        model, _, numbers = item.partition("=")
+        prices[model.strip()] = tuple(float(number) for number in numbers.split(":"))
+    return prices
+
+
+PRICES = {**DEFAULT_PRICES, **parse_prices(os.getenv("MODEL_PRICES", ""))}
+
+
+def run_cost(model: str, usage) -> float:
+    """estimated USD of one run, 0 for models without a price"""
+    price_in, price_cached, price_out = PRICES.get(model, (0.0, 0.0, 0.0))
+    cached = getattr(getattr(usage, "input_tokens_details", None), "cached_tokens", 0) or 0
+    return ((usage.input_tokens - cached) * price_in + cached * price_cached + usage.output_tokens * price_out) / 1e6
+
+
+class FixedRouter:
+    """every stage on its default model"""
+
+    def route(self, stage_name: str, default_model: str, signals: dict) -> list:
+        return [default_model]
+
+
+class TieredRouter(FixedRouter):
+    """
+    cheap model first, default model as the fallback tier
+    research starts cheap only for companies vetted before (their public record is usually easy to find);
+    formatting stages start cheap unless the input is very long or the data has many Unknown fields to explain
+    """
+
+    def __init__(self, cheap_model: str = ROUTE_CHEAP_MODEL, long_input: int = ROUTE_LONG_INPUT, max_unknown: int = ROUTE_MAX_UNKNOWN):
+        self.cheap_model = cheap_model
+        self.long_input = long_input
+        self.max_unknown = max_unknown
+
+    def route(self, stage_name: str, default_model: str, signals: dict) -> list:
+        if default_model == self.cheap_model:
+            return [default_model]
+        if stage_name == "research" and not signals.get("known"):
+            return [default_model]
+        if signals.get("input_chars", 0) > self.long_input or signals.get("unknown_fields", 0) > self.max_unknown:
+            return [default_model]
+        return [self.cheap_model, default_model]
+
+
+class RouteStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.routes = {}  # (stage, route) -> counters, route is "model" or "cheap>default" after an escalation
+        self.default_models = {}  # stage -> its default model
+
+    def record(self, stage_name: str, route: str, default_model: str, seconds: float, cost: float, baseline_cost: float, escalated: bool):
+        with self._lock:
+            self.default_models[stage_name] = default_model
+            counters = self.routes.setdefault((stage_name, route), defaultdict(float))
+            counters["calls"] += 1
+            counters["escalations"] += escalated
+            counters["seconds"] += seconds
+            counters["cost"] += cost
+            counters["baseline_cost"] += baseline_cost
+
+    def report(self) -> list:
+        """one row per (stage, route); seconds_saved compares with the stage's runs on its default model"""
+        with self._lock:
+            routes = {key: dict(counters) for key, counters in self.routes.items()}
+            default_models = dict(self.default_models)
+        rows = []
+        for (stage_name, route), counters in sorted(routes.items()):
+            calls = int(counters["calls"])
+            default = routes.get((stage_name, default_models[stage_name]))
+            seconds_saved = None
+            if default and route != default_models[stage_name]:
+                seconds_saved = round(calls * default["seconds"] / default["calls"] - counters["seconds"], 3)
+            rows.append({
+                "stage": stage_name,
+                "route": route,
+                "calls": calls,
+                "escalations": int(counters["escalations"]),
+                "mean_seconds": round(counters["seconds"] / calls, 3),
+                "cost_usd": round(counters["cost"], 6),
+                "cost_saved_usd": round(counters["baseline_cost"] - counters["cost"], 6),
+                "seconds_saved": seconds_saved,
+            })
+        return rows
+
+
+router = TieredRouter() if MODEL_ROUTING == "tiered" else FixedRouter()
+route_stats = RouteStats()
+_variants = {}
+
+
+def use_router(new_router=None) -> None:
+    """swap the routing policy, None: back to the MODEL_ROUTING default"""
+    global router
+    router = new_router or (TieredRouter() if MODEL_ROUTING == "tiered" else FixedRouter())
+
+
+def with_model(agent, model: str):
+    """the same agent on another model, built once per (agent, model)"""
+    if str(agent.model) == model:
+        return agent
+    key = (id(agent), model)
+    if key not in _variants:
+        _variants[key] = agent.clone(model=model)
+    return _variants[key]
+
+
+async def run_routed(agent, prompt, stage_name: str, signals: dict = None, validate=None, **kwargs):
+    """
+    run_agent over the router's tiers: a tier's answer is kept when validate(result) is true,
+    the last tier (the agent's own model) is always kept
+    """
+    default_model = str(agent.model)
+    signals = {"input_chars": len(str(prompt)), **(signals or {})}
+    tiers = router.route(stage_name, default_model, signals) or [default_model]
+    cost = 0.0
+    started = time.perf_counter()
+    for i, model in enumerate(tiers):
+        result = await run_agent(with_model(agent, model), prompt, stage_name, **kwargs)
+        cost += run_cost(model, result.context_wrapper.usage)
+        if i == len(tiers) - 1 or validate is None or validate(result):
+            break
+    route = ">".join(tiers[: i + 1])
+    # the same tokens on the default model, what this call would have cost without routing
+    baseline_cost = run_cost(default_model, result.context_wrapper.usage)
+    route_stats.record(stage_name, route, default_model, time.perf_counter() - started, cost, baseline_cost, i > 0)
+    return result
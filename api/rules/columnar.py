@@ -0,0 +1,329 @@
+# columnar (vectorized) versions of the numeric threshold rules in rules_logic
+# used to rescore a whole portfolio at once when thresholds change
+# compiled from the same spec rules as the scalar functions (inputs, on_error flags, ordered cases), so a
+# threshold tuned in rules_spec.json / RULES_SPEC_PATH changes both
+# input is a table of structured_data records: a dict of column arrays, a pandas DataFrame or a pyarrow Table
+# output is one flags array per rule, identical to calling the scalar function on every record
+# (object columns are coerced in bulk: numbers with astype, each distinct text through the same record.py parser
+# as the scalar rules once, the rest one by one; numeric columns skip the parsers)
+# (a scalar rule that raises is reported as "Error", the same way /research reports it)
+# needs numpy; pandas and pyarrow are only needed if you pass their tables in
+# python -m benchmarks.columnar compares it with the scalar rules on the same dicts
+
+from datetime import datetime
+from itertools import repeat
+from operator import methodcaller, not_
+
+import numpy as np
+
+# MISSING marks a key that is absent from a record, so the scalar rule's default applies
+from .record import MISSING, PARSERS, UNKNOWN, parse_float, parse_int, parse_lower, parse_upper, parse_year
+from .rules_logic import RULE_SET
+from .spec import COMPARISONS, TESTS, resolve_operand
+
+
+def columns_from_records(records: list, fields=None) -> dict:
+    """
+    list of structured_data dicts -> {field: object array}, absent keys become MISSING
+    only the fields the vectorized rules read unless `fields` is given
+    """
+    if fields is None:
+        fields = dict.fromkeys(field for fields in RULE_FIELDS.values() for field in fields)
+    columns = {}
+    for field in fields:
+        column = np.empty(len(records), dtype=object)
+        column[:] = [record.get(field, MISSING) for record in records]
+        columns[field] = column
+    return columns
+
+
+def _num_rows(table) -> int:
+    if hasattr(table, "num_rows"):  # pyarrow.Table
+        return table.num_rows
+    if hasattr(table, "columns") and hasattr(table, "index"):  # pandas.DataFrame
+        return len(table)
+    for column in table.values():
+        return len(column)
+    return 0
+
+
+def _get_column(table, field: str):
+    if hasattr(table, "column_names"):  # pyarrow.Table
+        if field not in table.column_names:
+            return None
+        return table.column(field).to_numpy(zero_copy_only=False)
+    if hasattr(table, "columns") and hasattr(table, "index"):  # pandas.DataFrame
+        return table[field].to_numpy() if field in table.columns else None
+    column = table.get(field)
+    if column is None or isinstance(column, np.ndarray):
+        return column
+    # plain lists stay object arrays, np.asarray would turn [5, "x"] into strings
+    values = np.empty(len(column), dtype=object)
+    values[:] = list(column)
+    return values
+
+
+# --- coercions mirroring the record.py parsers the scalar rules read through ---
+# each returns (values, ok) where ok is False wherever the parser gives UNKNOWN
+# `default` is the input's default already parsed, used where the key is absent (MISSING)
+
+def _as_float(number) -> float:
+    try:
+        return float(number)
+    except OverflowError:
+        # an int far beyond any threshold, only the sign matters
+        return float("inf") if number > 0 else float("-inf")
+
+
+# the exact type of a value as a small code to mask a column on, anything else (None, lists, ...) is OTHER
+OTHER, ABSENT, FLOAT, INT, TEXT = range(5)
+_TYPE_CODES = {type(MISSING): ABSENT, float: FLOAT, int: INT, bool: INT, str: TEXT}
+
+
+def _types(column):
+    return np.fromiter(map(_TYPE_CODES.get, map(type, column), repeat(OTHER)), dtype=np.int8, count=len(column))
+
+
+def _each_distinct(texts: list, parse):
+    """parse every distinct text once -> (parsed distinct texts, index of each text into them)"""
+    index = {text: i for i, text in enumerate(dict.fromkeys(texts))}
+    codes = np.fromiter(map(index.__getitem__, texts), dtype=np.intp, count=len(texts))
+    return [parse(text) for text in index], codes
+
+
+def _known(parsed: list):
+    return np.fromiter((value is not UNKNOWN for value in parsed), dtype=bool, count=len(parsed))
+
+
+def _as_floats(parsed: list):
+    return np.fromiter((np.nan if value is UNKNOWN else _as_float(value) for value in parsed), dtype=np.float64, count=len(parsed))
+
+
+def _absent(n: int):
+    column = np.empty(n, dtype=object)
+    column[:] = MISSING
+    return column
+
+
+def _numbers(column, parse, default, n: int):
+    """an object column through a number parser, by type of value instead of one value at a time"""
+    if column.dtype != object:
+        column = column.astype(object)
+    values = np.full(n, np.nan)
+    ok = np.zeros(n, dtype=bool)
+    types = _types(column)
+
+    absent = types == ABSENT
+    if default is not UNKNOWN:
+        values[absent] = _as_float(default)
+        ok[absent] = True
+    rest = ~absent
+
+    floats = types == FLOAT
+    if floats.any():
+        numbers = column[floats].astype(np.float64)
+        if parse is parse_float:
+            values[floats] = numbers
+            ok[floats] = True
+        else:
+            # int() truncates finite floats, nan / inf are Unknown
+            finite = np.isfinite(numbers)
+            values[floats] = np.where(finite, np.trunc(numbers), np.nan)
+            ok[floats] = finite
+        rest &= ~floats
+
+    ints = types == INT
+    if ints.any():
+        try:
+            values[ints] = column[ints].astype(np.float64)
+            ok[ints] = True
+            rest &= ~ints
+        except OverflowError:
+            pass  # an int beyond float range: left to the parser, Unknown as a float and +-inf as an int
+
+    texts = types == TEXT
+    if texts.any():
+        parsed, codes = _each_distinct(column[texts].tolist(), parse)
+        values[texts] = _as_floats(parsed)[codes]
+        ok[texts] = _known(parsed)[codes]
+        rest &= ~texts
+
+    # None, lists and anything else, one by one
+    if rest.any():
+        parsed = [parse(value) for value in column[rest]]
+        values[rest] = _as_floats(parsed)
+        ok[rest] = _known(parsed)
+    return values, ok
+
+
+def _floats(column, default, n: int):
+    if column is None:
+        if default is UNKNOWN:
+            return _numbers(_absent(n), parse_float, default, n)
+        return np.full(n, _as_float(default)), np.ones(n, dtype=bool)
+    if column.dtype.kind in "biuf":
+        return column.astype(np.float64), np.ones(n, dtype=bool)
+    return _numbers(column, parse_float, default, n)
+
+
+def _ints(column, default, n: int, parse=parse_int):
+    if column is None:
+        if default is UNKNOWN:
+            return _numbers(_absent(n), parse, default, n)
+        return np.full(n, _as_float(default)), np.ones(n, dtype=bool)
+    if column.dtype.kind in "biu":
+        return column.astype(np.float64), np.ones(n, dtype=bool)
+    if column.dtype.kind == "f":
+        # int() truncates finite floats, nan / inf are Unknown
+        ok = np.isfinite(column)
+        return np.where(ok, np.trunc(np.where(ok, column, 0.0)), np.nan), ok
+    return _numbers(column, parse, default, n)
+
+
+def _years(column, default, n: int):
+    return _ints(column, default, n, parse_year)
+
+
+def _texts(parse):
+    def read(column, default, n: int):
+        values = np.empty(n, dtype=object)
+        if column is None:
+            values[:] = "" if default is UNKNOWN else default
+            return values, np.full(n, default is not UNKNOWN)
+        if column.dtype != object:
+            column = column.astype(object)
+        values[:] = ""
+        ok = np.zeros(n, dtype=bool)
+        types = _types(column)
+
+        absent = types == ABSENT
+        if default is not UNKNOWN:
+            values[absent] = default
+            ok[absent] = True
+
+        texts = types == TEXT
+        if texts.any():
+            parsed, codes = _each_distinct(column[texts].tolist(), parse)
+            known = _known(parsed)
+            distinct = np.empty(len(parsed), dtype=object)
+            distinct[:] = [value if value is not UNKNOWN else "" for value in parsed]
+            values[texts] = distinct[codes]
+            ok[texts] = known[codes]
+
+        # numbers, booleans, lists, None, one by one
+        rest = ~(absent | texts)
+        if rest.any():
+            parsed = [parse(value) for value in column[rest]]
+            values[rest] = [value if value is not UNKNOWN else "" for value in parsed]
+            ok[rest] = _known(parsed)
+        return values, ok
+
+    return read
+
+
+COLUMN_READERS = {
+    "float": _floats,
+    "int": _ints,
+    "year": _years,
+    "lower": _texts(parse_lower),
+    "upper": _texts(parse_upper),
+}
+
+
+def _test(op: str, values, against):
+    """one test of the spec grammar over a whole column"""
+    if values.dtype.kind == "f":
+        if op in COMPARISONS and isinstance(against, (int, float)) and not isinstance(against, bool):
+            return TESTS[op](values, against)
+    elif op in ("==", "!="):
+        return TESTS[op](values, against)
+    elif op == "in":
+        try:
+            return np.fromiter(map(frozenset(against).__contains__, values), dtype=bool, count=len(values))
+        except TypeError:
+            pass  # an unhashable option or value, test one by one
+    elif op in ("contains", "not_contains"):
+        found = np.fromiter(map(methodcaller("__contains__", against), values), dtype=bool, count=len(values))
+        return found if op == "contains" else ~found
+    elif op == "empty":
+        return np.fromiter(map(not_, values), dtype=bool, count=len(values)) == bool(against)
+    test = TESTS[op]
+    return np.fromiter((test(value, against) for value in values), dtype=bool, count=len(values))
+
+
+# --- vectorized rules, compiled from the same spec rule as the scalar function ---
+
+class ColumnarRule:
+    """
+    one spec rule scored over whole columns: its inputs are checked for Unknown in order (the input's on_error
+    flag, or "Error" where the scalar rule raises), then its cases in order, then the default, through np.select
+    """
+
+    def __init__(self, rule):
+        # rule: the spec.py compiler of the rule (RULE_SET.compilers[key]), its inputs and cases as validated
+        for name, spec in rule.inputs.items():
+            if spec.get("as", "raw") not in COLUMN_READERS:
+                raise ValueError(f"{rule.key}: input '{name}' is read as {spec.get('as', 'raw')}, which has no column reader")
+        self.key = rule.key
+        self.inputs = rule.inputs
+        self.cases = rule.rule.get("cases", [])
+        self.default = rule.rule["default"]
+        self.fields = tuple(spec["field"] for spec in self.inputs.values())
+
+    def _mask(self, condition: dict, values: dict, current_year: int, n: int):
+        mask = np.ones(n, dtype=bool)
+        for name, test in condition.items():
+            if name in ("any", "all"):
+                subs = [self._mask(sub, values, current_year, n) for sub in test]
+                if name == "any":
+                    mask &= np.logical_or.reduce(subs) if subs else np.zeros(n, dtype=bool)
+                elif subs:
+                    mask &= np.logical_and.reduce(subs)
+                continue
+            for op, operand in test.items():
+                mask &= _test(op, values[name], resolve_operand(operand, current_year) if op in COMPARISONS else operand)
+        return mask
+
+    def __call__(self, table, n: int):
+        current_year = datetime.now().year
+        values = {}
+        conditions = []
+        choices = []
+        for name, spec in self.inputs.items():
+            kind = spec.get("as", "raw")
+            values[name], ok = COLUMN_READERS[kind](_get_column(table, spec["field"]), PARSERS[kind](spec.get("default", "")), n)
+            conditions.append(~ok)
+            choices.append(spec.get("on_error", "Error"))
+        for case in self.cases:
+            conditions.append(self._mask(case.get("if", {}), values, current_year, n))
+            choices.append(case["then"])
+        if not conditions:
+            return np.full(n, self.default)
+        return np.select(conditions, choices, default=self.default)
+
+
+# the numeric threshold rules, where scoring whole columns pays off
+COLUMNAR_RULES = (
+    "product_dependency",
+    "customer_concentration",
+    "supplier_concentration",
+    "reputation",
+    "sanctions_watchlists",
+    "asset_model_year",
+    "business_age",
+)
+
+VECTORIZED_RULES = {key: ColumnarRule(RULE_SET.compilers[key]) for key in COLUMNAR_RULES}
+
+# fields read by each vectorized rule
+RULE_FIELDS = {key: rule.fields for key, rule in VECTORIZED_RULES.items()}
+
+
+def score_columns(table, rules=None) -> dict:
+    """
+    flags for every record of `table`, one array per rule
+    `table` is a dict of column arrays (see columns_from_records), a pandas DataFrame or a pyarrow Table
+    """
+    n = _num_rows(table)
+    selected = VECTORIZED_RULES if rules is None else {key: VECTORIZED_RULES[key] for key in rules}
+    return {key: rule(table, n) for key, rule in selected.items()}
@@ -0,0 +1,54 @@
+# incremental re-evaluation for refreshed structured_data
+# every compiled rule knows which fields it reads (its spec inputs + REQUIRED_DATA + key_fields + template fields)
+# so after a refresh only the rules whose fields changed are re-run, the other flags are carried over
+# a rule comparing against current_year also depends on the year: re-run unless the old flags are from this year
+
+from datetime import datetime
+
+from .rule_engine import RulePlan
+
+
+def changed_fields(old_data: dict, new_data: dict) -> set:
+    """keys added, removed or with a different value"""
+    old_data = old_data or {}
+    new_data = new_data or {}
+    return {key for key in old_data.keys() | new_data.keys() if old_data.get(key) != new_data.get(key)}
+
+
+def affected_rules(plan: RulePlan, changed: set, year_changed: bool = False) -> list:
+    return [rule.key for rule in plan.rules if rule.fields & changed or (year_changed and rule.uses_year)]
+
+
+def reevaluate(plan: RulePlan, old_data: dict, new_data: dict, old_flags: dict, old_year: int = None) -> dict:
+    """
+    re-run only what the diff touches
+    returns flags, the explanation section of every rule, and which rules were re-run vs reused
+    a rule without a usable previous flag is always re-run, and so is a rule reading current_year
+    when old_year (the year old_flags were evaluated in) is not this year or not known
+    """
+    old_flags = old_flags or {}
+    changed = changed_fields(old_data, new_data)
+    rerun = set(affected_rules(plan, changed, old_year != datetime.now().year))
+    flags = {}
+    explanations = {}
+    for rule in plan.rules:
+        previous = old_flags.get(rule.key)
+        if rule.key in rerun or previous in (None, "Error"):
+            rerun.add(rule.key)
+            flags[rule.key], explanations[rule.key] = rule.evaluate(new_data)
+        else:
+            # inputs unchanged: keep the flag, only the (cheap) template is rendered for the section
+            flags[rule.key] = previous
+            try:
+                explanations[rule.key] = f"### {rule.name} ({previous})\n" + rule.template.render(
+                    {**new_data, "flag": previous}
+                )
+            except Exception as e:
+                explanations[rule.key] = f"### {rule.name} (Error)\n{str(e)}\n"
+    return {
+        "flags": flags,
+        "explanations": explanations,
+        "changed_fields": sorted(changed),
+        "rerun_rules": [rule.key for rule in plan.rules if rule.key in rerun],
+        "reused_rules": [rule.key for rule in plan.rules if rule.key not in rerun],
+    }
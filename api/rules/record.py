@@ -0,0 +1,177 @@
+# structured_data parsed once into a compact typed record the rules read from
+# the model's JSON is loose: "35%", "1,200", "2019-05", true for "yes", ["ISO 9001", "ISO 14001"], "Unknown"
+# every value goes through one parser per kind (float / int / year / lower / upper / raw) that either returns
+# the typed value or UNKNOWN, so a rule sees a number, a string or an explicit Unknown, never a raw value
+# a key that is absent stays MISSING and the rule applies its own default (see `default` in rules_spec.json)
+# record_type(fields) builds a __slots__ class with one slot per field the rules read
+
+import keyword
+import re
+
+
+class _Sentinel:
+    __slots__ = ("name",)
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __repr__(self):
+        return self.name
+
+    def __reduce__(self):
+        return self.name
+
+
+# a value that is present but can't be used as its kind: "Unknown", "n/a", None, a number that doesn't parse
+UNKNOWN = _Sentinel("UNKNOWN")
+# a key that is absent from the record
+MISSING = _Sentinel("MISSING")
+
+_THOUSANDS = re.compile(r"[-+]?\d{1,3}(?:,\d{3})+(?:\.\d*)?")
+_YEAR_IN_TEXT = re.compile(r"(?<!\d)(1[89]\d\d|2[01]\d\d)(?!\d)")
+
+
+def _number_text(text: str):
+    text = text.strip()
+    if text.endswith("%"):
+        text = text[:-1].rstrip()
+    if _THOUSANDS.fullmatch(text):
+        text = text.replace(",", "")
+    try:
+        return float(text)
+    except ValueError:
+        return UNKNOWN
+
+
+def parse_float(value):
+    """35, 35.0, "35", "35%", " 35 % ", "1,200.5" -> float, anything else -> UNKNOWN"""
+    if type(value) is float:
+        return value
+    if isinstance(value, str):
+        return _number_text(value)
+    try:
+        return float(value)
+    except (TypeError, ValueError, OverflowError):
+        return UNKNOWN
+
+
+def parse_int(value):
+    """like parse_float but truncated like int(), nan / inf -> UNKNOWN"""
+    if type(value) is int:
+        return value
+    if isinstance(value, str):
+        try:
+            return int(value)
+        except ValueError:
+            value = _number_text(value)
+            if value is UNKNOWN:
+                return UNKNOWN
+    try:
+        return int(value)
+    except (TypeError, ValueError, OverflowError):
+        return UNKNOWN
+
+
+def parse_year(value):
+    """a number like parse_int, or the first year in a text: "2019-05-01", "since 2019" -> 2019"""
+    year = parse_int(value)
+    if year is UNKNOWN and isinstance(value, str):
+        match = _YEAR_IN_TEXT.search(value)
+        if match:
+            return int(match.group(1))
+    return year
+
+
+def parse_text(value):
+    """str as is, true / false -> "yes" / "no", lists joined, numbers as text, None -> UNKNOWN"""
+    if isinstance(value, str):
+        return value
+    if isinstance(value, bool):
+        return "yes" if value else "no"
+    if isinstance(value, (int, float)):
+        return str(value)
+    if isinstance(value, (list, tuple)):
+        return ", ".join(str(item) for item in value)
+    return UNKNOWN
+
+
+def parse_lower(value):
+    text = parse_text(value)
+    return text if text is UNKNOWN else text.lower()
+
+
+def parse_upper(value):
+    text = parse_text(value)
+    return text if text is UNKNOWN else text.upper()
+
+
+PARSERS = {
+    "float": parse_float,
+    "int": parse_int,
+    "year": parse_year,
+    "lower": parse_lower,
+    "upper": parse_upper,
+    "raw": lambda value: value,
+}
+
+# exact type the parser returns unchanged, checked inline so the common case costs no call
+_FAST_TYPES = {"float": "float", "int": "int", "year": "int"}
+
+
+def parse_expression(kind: str, var: str) -> str:
+    """Python expression parsing `var` as `kind` (var is not MISSING), for the generated rule code"""
+    if kind == "raw":
+        return var
+    if kind in _FAST_TYPES:
+        return f"{var} if type({var}) is {_FAST_TYPES[kind]} else _parse_{kind}({var})"
+    return f"{var}.{kind}() if type({var}) is str else _parse_{kind}({var})"
+
+
+def parser_namespace() -> dict:
+    return {f"_parse_{kind}": parser for kind, parser in PARSERS.items()} | {"_UNKNOWN": UNKNOWN, "_MISSING": MISSING}
+
+
+class Record:
+    """
+    base of the generated record types: one slot per field, holding the parsed value, UNKNOWN or MISSING
+    Record types are built by record_type(), which also generates their from_data(data) classmethod that
+    parses a structured_data dict once; the base itself has no fields and is never instantiated
+    """
+
+    __slots__ = ()
+    kinds = {}  # field -> kind
+
+    def to_dict(self) -> dict:
+        """the parsed values of the fields that are present, UNKNOWN as None"""
+        values = {}
+        for field in self.kinds:
+            value = getattr(self, field)
+            if value is not MISSING:
+                values[field] = None if value is UNKNOWN else value
+        return values
+
+    def __repr__(self):
+        return f"Record({', '.join(f'{field}={getattr(self, field)!r}' for field in self.kinds)})"
+
+
+def record_type(kinds: dict) -> type:
+    """a Record subclass with a slot per field, `kinds` maps field -> parser kind"""
+    for field, kind in kinds.items():
+        if not field.isidentifier() or keyword.iskeyword(field) or field in Record.__dict__ or field in ("kinds", "from_data"):
+            raise ValueError(f"'{field}' can't be a record field")
+        if kind not in PARSERS:
+            raise ValueError(f"unknown kind {kind!r} for '{field}'")
+    lines = ["def from_data(cls, data):", "    self = _new(cls)", "    get = data.get"]
+    for field, kind in kinds.items():
+        lines += [
+            f"    value = get({field!r}, _MISSING)",
+            f"    self.{field} = value if value is _MISSING else {parse_expression(kind, 'value')}",
+        ]
+    lines.append("    return self")
+    namespace = parser_namespace() | {"_new": object.__new__}
+    exec(compile("\n".join(lines) + "\n", "<record>", "exec"), namespace)
+    return type("Record", (Record,), {
+        "__slots__": tuple(kinds),
+        "kinds": dict(kinds),
+        "from_data": classmethod(namespace["from_data"]),
+    })
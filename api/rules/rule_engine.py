@@ -5,78 +5,199 @@
 #   - prompt to be used in LLM prompt chain
 #   - any suggested follow-up actions
 # coordinate which function to call for each `flag_logic` / evaluation
+# RuleEngine.compile(module) precomputes an immutable evaluation plan for bulk scoring, its flags come from
+# one generated function that scores all rules of the module in a single pass (see spec.py)
+# prompt templates are parsed once at import; a field the record doesn't have renders as 'Unknown'
+# instead of raising KeyError, template_consistency() lists the template fields nothing asks for
 
-from .rules_logic import (
-    # manufacturer
-    business_age,
-    business_model_viability,
-    product_dependency,
-    customer_concentration,
-    supplier_concentration,
-    asset_traceability,
-    esg_compliance,
-    cybersecurity,
-    corporate_rating,
-
-    # dealer
-    # business_model_viability,
-    tax_compliance,
-    legal_disputes,
-    reputation,
-    beneficial_owner_aml,
-    sanctions_watchlists,
-
-    # asset
-    market_demand,
-    emission_compliance,
-    asset_model_year,
-)
-
-RULES_FUNCTIONS = {
-    # manufacturer
-    "business_age": business_age,
-    "business_model_viability": business_model_viability,
-    "product_dependency": product_dependency,
-    "customer_concentration": customer_concentration,
-    "supplier_concentration": supplier_concentration,
-    "asset_traceability": asset_traceability,
-    "esg_compliance": esg_compliance,
-    "cybersecurity": cybersecurity,
-    "corporate_rating": corporate_rating,
-
-    # dealer
-    # "dealer_business_model_viability": dealer_business_model_viability,
-    "tax_compliance": tax_compliance,
-    "legal_disputes": legal_disputes,
-    "reputation": reputation,
-    "beneficial_owner_aml": beneficial_owner_aml,
-    "sanctions_watchlists": sanctions_watchlists,
-
-    # asset
-    "market_demand": market_demand,
-    "emission_compliance": emission_compliance,
-    "asset_model_year": asset_model_year,
-
-}
-
-def evaluate_rule(criteria: str, data: dict) -> dict:
+from dataclasses import dataclass
+from functools import lru_cache
+from string import Formatter
+
+from .rules_logic import RULES, RULES_BY_MODULE, REQUIRED_DATA, RULE_SET
+
+# rule key -> compiled flag function of the spec rule its `flag_logic` names
+RULES_FUNCTIONS = {key: RULE_SET.functions[meta["flag_logic"]] for key, meta in RULES.items()}
+
+def trace_rule(criteria: str, data: dict) -> tuple:
+    """(flag, trace) of one rule: the case that fired, every test it compared and the parsed inputs"""
+    return RULE_SET.traced(RULES[criteria]["flag_logic"])(data)
+
+def evaluate_rule(criteria: str, data: dict, trace: bool = False) -> dict:
+    """trace=True adds the rule's trace (see trace_rule), an unusable input then gives flag 'Error' instead of raising"""
     if criteria not in RULES_FUNCTIONS:
         return {
             "status": "error",
             "message": f"No rule logic found for '{criteria}'"
         }
 
-    # run logic
-    flag = RULES_FUNCTIONS[criteria](data)
+    # run logic, the traced variant is a separate compiled function so the plain one stays as fast
+    if trace:
+        flag, rule_trace = trace_rule(criteria, data)
+    else:
+        flag = RULES_FUNCTIONS[criteria](data)
 
     # load prompt and follow-up action from RULES dict
-    from .rules_logic import RULES
     rule_meta = RULES[criteria]
     
-    return {
+    result = {
         "criteria": criteria,
         "flag": flag,
         "prompt": rule_meta["prompt_template"],
         "suggested_action": rule_meta.get("suggested_action"),
         "explanation_hint": rule_meta.get("how_to_explain") # helper from LLM
     }
+    if trace:
+        result["trace"] = rule_trace
+    return result
+
+
+# --- compiled evaluation plans ---
+
+def template_fields(template: str) -> tuple:
+    """names referenced by a str.format template, in order of appearance"""
+    return tuple(dict.fromkeys(field for _, field, _, _ in Formatter().parse(template) if field))
+
+MISSING_VALUE = "Unknown"
+
+class _Defaults(dict):
+    def __missing__(self, key):
+        return MISSING_VALUE
+
+@dataclass(frozen=True)
+class CompiledTemplate:
+    """prompt_template parsed once into (literal, field, format_spec, conversion) chunks"""
+    source: str
+    chunks: tuple
+    simple: bool  # only plain {name} fields, safe to render without str.format
+
+    @classmethod
+    def parse(cls, template: str) -> "CompiledTemplate":
+        chunks = tuple(Formatter().parse(template))
+        simple = all(
+            field is None or (field.isidentifier() and not spec and not conversion)
+            for _, field, spec, conversion in chunks
+        )
+        return cls(template, chunks, simple)
+
+    def render(self, values: dict) -> str:
+        # same result as self.source.format(**values), except that a missing or None field renders as 'Unknown'
+        if not self.simple:
+            return self.source.format_map(_Defaults({key: value for key, value in values.items() if value is not None}))
+        parts = []
+        for literal, field, _, _ in self.chunks:
+            parts.append(literal)
+            if field is not None:
+                value = values.get(field)
+                parts.append(MISSING_VALUE if value is None else format(value))
+        return "".join(parts)
+
+@dataclass(frozen=True)
+class CompiledRule:
+    key: str
+    name: str
+    func: object
+    template: CompiledTemplate
+    fields: frozenset  # everything the rule may read or render
+    uses_year: bool = False  # compares against current_year, so its flag can change with the year alone
+
+    def evaluate(self, data: dict) -> tuple:
+        """(flag, markdown section) for one record, a rule or template that raises gives 'Error'"""
+        try:
+            flag = self.func(data)
+        except Exception as e:
+            return "Error", f"### {self.name} (Error)\n{str(e)}\n"
+        return self.explain(flag, data)
+
+    def explain(self, flag: str, data: dict) -> tuple:
+        """(flag, markdown section) for a flag that is already known"""
+        if flag == "Error":
+            # only the single-pass evaluator saw the exception, run the rule again for its message
+            try:
+                self.func(data)
+                message = ""
+            except Exception as e:
+                message = str(e)
+            return "Error", f"### {self.name} (Error)\n{message}\n"
+        try:
+            explanation = self.template.render({**data, "flag": flag})
+        except Exception as e:
+            return "Error", f"### {self.name} (Error)\n{str(e)}\n"
+        return flag, f"### {self.name} ({flag})\n{explanation}"
+
+@dataclass(frozen=True)
+class RulePlan:
+    module: str
+    rules: tuple
+    required_fields: frozenset
+    evaluator: object  # data -> {key: flag} for all rules, a rule that raises is flagged 'Error'
+
+    def evaluate(self, data) -> dict:
+        """
+        all flags for one record in a single pass, a rule that raises is flagged 'Error'
+        `data` is a structured_data dict or a Record already parsed from one
+        """
+        return self.evaluator(data)
+
+    def trace(self, data: dict) -> dict:
+        """rule key -> trace of the flag evaluate(data) gives it (opt-in, nothing of it runs in evaluate)"""
+        return {rule.key: trace_rule(rule.key, data)[1] for rule in self.rules}
+
+    def evaluate_with_explanations(self, data: dict) -> tuple:
+        """flags plus the per-rule markdown sections fed to the formatting agent"""
+        flags = self.evaluator(data)
+        explanations = []
+        for rule in self.rules:
+            flags[rule.key], explanation = rule.explain(flags[rule.key], data)
+            explanations.append(explanation)
+        return flags, explanations
+
+# every rule's prompt template, parsed once
+TEMPLATES = {key: CompiledTemplate.parse(meta["prompt_template"]) for key, meta in RULES.items()}
+
+def template_consistency(research_fields=None) -> list:
+    """
+    template fields that no one asks the research agent for: not in the rule's REQUIRED_DATA,
+    and (when research_fields is given) not among the fields the research prompt requests
+    these render as 'Unknown' unless the model happens to return them anyway
+    """
+    issues = []
+    used = dict.fromkeys(key for keys in RULES_BY_MODULE.values() for key in keys)  # rules some module runs
+    for key in used:
+        template = TEMPLATES[key]
+        required = set(REQUIRED_DATA.get(key, ()))
+        for field in template_fields(template.source):
+            if field == "flag":
+                continue
+            requested = research_fields is None or field in research_fields
+            if field not in required or not requested:
+                issues.append({
+                    "rule": key,
+                    "field": field,
+                    "in_required_data": field in required,
+                    "requested_from_research": requested,
+                })
+    return issues
+
+class RuleEngine:
+    @staticmethod
+    @lru_cache(maxsize=None)
+    def compile(module: str) -> RulePlan:
+        """evaluation plan for 'manufacturer' / 'dealer' / 'asset', built once per process"""
+        if module not in RULES_BY_MODULE:
+            raise ValueError(f"Unknown module '{module}'")
+        rules = []
+        for key in RULES_BY_MODULE[module]:
+            meta = RULES[key]
+            template = TEMPLATES[key]
+            logic = RULE_SET.compilers[meta["flag_logic"]]
+            fields = (
+                logic.fields
+                | frozenset(REQUIRED_DATA.get(key, ()))
+                | frozenset(meta.get("key_fields", ()))
+                | (frozenset(template_fields(template.source)) - {"flag"})
+            )
+            rules.append(CompiledRule(key, meta["name"], RULES_FUNCTIONS[key], template, fields, logic.uses_year))
+        required = frozenset().union(*(rule.fields for rule in rules)) if rules else frozenset()
+        evaluate = RULE_SET.evaluator({key: RULES[key]["flag_logic"] for key in RULES_BY_MODULE[module]})
+        return RulePlan(module, tuple(rules), required, evaluate)
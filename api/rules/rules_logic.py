@@ -1,9 +1,9 @@
-# contains actual logic fucntions like business_age(data) etc
-# returns the risk flag (ok, monitor, review, flag) based on the data rules
+# exposes the flag functions like business_age(data), compiled from the declarative rules_spec.json
+# each returns the risk flag (ok, monitor, review, flag) based on the data rules
 # defines what fields are required per rule via REQUIRED_DATA
 # also includes the RULES dictionary used for templating and hints
 
-from datetime import datetime
+from .spec import load_rule_set
 
 # analyzing company profiles across key risk criteria:
 # evaluate the input and return a risk flag based on the rules
@@ -235,7 +235,7 @@ RULES = {
         "Assign a risk flag: OK, Monitor, Review, or Flag.\n"
         "Data: credit_rating={credit_rating}, agency={agency}"
     ),
-    "flag_logic": "esg_compliance",
+    "flag_logic": "corporate_rating",
     "example_ok": "Rated BBB by S&P, outlook stable.",
     "on_flag": {
         "finding": "Based on available data, the company appears to have poor credit rating as per latest publicly available financial statements. ",
@@ -387,246 +387,21 @@ RULES = {
 
 }
 
-# Functions for each flag-logic block
-def business_age(data: dict) -> str:
-    try:
-        reg_year = int(data.get("registration_year", 0))
-        last_report_year = int(data.get("last_report_year", 0))
-        status = data.get("status", "").lower()
-        current_year = datetime.now().year
-
-        # Hard stop if company is dissolved or liquidated
-        if status in ["liquidated", "dissolved"]:
-            return "Flag"
-
-        # status issues
-        if status in ["inactive", "dormant"]:
-            return "Review"
-
-        age = current_year - reg_year
-
-        if age >= 3:
-            return "OK"
-        elif 1 < age < 3:
-            return "Monitor"
-        elif age <= 1:
-            return "Review"
-    except Exception:
-        pass
-
-    return "Review"  # default fallback
-
-# def dealer_business_age(data: dict) -> str:
-#     return business_age(data)
-
-def business_model_viability(data: dict) -> str:
-    market_presence = data.get("market_presence", "").lower()
-    dealer_network = data.get("dealer_network", "")
-    revenue_trends = data.get("revenue_trends", "").lower()
-
-    # convert dealer_network to a number if needed
-    # try:
-    #     dealer_network = int(dealer_network)
-    # except (ValueError, TypeError):
-    #     dealer_network = 0
-
-    if "weak" in market_presence and "declining" in revenue_trends:
-        return "Flag"
-    if "weak" in market_presence or "declining" in revenue_trends:
-        return "Review"
-    if "moderate" in market_presence or "moderate" in revenue_trends:
-        return "Monitor"
-    if "global" in market_presence and "stable" in revenue_trends:
-        return "OK"
-    if "strong" in market_presence:
-        return "OK"
-
-    return "Review"  # default if unclear
-
-def product_dependency(data: dict) -> str:
-    try:
-        share = float(data.get("top_product_revenue_share", 0))
-
-        if share <= 15:
-            return "OK"
-        elif 15 < share <= 20:
-            return "Monitor"
-        elif 20 < share <= 30:
-            return "Review"
-        elif share > 30:
-            return "Flag"
-    except Exception:
-        pass
-
-    return "Review"  # default/fallback
-
-def customer_concentration(data: dict) -> str:
-    try:
-        top1 = float(data.get("top_client_share", 0))
-        top3 = float(data.get("top3_clients_share", 0))
-        num_clients = int(data.get("number_of_clients", 0))
-
-        if top1 > 50:
-            return "Flag"
-        if top3 > 50:
-            return "Review"
-        if top3 > 30:
-            return "Monitor"
-        if top1 <= 20:
-            return "OK"
-    except Exception:
-        pass
-
-    return "Review"
-
-def supplier_concentration(data: dict) -> str:
-    top1 = float(data.get("top_supplier_share", 0))
-    top3 = float(data.get("top3_suppliers_share", 0))
-    if top1 > 50 or top3 > 75:
-        return "Flag"
-    elif top1 > 30 or top3 > 50:
-        return "Review"
-    return "OK"
-
-def asset_traceability(data: dict) -> str:
-    traceability = data.get("traceability", "").lower()
-    if "none" in traceability:
-        return "Flag"
-    elif "limited" in traceability:
-        return "Monitor"
-    elif "partial" in traceability:
-        return "Review"
-    return "OK"
-
-def esg_compliance(data: dict) -> str:
-    certs = data.get("certifications", "").lower()
-    incidents = data.get("incidents", "").lower()
-    if "major" in incidents:
-        return "Flag"
-    elif "minor" in incidents:
-        return "Monitor"
-    elif not certs or certs == "none":
-        return "Review"
-    return "OK"
-
-def cybersecurity(data: dict) -> str:
-    certs = data.get("certifications", "").lower()
-    measures = data.get("measures", "").lower()
-    incidents = data.get("incidents", "").lower()
-    if "major" in incidents or "breach" in incidents:
-        return "Flag"
-    elif "minor" in incidents:
-        return "Monitor"
-    elif "ok" not in certs and "ok" not in measures:
-        return "Review"
-    return "OK"
-
-def corporate_rating(data: dict) -> str:
-    rating = data.get("credit_rating", "").upper()
-    if rating in ["CCC", "DEFAULT", "UNRATED"]:
-        return "Flag"
-    elif rating in ["BB-", "B+", "B", "B-"]:
-        return "Monitor"
-    elif rating in ["BBB", "BBB+", "BBB-", "A", "A-", "A+"]:
-        return "OK"
-    return "Review"
-
-def dealer_business_model_viability(data: dict) -> str:
-    trend = data.get("revenue_trend", "").lower()
-    profit = data.get("net_profitability", "").lower()
-    specialization = data.get("specialisation", "").lower()
-
-    if "decline" in trend and "low" in profit:
-        return "Flag"
-    if "moderate" in profit or "decline" in trend:
-        return "Monitor"
-    if "specialized" in specialization and "positive" in profit:
-        return "OK"
-    return "Review"
-
-def tax_compliance(data: dict) -> str:
-    last_check = data.get("last_check", "").lower()
-    if "tax evasion" in last_check or "fine" in last_check:
-        return "Flag"
-    elif "audit" in last_check:
-        return "Monitor"
-    elif "clear" in last_check or "no issues" in last_check:
-        return "OK"
-    return "Review"
-
-def legal_disputes(data: dict) -> str:
-    cases = data.get("open_cases", "")
-    severity = data.get("severity", "").lower()
+# The flag logic of every rule is data: thresholds, keywords and how fields are parsed live in rules_spec.json
+# (RULES_SPEC_PATH points at another copy), compiled once by spec.py into one function per rule
+RULE_SET = load_rule_set()
+# structured_data parsed once (see record.py): Record.from_data(data) can be scored by any RulePlan and
+# is far smaller than the dict when many profiles are kept in memory
+Record = RULE_SET.record
+
+
+def __getattr__(name: str):
+    """business_age(data), product_dependency(data), ... stay importable from here, see RULE_SET.functions"""
     try:
-        if int(cases) > 10 or "major" in severity:
-            return "Flag"
-        elif int(cases) > 3:
-            return "Review"
-        else:
-            return "OK"
-    except:
-        return "Review"
-
-def reputation(data: dict) -> str:
-    hits = int(data.get("negative_news_hits", 0))
-    media_score = float(data.get("media_score", 5.0))
-    if hits > 10 or media_score < 2:
-        return "Flag"
-    elif hits > 5:
-        return "Monitor"
-    return "OK"
-
-def beneficial_owner_aml(data: dict) -> str:
-    pep = data.get("pep", "").lower()
-    ubo = data.get("ubo_verified", "").lower()
-    chain_depth = int(data.get("ownership_chain_depth", 0))
-
-    if pep == "yes":
-        return "Flag"
-    if ubo == "no" or chain_depth > 3:
-        return "Review"
-    return "OK"
-
-def sanctions_watchlists(data: dict) -> str:
-    listed = data.get("listed", "").lower()
-    hits = int(data.get("watchlist_hits", 0))
-
-    if listed == "yes" or hits > 5:
-        return "Flag"
-    elif hits > 0:
-        return "Monitor"
-    return "OK"
-
-def market_demand(data: dict) -> str:
-    news = data.get("market_demand_news", "").lower()
-    if "declining" in news or "recall" in news:
-        return "Flag"
-    elif "weak" in news:
-        return "Monitor"
-    elif "high" in news or "strong" in news:
-        return "OK"
-    return "Review"
-
-def emission_compliance(data: dict) -> str:
-    standard = data.get("emission_standard", "").lower()
-    support_year = int(data.get("tech_support_end_year", 0))
-    current_year = datetime.now().year
-    if "euro 6" in standard or "eu compliant" in standard:
-        if support_year >= current_year + 3:
-            return "OK"
-        elif current_year <= support_year < current_year + 3:
-            return "Monitor"
-        else:
-            return "Review"
-    return "Flag"
-
-def asset_model_year(data: dict) -> str:
-    year = int(data.get("year_manufacturing_model", 0))
-    current_year = datetime.now().year
-    if year >= current_year - 1:
-        return "OK"
-    elif year >= current_year - 3:
-        return "Monitor"
-    elif year < current_year - 3:
-        return "Review"
-    return "Flag"
+        return RULE_SET.functions[name]
+    except KeyError:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}") from None
+
+
+def __dir__():
+    return sorted(set(globals()) | set(RULE_SET.functions))
@@ -0,0 +1,85 @@
+# deterministic risk summary rendered straight from the flags and the rule metadata in RULES
+# no LLM call: every rule's section templates are precompiled once per module with the rule's name,
+# example_ok and on_flag texts baked in, only the data line of the company is filled in per render
+# routine results (OK / Monitor) read the same every time, Review / Flag findings can still be
+# written up by the formatting agent (see RISK_SUMMARY_MODE in agents.py)
+
+from dataclasses import dataclass
+from functools import lru_cache
+
+from .rule_engine import CompiledTemplate, RuleEngine
+from .rules_logic import RULES
+
+FLAG_ICONS = {"OK": "✅", "Monitor": "⚠️", "Review": "🚩", "Flag": "🚩", "Error": "⚠️"}
+# findings that are worth a written explanation
+LLM_FLAGS = frozenset({"Review", "Flag"})
+
+
+def _literal(text) -> str:
+    """rule metadata as a template literal, braces in it are not fields"""
+    return str(text or "").strip().replace("{", "{{").replace("}", "}}")
+
+
+def format_value(value) -> str:
+    """the value as the research returned it, 35.0 -> "35" but never rounded"""
+    if value is None or value == "":
+        return "Unknown"
+    if isinstance(value, float):
+        return repr(value).removesuffix(".0")
+    if isinstance(value, (list, tuple)):
+        return ", ".join(str(item) for item in value) or "Unknown"
+    return str(value)
+
+
+def section_templates(meta: dict) -> dict:
+    """flag -> template source, the only field left is {facts}"""
+    name = _literal(meta["name"])
+    on_flag = meta.get("on_flag", {})
+    finding = _literal(on_flag.get("finding"))
+    follow_up = _literal(on_flag.get("option_1"))
+    question = _literal(on_flag.get("option_2"))
+    flagged = f"{finding}\n\n{{facts}}\n\n**Suggested follow-up:** {follow_up}\n\n> {question}"
+    return {
+        "OK": f"### ✅ {name} (OK)\n{{facts}}\n\n_Benchmark for OK: {_literal(meta.get('example_ok'))}_",
+        "Monitor": f"### ⚠️ {name} (Monitor)\n{{facts}}\n\n**To keep an eye on:** {follow_up}",
+        "Review": f"### 🚩 {name} (Review)\n{flagged}",
+        "Flag": f"### 🚩 {name} (Flag)\n{flagged}",
+        "Error": f"### ⚠️ {name} (Error)\nThis check could not be evaluated from the available data.\n\n{{facts}}",
+    }
+
+
+@dataclass(frozen=True)
+class SummaryRule:
+    key: str
+    fields: tuple  # shown in the data line, in key_fields order
+    templates: dict  # flag -> CompiledTemplate
+
+    def render(self, flag: str, data: dict) -> str:
+        facts = " · ".join(f"{field.replace('_', ' ')}: {format_value(data.get(field))}" for field in self.fields)
+        template = self.templates.get(flag, self.templates["Error"])
+        return template.render({"facts": f"**Data:** {facts}"})
+
+
+@dataclass(frozen=True)
+class SummaryPlan:
+    module: str
+    rules: tuple
+
+    def render_sections(self, flags: dict, data: dict) -> dict:
+        """rule key -> markdown section, in rule order"""
+        return {rule.key: rule.render(flags.get(rule.key, "Error"), data) for rule in self.rules}
+
+    def render(self, flags: dict, data: dict) -> str:
+        return "\n\n".join(self.render_sections(flags, data).values())
+
+
+@lru_cache(maxsize=None)
+def compile_summary(module: str) -> SummaryPlan:
+    """section templates for 'manufacturer' / 'dealer' / 'asset', built once per process"""
+    rules = []
+    for rule in RuleEngine.compile(module).rules:
+        meta = RULES[rule.key]
+        fields = tuple(dict.fromkeys(meta.get("key_fields", ()))) or tuple(sorted(rule.fields))
+        templates = {flag: CompiledTemplate.parse(source) for flag, source in section_templates(meta).items()}
+        rules.append(SummaryRule(rule.key, fields, templates))
+    return SummaryPlan(module, tuple(rules))
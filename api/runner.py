@@ -0,0 +1,99 @@
+# single entry point for every agent run in the API
+# wraps Runner.run / Runner.run_streamed so each call is timed and its tokens, web searches and
+# outcome are recorded under a stage name (see metrics.py)
+# the agents SDK is imported on first call, not at import time, to keep cold starts fast
+# every run goes through the shared pooled / retrying / rate-limited OpenAI client from client.py
+# a replay or stub runner (see replay.py) can stand in for the SDK, set with AGENTS_REPLAY or use_runner()
+
+import time
+
+from .metrics import Span, _current_span, exporter, metrics, record_run_usage, stage
+from .replay import AGENTS_REPLAY, FixtureStore, ReplayRunner
+
+# object with run() / run_streamed() used instead of the agents SDK, None means live runs
+runner_override = ReplayRunner(FixtureStore()) if AGENTS_REPLAY == "replay" else None
+# FixtureStore that every finished non-streamed run is written to
+recorder = FixtureStore() if AGENTS_REPLAY == "record" else None
+
+
+def use_runner(runner=None, record_to: FixtureStore = None) -> None:
+    """swap the runner (None: back to live agents SDK runs) and optionally record every run"""
+    global runner_override, recorder
+    runner_override = runner
+    recorder = record_to
+
+
+async def run_agent(agent, prompt, stage_name: str, **kwargs):
+    with stage(stage_name, model=str(agent.model)) as span:
+        if runner_override is not None:
+            result = await runner_override.run(agent, prompt, stage_name, **kwargs)
+        else:
+            from agents import Runner
+
+            from .client import install_openai_client
+
+            install_openai_client()
+            result = await Runner.run(agent, prompt, **kwargs)
+        record_run_usage(span, result)
+        if recorder is not None:
+            recorder.save(agent, prompt, stage_name, result)
+        return result
+
+
+class InstrumentedStream:
+    """proxy for RunResultStreaming that records the stage once its events are drained"""
+
+    def __init__(self, agent, prompt, stage_name: str, **kwargs):
+        self.span = Span(stage_name, _current_span.get(), {"stage": stage_name, "model": str(agent.model)})
+        if runner_override is not None:
+            self.run = runner_override.run_streamed(agent, prompt, stage_name, **kwargs)
+        else:
+            from agents import Runner
+
+            from .client import install_openai_client
+
+            install_openai_client()
+            self.run = Runner.run_streamed(agent, prompt, **kwargs)
+        self._recorded = False
+
+    @property
+    def final_output(self):
+        return self.run.final_output
+
+    async def stream_events(self):
+        try:
+            async for event in self.run.stream_events():
+                yield event
+        except BaseException as e:
+            self.span.status = "ERROR"
+            self.span.set(error=type(e).__name__)
+            raise
+        finally:
+            self._finish()
+
+    def cancel(self) -> None:
+        self.run.cancel()
+        if not self._recorded:
+            self.span.status = "ERROR"
+            self.span.set(error="cancelled")
+            self._finish()
+
+    def _finish(self) -> None:
+        if self._recorded:
+            return
+        self._recorded = True
+        self.span.end = time.time_ns()
+        if self.span.status == "OK":
+            record_run_usage(self.span, self.run)
+        metrics.observe_stage(
+            self.span.attributes["stage"],
+            self.span.attributes["model"],
+            self.span.seconds,
+            "error" if self.span.status == "ERROR" else "ok",
+        )
+        if exporter is not None:
+            exporter.export(self.span)
+
+
+def run_agent_streamed(agent, prompt, stage_name: str, **kwargs) -> InstrumentedStream:
+    return InstrumentedStream(agent, prompt, stage_name, **kwargs)
@@ -0,0 +1,39 @@
+# typed output schema for the research agent (RESEARCH_OUTPUT_MODE=structured)
+# the structured data model is generated from every field the rules read (REQUIRED_DATA, key_fields and
+# template fields), so adding a rule or a required field extends the schema without touching this file
+# the markdown report travels next to it as its own field instead of ending in a ```json block
+
+from typing import Optional, Union
+
+from pydantic import BaseModel, ConfigDict, Field, create_model
+
+from .rules.rule_engine import RuleEngine
+from .rules.rules_logic import REQUIRED_DATA, RULES_BY_MODULE
+
+# values the research agent may put in a field; 'Unknown' stays a plain string like in the markdown mode
+FieldValue = Optional[Union[int, float, str, list[str]]]
+
+
+def structured_fields() -> list:
+    fields = {field for required in REQUIRED_DATA.values() for field in required}
+    for module in RULES_BY_MODULE:
+        for rule in RuleEngine.compile(module).rules:
+            fields |= rule.fields
+    return sorted(fields | {"info_sources"})
+
+
+class _Strict(BaseModel):
+    model_config = ConfigDict(extra="forbid")
+
+
+# every field is required (strict structured outputs need that), missing data is written as 'Unknown'
+StructuredData = create_model(
+    "StructuredData",
+    __base__=_Strict,
+    **{field: (FieldValue, ...) for field in structured_fields()},
+)
+
+
+class ResearchOutput(_Strict):
+    report_markdown: str = Field(description="The full company analysis report in markdown, without a JSON block")
+    structured_data: StructuredData
@@ -0,0 +1,236 @@
+# web search proxy: a function tool the agents call instead of the hosted WebSearchTool
+# the hosted tool runs inside the Responses API, its queries and results never reach this process, so the same
+# "listafirme.ro <company>" or parent-company lookup is paid for again by every company, retry and gap-fill run.
+# with SEARCH_PROXY set the agents get a `web_search` function tool instead:
+# - queries are normalized (case, accents, punctuation, word order outside quoted phrases) before lookup
+# - results are cached with a TTL in the same backends as the research cache (memory / sqlite / redis)
+# - concurrent identical queries share one upstream search (SingleFlight)
+# SEARCH_PROXY=openai    a miss runs one small Responses call with the hosted web_search tool
+# SEARCH_PROXY=record    as openai, every upstream result is also written to SEARCH_FIXTURES_DIR
+# SEARCH_PROXY=fixtures  answers from SEARCH_FIXTURES_DIR only, no API key or network needed
+# unset (default) keeps the hosted WebSearchTool
+
+import hashlib
+import json
+import os
+import re
+import tempfile
+import unicodedata
+
+from .cache import build_backend
+from .companies import SingleFlight
+
+SEARCH_PROXY = os.getenv("SEARCH_PROXY", "").lower()
+SEARCH_MODEL = os.getenv("SEARCH_MODEL", "gpt-4.1-mini")
+SEARCH_CACHE_TTL = float(os.getenv("SEARCH_CACHE_TTL", str(24 * 3600)))
+SEARCH_FIXTURES_DIR = os.getenv("SEARCH_FIXTURES_DIR", os.path.join("api", "fixtures", "search"))
+
+SEARCH_INSTRUCTIONS = (
+    "Search the web for the query and report what the results say, with concrete facts, figures and dates. "
+    "Do not answer from memory. Keep it under 300 words."
+)
+TOOL_DESCRIPTION = (
+    "Search the web. Returns a summary of the results and their source URLs. "
+    "Identical queries are answered from a cache, so repeat a query rather than rephrasing it to get the same page."
+)
+
+_PUNCTUATION = re.compile(r"[^\w\s\"'.:/@&+-]")
+_TOKENS = re.compile(r'"[^"]*"|\S+')
+
+
+class SearchMiss(LookupError):
+    pass
+
+
+def normalize_query(query: str) -> str:
+    """
+    cache key of a query: casefolded, accents and stray punctuation dropped, whitespace collapsed,
+    words sorted (search engines ignore their order) except inside "quoted phrases"
+    """
+    text = unicodedata.normalize("NFKD", query or "")
+    text = "".join(char for char in text if not unicodedata.combining(char)).casefold()
+    text = text.replace("“", '"').replace("”", '"').replace("’", "'")
+    if text.count('"') % 2:
+        text = text.replace('"', " ")
+    tokens = []
+    for token in _TOKENS.findall(_PUNCTUATION.sub(" ", text)):
+        if token.startswith('"'):
+            phrase = " ".join(token.strip('"').split())
+            if phrase:
+                tokens.append(f'"{phrase}"')
+        else:
+            token = token.strip(".:'-")
+            if token:
+                tokens.append(token)
+    return " ".join(sorted(dict.fromkeys(tokens)))
+
+
+def query_digest(normalized: str) -> str:
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+
+def format_result(result: dict) -> str:
+    """what the agent reads back from the tool"""
+    lines = [result.get("text") or "No results."]
+    sources = result.get("sources") or []
+    if sources:
+        lines.append("Sources:\n" + "\n".join(f"- {source.get('title') or source['url']}: {source['url']}" for source in sources))
+    return "\n\n".join(lines)
+
+
+class FixtureIndex:
+    """offline search results, one JSON file per normalized query: {"query", "text", "sources"}"""
+
+    def __init__(self, directory: str = SEARCH_FIXTURES_DIR):
+        self.directory = directory
+        self._index = None
+
+    def path(self, normalized: str) -> str:
+        return os.path.join(self.directory, f"{query_digest(normalized)[:24]}.json")
+
+    def _load(self) -> dict:
+        # read once; fixtures may be hand-written, so they're indexed on their normalized query, not their file name
+        if self._index is None:
+            self._index = {}
+            if os.path.isdir(self.directory):
+                for name in sorted(os.listdir(self.directory)):
+                    if name.endswith(".json"):
+                        with open(os.path.join(self.directory, name), encoding="utf-8") as f:
+                            fixture = json.load(f)
+                        self._index[normalize_query(fixture["query"])] = fixture
+        return self._index
+
+    async def search(self, query: str) -> dict:
+        fixture = self._load().get(normalize_query(query))
+        if fixture is None:
+            raise SearchMiss(f"no search fixture for '{query}' in {self.directory}, record it with SEARCH_PROXY=record")
+        return {"query": query, "text": fixture.get("text", ""), "sources": fixture.get("sources", [])}
+
+    def save(self, result: dict) -> None:
+        normalized = normalize_query(result["query"])
+        os.makedirs(self.directory, exist_ok=True)
+        with open(self.path(normalized), "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2, ensure_ascii=False)
+        self._load()[normalized] = result
+
+
+class OpenAISearch:
+    """one hosted web search per miss, run by a small model on the shared client"""
+
+    def __init__(self, model: str = SEARCH_MODEL, context_size: str = "medium"):
+        self.model = model
+        self.context_size = context_size
+
+    async def search(self, query: str) -> dict:
+        from .client import get_openai_client
+
+        response = await get_openai_client().responses.create(
+            model=self.model,
+            instructions=SEARCH_INSTRUCTIONS,
+            input=query,
+            tools=[{"type": "web_search_preview", "search_context_size": self.context_size}],
+            tool_choice="required",
+        )
+        sources = {}
+        for item in response.output:
+            for part in getattr(item, "content", None) or []:
+                for annotation in getattr(part, "annotations", None) or []:
+                    if getattr(annotation, "type", None) == "url_citation":
+                        sources.setdefault(annotation.url, getattr(annotation, "title", None) or "")
+        return {
+            "query": query,
+            "text": response.output_text,
+            "sources": [{"title": title, "url": url} for url, title in sources.items()],
+        }
+
+
+class SearchProxy:
+    """normalized query -> cached result; a miss goes upstream once however many callers ask at the same time"""
+
+    def __init__(self, upstream, backend, ttl: float = SEARCH_CACHE_TTL, fixtures: FixtureIndex = None):
+        self.upstream = upstream
+        self.backend = backend
+        self.ttl = ttl
+        self.fixtures = fixtures  # recording: upstream results are also written here
+        self.flights = SingleFlight()
+        self.hits = 0
+        self.misses = 0
+        self.upstream_calls = 0
+
+    def key(self, normalized: str) -> str:
+        return f"search:{query_digest(normalized)}"
+
+    async def search(self, query: str) -> dict:
+        normalized = normalize_query(query)
+        if not normalized:
+            return {"query": query, "text": "Empty query.", "sources": []}
+        raw = self.backend.get(self.key(normalized))
+        if raw is not None:
+            self.hits += 1
+            return json.loads(raw)
+        self.misses += 1
+        return await self.flights.do(normalized, lambda: self._fetch(query, normalized))
+
+    async def _fetch(self, query: str, normalized: str) -> dict:
+        self.upstream_calls += 1
+        result = await self.upstream.search(query)
+        self.backend.set(self.key(normalized), json.dumps(result), self.ttl)
+        if self.fixtures is not None:
+            self.fixtures.save(result)
+        return result
+
+    def stats(self) -> dict:
+        return {
+            "mode": SEARCH_PROXY or "hosted",
+            "backend": type(self.backend).__name__,
+            "hits": self.hits,
+            "misses": self.misses,
+            "upstream_calls": self.upstream_calls,
+            "coalesced": self.flights.coalesced,
+            "evictions": self.backend.evictions,
+            "ttl_seconds": self.ttl,
+        }
+
+
+def build_search_proxy(mode: str = SEARCH_PROXY):
+    """None when the agents keep the hosted WebSearchTool; cache backend settings as the research cache"""
+    if not mode:
+        return None
+    if mode == "fixtures":
+        upstream, fixtures = FixtureIndex(), None
+    elif mode in ("openai", "record"):
+        upstream, fixtures = OpenAISearch(), FixtureIndex() if mode == "record" else None
+    else:
+        raise ValueError(f"Unknown SEARCH_PROXY '{mode}'")
+    backend = build_backend(
+        os.getenv("SEARCH_CACHE_BACKEND", os.getenv("RESEARCH_CACHE_BACKEND", "memory")),
+        int(os.getenv("SEARCH_CACHE_MAX_ENTRIES", "4096")),
+        os.getenv("SEARCH_CACHE_PATH", os.path.join(tempfile.gettempdir(), "search_cache.db")),
+        namespace="search",
+    )
+    return SearchProxy(upstream, backend, fixtures=fixtures)
+
+
+search_proxy = build_search_proxy()
+
+
+def search_tools(search_context_size: str = "medium") -> list:
+    """
+    the agents' search tool: the proxy's `web_search` function tool when SEARCH_PROXY is set, else the hosted one
+    (search_context_size only applies to the hosted tool, proxied searches share one cache whatever the agent)
+    """
+    if search_proxy is None:
+        from agents import WebSearchTool
+
+        return [WebSearchTool(search_context_size=search_context_size)]
+    from agents import function_tool
+
+    async def web_search(query: str) -> str:
+        """
+        Args:
+            query: the search query
+        """
+        return format_result(await search_proxy.search(query))
+
+    return [function_tool(web_search, name_override="web_search", description_override=TOOL_DESCRIPTION)]
+
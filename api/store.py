@@ -0,0 +1,146 @@
+# persistent local store of vetting results
+# append-only: every finished /research run becomes a new row, nothing is updated in place
+# results holds the full payload, result_flags holds one row per (result, rule) so flag queries hit an index
+# "current" means the latest result for an (entity_type, company_name) pair
+
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+
+from .cache import normalize_name
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    entity_type TEXT NOT NULL,
+    company_name TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    content TEXT,
+    structured_data TEXT,
+    flags TEXT,
+    risk_summary TEXT
+);
+CREATE INDEX IF NOT EXISTS results_company ON results(entity_type, company_name, id);
+CREATE INDEX IF NOT EXISTS results_created_at ON results(created_at);
+
+CREATE TABLE IF NOT EXISTS result_flags (
+    result_id INTEGER NOT NULL REFERENCES results(id),
+    entity_type TEXT NOT NULL,
+    company_name TEXT NOT NULL,
+    rule TEXT NOT NULL,
+    flag TEXT NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS result_flags_rule_flag ON result_flags(rule, flag, entity_type, result_id);
+CREATE INDEX IF NOT EXISTS result_flags_result ON result_flags(result_id);
+"""
+
+
+def _row_to_result(row) -> dict:
+    id_, entity_type, company_name, created_at, content, structured_data, flags, risk_summary = row
+    return {
+        "id": id_,
+        "entity_type": entity_type,
+        "company_name": company_name,
+        "created_at": created_at,
+        "content": content,
+        "structured_data": json.loads(structured_data) if structured_data else None,
+        "flags": json.loads(flags) if flags else None,
+        "risk_summary": risk_summary,
+    }
+
+
+class VettingStore:
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(SCHEMA)
+        self._conn.commit()
+
+    def record(self, response: dict, created_at: float = None) -> int:
+        """append one /research payload, returns the new result id"""
+        entity_type = response["entity_type"]
+        company_name = normalize_name(response["company_name"])
+        created_at = created_at if created_at is not None else time.time()
+        flags = response.get("flags") or {}
+        with self._lock:
+            cursor = self._conn.execute(
+                "INSERT INTO results (entity_type, company_name, created_at, content, structured_data, flags, risk_summary)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (
+                    entity_type,
+                    company_name,
+                    created_at,
+                    response.get("content"),
+                    json.dumps(response.get("structured_data")),
+                    json.dumps(flags),
+                    response.get("risk_summary"),
+                ),
+            )
+            result_id = cursor.lastrowid
+            self._conn.executemany(
+                "INSERT INTO result_flags (result_id, entity_type, company_name, rule, flag, created_at)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                [(result_id, entity_type, company_name, rule, flag, created_at) for rule, flag in flags.items()],
+            )
+            self._conn.commit()
+        return result_id
+
+    def history(self, company_name: str, entity_type: str = None, limit: int = 50) -> list:
+        """every stored result for a company, newest first"""
+        sql = "SELECT * FROM results WHERE company_name = ?"
+        params = [normalize_name(company_name)]
+        if entity_type:
+            sql += " AND entity_type = ?"
+            params.append(entity_type)
+        sql += " ORDER BY id DESC LIMIT ?"
+        params.append(limit)
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        return [_row_to_result(row) for row in rows]
+
+    def companies(self) -> list:
+        """every (entity_type, company_name) pair with at least one result"""
+        with self._lock:
+            return self._conn.execute("SELECT DISTINCT entity_type, company_name FROM results").fetchall()
+
+    def latest(self, company_name: str, entity_type: str):
+        rows = self.history(company_name, entity_type, limit=1)
+        return rows[0] if rows else None
+
+    def query(self, rule: str, flag: str, entity_type: str = None, current: bool = True, limit: int = 500) -> list:
+        """
+        companies whose `rule` came out as `flag`
+        current=True only looks at each company's latest result, False returns every matching result
+        """
+        sql = (
+            "SELECT f.result_id, f.entity_type, f.company_name, f.rule, f.flag, f.created_at"
+            " FROM result_flags f WHERE f.rule = ? AND f.flag = ?"
+        )
+        params = [rule, flag]
+        if entity_type:
+            sql += " AND f.entity_type = ?"
+            params.append(entity_type)
+        if current:
+            sql += (
+                " AND f.result_id = (SELECT MAX(r.id) FROM results r"
+                " WHERE r.entity_type = f.entity_type AND r.company_name = f.company_name)"
+            )
+        sql += " ORDER BY f.result_id DESC LIMIT ?"
+        params.append(limit)
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        return [
+            {"result_id": r[0], "entity_type": r[1], "company_name": r[2], "rule": r[3], "flag": r[4], "created_at": r[5]}
+            for r in rows
+        ]
+
+
+def build_vetting_store() -> VettingStore:
+    """configure from VETTING_DB_PATH (defaults to a file in the temp dir, the only writable place on Vercel)"""
+    return VettingStore(os.getenv("VETTING_DB_PATH") or os.path.join(tempfile.gettempdir(), "vetting_results.db"))
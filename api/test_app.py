@@ -0,0 +1,223 @@
+# the FastAPI app end to end, in process: every agent run is answered by a StubRunner, no API key or network
+
+import asyncio
+import json
+import os
+import re
+import tempfile
+from collections import Counter
+
+# throwaway state: the tests must not touch the real cache, history or job queue
+os.environ.setdefault("OPENAI_API_KEY", "test")
+_STATE_DIR = tempfile.mkdtemp(prefix="test-app-")
+os.environ["VETTING_DB_PATH"] = os.path.join(_STATE_DIR, "vetting.db")
+os.environ["JOBS_DB_PATH"] = os.path.join(_STATE_DIR, "jobs.db")
+os.environ["RESEARCH_CACHE_BACKEND"] = "memory"
+os.environ["RESEARCH_CACHE_PATH"] = os.path.join(_STATE_DIR, "research_cache.db")
+os.environ["SEARCH_CACHE_PATH"] = os.path.join(_STATE_DIR, "search_cache.db")
+
+import httpx
+import pytest
+
+from api import agents, runner
+from api.agents import BatchRequest, app, batch_tasks, stream_batch, stream_research
+from api.replay import ReplayStream, StubRunner
+from benchmarks.pipeline import stub_output
+
+
+@pytest.fixture(autouse=True)
+def stub_agents():
+    runner.use_runner(StubRunner(stub_output))
+    yield
+    runner.use_runner(None)
+
+
+def call(method: str, path: str, **kwargs):
+    async def main():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+            return await client.request(method, path, **kwargs)
+
+    return asyncio.run(main())
+
+
+def sse_events(text: str) -> list:
+    events = []
+    for block in text.strip().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in block.splitlines())
+        events.append((lines["event"], json.loads(lines["data"])))
+    return events
+
+
+def test_stream_matches_research():
+    topics = ["manufacturer: Stream Check"]
+    events = sse_events(call("POST", "/research/stream", json={"topics": topics, "refresh": True}).text)
+    names = [name for name, _ in events]
+    assert names[0] == "status" and names[-1] == "done" and "error" not in names
+    done = events[-1][1]
+    assert done.get("error") is None, done["error"]
+
+    # the JSON block streams in 64 character chunks: structured_data is only sent once the block is complete
+    structured = [data for name, data in events if name == "structured_data"]
+    research = call("POST", "/research", json={"topics": topics, "refresh": True}).json()
+    assert structured[0] == research["structured_data"] == done["structured_data"]
+    assert done["flags"] == research["flags"]
+    assert [data["flag"] for name, data in events if name == "flag"] == list(research["flags"].values())
+
+
+def test_research_reports_a_fuzzy_name_match(monkeypatch):
+    call("POST", "/research", json={"topics": ["dealer: Fuzzy Motors Group"], "refresh": True})
+    exact = call("POST", "/research", json={"topics": ["dealer: Fuzzy Motors Groups"]}).json()
+    assert exact["company_name"] == "fuzzy motors groups" and "resolved_from" not in exact
+
+    monkeypatch.setattr(agents.get_company_index(), "fuzzy", True)  # opt-in, NAME_MATCH=fuzzy
+    fuzzy = call("POST", "/research", json={"topics": ["dealer: Fuzzy Motor Group"]}).json()
+    assert fuzzy["company_name"] == "fuzzy motors group" and fuzzy["cached"] is True
+    assert fuzzy["resolved_from"] == "Fuzzy Motor Group" and 0.85 <= fuzzy["match_score"] < 1
+
+
+def test_stream_answers_a_cached_company_without_a_run():
+    topics = ["manufacturer: Stream Cached"]
+    research = call("POST", "/research", json={"topics": topics, "refresh": True}).json()
+    runner.use_runner(StubRunner(lambda *args: pytest.fail("a cached company must not start an agent run")))
+    events = sse_events(call("POST", "/research/stream", json={"topics": topics}).text)
+    assert [name for name, _ in events if name != "flag"] == ["status", "structured_data", "done"]
+    assert events[-1][1]["cached"] is True and events[-1][1]["flags"] == research["flags"]
+
+
+def test_stream_cancels_the_run_when_the_client_goes_away():
+    cancelled = []
+
+    class Stream(ReplayStream):
+        def cancel(self):
+            cancelled.append(True)
+
+    class Runner(StubRunner):
+        def run_streamed(self, agent, prompt, stage_name, **kwargs):
+            return Stream(self.responder(agent, prompt, stage_name))
+
+    runner.use_runner(Runner(stub_output))
+
+    async def main():
+        events = stream_research("manufacturer", "stream disconnect", refresh=True)
+        async for event in events:
+            if event.startswith("event: delta"):
+                break
+        await events.aclose()  # what Starlette does when the client disconnects
+
+    asyncio.run(main())
+    assert cancelled == [True]
+
+
+class SlowRunner(StubRunner):
+    """runs for a company named "slow ..." take ten seconds, and note when they are cancelled"""
+
+    def __init__(self):
+        super().__init__(stub_output)
+        self.cancelled = []
+
+    async def run(self, agent, prompt, stage_name: str, **kwargs):
+        if "slow" in str(prompt).lower():
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                self.cancelled.append(stage_name)
+                raise
+        return await super().run(agent, prompt, stage_name, **kwargs)
+
+
+def ndjson(text: str) -> list:
+    return [json.loads(line) for line in text.splitlines() if line]
+
+
+def test_batch_streams_every_item_then_a_summary():
+    runner.use_runner(SlowRunner())
+    topics = ["manufacturer: Batch One", "dealer: Batch Two", "manufacturer: Slow Batch"]
+    lines = ndjson(call("POST", "/research/batch", json={"topics": topics, "timeout": 0.5, "refresh": True}).text)
+    items, summary = lines[:-1], lines[-1]["summary"]
+    assert sorted(item["index"] for item in items) == [0, 1, 2]
+    status = {item["topic"]: item["status"] for item in items}
+    assert status == {topics[0]: "ok", topics[1]: "ok", topics[2]: "timeout"}
+    assert items[-1]["topic"] == topics[2]  # results come as they complete, not in request order
+    assert summary["total"] == 3 and summary["ok"] == 2 and summary["timeout"] == 1
+
+
+def test_batch_cancels_the_remaining_items_when_the_client_goes_away():
+    slow_runner = SlowRunner()
+    runner.use_runner(slow_runner)
+    request = BatchRequest(topics=["manufacturer: Batch Fast", "manufacturer: Slow One", "dealer: Slow Two"], refresh=True)
+
+    async def main():
+        lines = stream_batch(request)
+        first = json.loads(await lines.__anext__())
+        assert first["topic"] == "manufacturer: Batch Fast" and first["status"] == "ok"
+        assert len(batch_tasks) == 3
+        await lines.aclose()  # what Starlette does when the client disconnects
+        await asyncio.sleep(0.05)
+        assert batch_tasks == set()
+        assert len(slow_runner.cancelled) == 2  # before asyncio.run would cancel them on its way out
+
+    asyncio.run(main())
+
+
+def test_report_overlaps_the_newsletter_with_gap_fill_and_the_risk_summary(monkeypatch):
+    monkeypatch.setattr(agents, "GAP_FILL_ENABLED", True)  # opt-in, GAP_FILL=1
+    stage_latency = {"gap_fill": 0.3, "risk_summary": 0.3, "risk_sections": 0.3, "newsletter": 0.3}
+    runner.use_runner(StubRunner(stub_output, stage_latency=stage_latency))
+    topics = ["manufacturer: Report Check"]
+    report = call("POST", "/report", json={"topics": topics, "refresh": True}).json()
+    assert report.get("error") is None, report["error"]
+    assert report["title"] == "Comprehensive Risk Analysis of Manufacturer: Report Check"
+    assert report["content"] != report["raw_content"] and report["risk_summary"]
+    timings = report["timings"]
+    assert timings["gap_fill"] >= 0.3 and timings["risk_summary"] >= 0.3 and timings["newsletter"] >= 0.3
+    after_research = timings["total"] - timings["research"]
+    assert after_research < timings["gap_fill"] + timings["risk_summary"] + timings["newsletter"] - 0.2
+    assert report["flags"] == call("POST", "/research", json={"topics": topics}).json()["flags"]
+
+
+def test_report_and_format_reuse_the_research_and_the_newsletter():
+    topics = ["asset: Report Cached"]
+    first = call("POST", "/report", json={"topics": topics, "refresh": True}).json()
+    runner.use_runner(StubRunner(lambda *args: pytest.fail("nothing is left to run for a cached report")))
+    second = call("POST", "/report", json={"topics": topics}).json()
+    assert second["cached"] is True and second["newsletter_cached"] is True
+    assert second["content"] == first["content"] and second["flags"] == first["flags"]
+    formatted = call("POST", "/format", json={"topics": topics, "raw_content": first["raw_content"]}).json()
+    assert formatted["cached"] is True and formatted["content"] == first["content"]
+    assert (formatted["entity_type"], formatted["company_name"]) == ("asset", "Report Cached")
+
+
+def scrape() -> Counter:
+    """/metrics samples summed over the model label: (metric, stage, other labels) -> value"""
+    response = call("GET", "/metrics")
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    samples = Counter()
+    for line in response.text.splitlines():
+        if line.startswith("#"):
+            continue
+        name, labels, value = re.fullmatch(r"(\w+)\{(.*)\} (\S+)", line).groups()
+        labels = dict(re.findall(r'(\w+)="([^"]*)"', labels))
+        labels.pop("model")
+        samples[(name, labels.pop("stage"), tuple(sorted(labels.items())))] += float(value)
+    return samples
+
+
+def test_metrics_count_every_stage_of_a_run():
+    before = scrape()
+    call("POST", "/research", json={"topics": ["dealer: Metrics Check"], "refresh": True})
+    after = scrape()
+    delta = {key: after[key] - before[key] for key in after if after[key] != before[key]}
+
+    for stage in ("research", "extract_json", "rules"):
+        assert delta[("agents_stage_runs_total", stage, (("outcome", "ok"),))] == 1
+        assert delta[("agents_stage_seconds_count", stage, ())] == 1
+    assert delta[("agents_tokens_total", "research", (("kind", "input"),))] > 0
+    assert delta[("agents_tokens_total", "research", (("kind", "output"),))] > 0
+
+    # histogram buckets are cumulative and the +Inf bucket is the count
+    buckets = sorted(
+        (float(labels[0][1]), value) for (name, stage, labels), value in after.items()
+        if name == "agents_stage_seconds_bucket" and stage == "research"
+    )
+    assert [value for _, value in buckets] == sorted(value for _, value in buckets)
+    assert buckets[-1] == (float("inf"), after[("agents_stage_seconds_count", "research", ())])
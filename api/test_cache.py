@@ -0,0 +1,75 @@
+# research cache backends: per-entry expiry and LRU eviction behave the same on every backend
+
+from types import SimpleNamespace
+
+import pytest
+
+from api import cache
+from api.cache import LocalRedis, MemoryBackend, RedisBackend, ResearchCache, SQLiteBackend, build_backend
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1_000_000.0]
+    monkeypatch.setattr(cache, "time", SimpleNamespace(time=lambda: now[0]))
+    return now
+
+
+def make_backend(kind: str, tmp_path, max_entries: int):
+    if kind == "memory":
+        return MemoryBackend(max_entries)
+    if kind == "sqlite":
+        return SQLiteBackend(str(tmp_path / "cache.db"), max_entries)
+    return RedisBackend(LocalRedis(max_entries))
+
+
+@pytest.mark.parametrize("kind", ["memory", "sqlite", "local-redis"])
+def test_entries_expire_after_their_ttl(kind, tmp_path, clock):
+    backend = make_backend(kind, tmp_path, 10)
+    backend.set("a", "1", ttl=60)
+    clock[0] += 59
+    assert backend.get("a") == "1"
+    clock[0] += 2
+    assert backend.get("a") is None
+    backend.set("b", "2", ttl=60)
+    backend.delete("b")
+    assert backend.get("b") is None
+
+
+@pytest.mark.parametrize("kind", ["memory", "sqlite", "local-redis"])
+def test_least_recently_used_entry_is_evicted(kind, tmp_path, clock):
+    backend = make_backend(kind, tmp_path, 2)
+    backend.set("a", "1", ttl=60)
+    clock[0] += 1
+    backend.set("b", "2", ttl=60)
+    clock[0] += 1
+    assert backend.get("a") == "1"  # a is now the most recently used
+    clock[0] += 1
+    backend.set("c", "3", ttl=60)
+    assert backend.get("b") is None
+    assert backend.get("a") == "1" and backend.get("c") == "3"
+    assert backend.evictions == 1
+
+
+def test_sqlite_namespaces_in_one_file_evict_separately(tmp_path, clock):
+    path = str(tmp_path / "cache.db")
+    research = build_backend("sqlite", 2, path)
+    sections = build_backend("sqlite", 2, path, namespace="risk-section")
+    research.set("research:a", "1", ttl=60)
+    research.set("research:b", "2", ttl=60)
+    for i in range(5):  # a busy namespace only pushes out its own entries
+        clock[0] += 1
+        sections.set(f"risk-section:{i}", str(i), ttl=60)
+    assert research.get("research:a") == "1" and research.get("research:b") == "2"
+    assert len(research) == 2 and len(sections) == 2 and research.evictions == 0 and sections.evictions == 3
+    assert sections.get("risk-section:4") == "4" and sections.get("risk-section:0") is None
+
+
+def test_research_cache_key_and_stats():
+    research_cache = ResearchCache(MemoryBackend(), ttl=60)
+    research_cache.set("manufacturer", "Olympus ", "instructions v1", {"flags": {}})
+    assert research_cache.get("Manufacturer", "olympus", "instructions v1") == {"flags": {}}
+    assert research_cache.get("manufacturer", "olympus", "instructions v2") is None  # prompt edited
+    research_cache.invalidate("manufacturer", "olympus", "instructions v1")
+    assert research_cache.get("manufacturer", "olympus", "instructions v1") is None
+    assert research_cache.stats()["hits"] == 1 and research_cache.stats()["misses"] == 2
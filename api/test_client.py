@@ -0,0 +1,83 @@
+# shared OpenAI client layer against the local fake server (benchmarks/fake_openai.py), no network or key needed
+
+import asyncio
+
+import httpx
+import pytest
+
+from api.client import RateLimiter, RetryTransport, TokenBucket, prompt_cache_key
+from api.metrics import metrics
+from benchmarks.fake_openai import FakeOpenAI
+
+agents = pytest.importorskip("agents")
+
+
+def run_through(server: FakeOpenAI, stream: bool = False, max_retries: int = 3):
+    from openai import AsyncOpenAI
+
+    agents.set_tracing_disabled(True)
+    transport = RetryTransport(httpx.ASGITransport(app=server.app), RateLimiter({}), max_retries=max_retries)
+    client = AsyncOpenAI(
+        api_key="test", base_url="http://fake/v1", max_retries=0, http_client=httpx.AsyncClient(transport=transport)
+    )
+    agent = agents.Agent(name="Test", instructions="hi", model=agents.OpenAIResponsesModel("gpt-4.1", client))
+
+    async def go():
+        if not stream:
+            return (await agents.Runner.run(agent, "hello")).final_output
+        result = agents.Runner.run_streamed(agent, "hello")
+        deltas = [
+            event.data.delta
+            async for event in result.stream_events()
+            if event.type == "raw_response_event" and event.data.type == "response.output_text.delta"
+        ]
+        return "".join(deltas), result.final_output
+
+    return asyncio.run(go())
+
+
+def test_retries_rate_limited_calls():
+    server = FakeOpenAI(fail_first=2, retry_after=0.01)
+    before = sum(metrics.retries.values())
+    assert run_through(server) == "fake answer"
+    assert [status for _, _, status in server.requests] == [429, 429, 200]
+    assert sum(metrics.retries.values()) - before == 2
+
+
+def test_retries_streamed_calls_and_gives_up():
+    assert run_through(FakeOpenAI(fail_first=1, fail_status=503), stream=True) == ("fake answer", "fake answer")
+    with pytest.raises(Exception):
+        run_through(FakeOpenAI(fail_first=5, retry_after=0.01), max_retries=1)
+
+
+def test_token_bucket_queues_in_arrival_order():
+    bucket = TokenBucket(60)  # one per second once the minute's burst is used
+    start = bucket.updated
+    waits = [bucket.reserve(1, now=start) for _ in range(62)]
+    assert waits[:60] == [0.0] * 60
+    assert waits[60:] == [1.0, 2.0]
+    # half a minute later the reservations are paid back
+    assert bucket.reserve(1, now=start + 30) == 0.0
+
+
+def test_rate_limiter_pause_and_unlisted_models():
+    limiter = RateLimiter({"gpt-4.1": (600, 100000)})
+    assert asyncio.run(limiter.acquire("other-model", 10**9)) == 0.0
+    limiter.pause("gpt-4.1", 0.05)
+    assert asyncio.run(limiter.acquire("gpt-4.1", 10)) > 0
+
+
+def test_long_queueing_is_reported(capsys):
+    limiter = RateLimiter({"gpt-4.1": (600, 100000)}, warn_after=0.02)
+    limiter.pause("gpt-4.1", 0.01)
+    asyncio.run(limiter.acquire("gpt-4.1", 10))
+    assert capsys.readouterr().err == ""
+    limiter.pause("gpt-4.1", 0.05)
+    asyncio.run(limiter.acquire("gpt-4.1", 10))
+    assert "gpt-4.1 call queued" in capsys.readouterr().err
+
+
+def test_prompt_cache_key_follows_the_instructions():
+    key = prompt_cache_key("Research Agent", "Research the company.")
+    assert key == prompt_cache_key("Research Agent", "Research the company.") and key.startswith("research-agent-")
+    assert key != prompt_cache_key("Research Agent", "Research the company in depth.")
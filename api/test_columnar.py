@@ -0,0 +1,68 @@
+# property-based check that the vectorized rules match the scalar rules_logic functions record by record
+
+import pytest
+
+np = pytest.importorskip("numpy")
+hypothesis = pytest.importorskip("hypothesis")
+from hypothesis import given, settings, strategies as st
+
+import copy
+
+from api.rules.columnar import MISSING, RULE_FIELDS as FIELDS, VECTORIZED_RULES, ColumnarRule, columns_from_records, score_columns
+from api.rules.rules_logic import RULE_SET
+from api.rules.spec import RuleSet, load_spec
+
+# values around the thresholds plus everything the model has been seen to return
+values = st.one_of(
+    st.just(MISSING),
+    st.none(),
+    st.booleans(),
+    st.integers(min_value=-5, max_value=80),
+    st.integers(min_value=1900, max_value=2100),
+    st.integers(),
+    st.floats(allow_nan=True, allow_infinity=True),
+    st.sampled_from([15.0, 20.0, 30.0, 50.0, 75.0, 2.0, 1.99]),
+    st.sampled_from(["35", "35%", " 12 ", "1e3", "nan", "inf", "Unknown", "", "5.0", "2020"]),
+    st.sampled_from(["yes", "YES", "no", "Liquidated", "dissolved", "Inactive", "dormant", "active"]),
+    st.text(max_size=6),
+)
+
+records = st.lists(st.dictionaries(st.sampled_from(sorted({f for fs in FIELDS.values() for f in fs})), values), max_size=25)
+
+
+def scalar(rule: str, record: dict) -> str:
+    data = {key: value for key, value in record.items() if value is not MISSING}
+    try:
+        return RULE_SET.functions[rule](data)
+    except Exception:
+        return "Error"
+
+
+@settings(max_examples=300, deadline=None)
+@given(records)
+def test_vectorized_rules_match_scalar_rules(batch):
+    batch = [{key: value for key, value in record.items() if value is not MISSING} for record in batch]
+    flags = score_columns(columns_from_records(batch))
+    for rule in VECTORIZED_RULES:
+        assert list(flags[rule]) == [scalar(rule, record) for record in batch], rule
+
+
+@settings(max_examples=100, deadline=None)
+@given(st.lists(st.floats(allow_nan=True, allow_infinity=True), min_size=1, max_size=25), st.sampled_from(sorted(VECTORIZED_RULES)))
+def test_numeric_columns_match_scalar_rules(column, rule):
+    # typed float64 columns take the fast path, every field of the rule gets the same column
+    array = np.array(column, dtype=np.float64)
+    flags = score_columns({field: array for field in FIELDS[rule]}, rules=[rule])[rule]
+    expected = [scalar(rule, {field: value for field in FIELDS[rule]}) for value in column]
+    assert list(flags) == expected
+
+
+def test_tuned_spec_changes_the_columnar_rules_too():
+    spec = copy.deepcopy(load_spec())
+    spec["rules"]["supplier_concentration"]["cases"][0]["if"]["any"][0]["top1"][">"] = 40
+    tuned = RuleSet(spec)
+    column = {"top_supplier_share": np.array([35.0, 45.0, 55.0])}
+    assert list(score_columns(column, rules=["supplier_concentration"])["supplier_concentration"]) == ["Review", "Review", "Flag"]
+    flags = ColumnarRule(tuned.compilers["supplier_concentration"])(column, 3)
+    assert list(flags) == ["Review", "Flag", "Flag"]
+    assert list(flags) == [tuned.functions["supplier_concentration"]({"top_supplier_share": share}) for share in (35.0, 45.0, 55.0)]
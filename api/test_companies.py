@@ -0,0 +1,105 @@
+# company name canonicalization / fuzzy resolution and single-flight coalescing
+
+import asyncio
+
+import pytest
+
+from api.companies import NameIndex, SingleFlight, canonicalize
+
+
+@pytest.mark.parametrize(
+    "name, expected",
+    [
+        ("Olympus", "olympus"),
+        ("olympus corp", "olympus"),
+        ("OLYMPUS Corporation", "olympus"),
+        ("Toyota Motor Co., Ltd.", "toyota motor"),
+        ("Société Générale S.A.", "societe generale"),
+        ("Dataworks Research S.R.L.", "dataworks research"),
+        ("The Boeing Company", "boeing"),
+        ("AG", "ag"),
+    ],
+)
+def test_canonicalize(name, expected):
+    assert canonicalize(name) == expected
+
+
+def test_name_index_matches_the_canonical_name_only_by_default():
+    index = NameIndex()
+    for name in ("tesla energy", "komatsu america", "alpha one"):
+        index.add("manufacturer", name)
+    assert index.resolve("manufacturer", "Tesla Energy Inc.") == "tesla energy"
+    assert index.resolve_with_score("manufacturer", "tesla energy x") == ("tesla energy x", None)
+    assert index.resolve("manufacturer", "Komatsu Americas") == "komatsu americas"
+    assert index.resolve("manufacturer", "alpha ones") == "alpha ones"
+
+
+def test_name_index_resolves_close_spellings_only():
+    index = NameIndex(threshold=0.85, fuzzy=True)
+    index.add("manufacturer", "siemens healthineers")
+    index.add("manufacturer", "olympus corporation")  # stored before canonicalization
+    assert index.resolve("manufacturer", "Siemens Healthineer AG") == "siemens healthineers"
+    assert index.resolve("manufacturer", "OLYMPUS Corp.") == "olympus corporation"
+    assert index.resolve("manufacturer", "Olympia") == "olympia"
+    assert index.resolve("dealer", "Olympus") == "olympus"  # indexes are per entity type
+    assert index.resolve_with_score("manufacturer", "olympus") == ("olympus corporation", None)  # same canonical name
+    name, score = index.resolve_with_score("manufacturer", "Siemens Healthineer AG")
+    assert name == "siemens healthineers" and 0.85 <= score < 1
+
+
+def test_single_flight_shares_one_run():
+    flights = SingleFlight()
+    calls = []
+
+    async def work():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return {"ok": True}
+
+    async def main():
+        results = await asyncio.gather(*(flights.do("olympus", work) for _ in range(5)))
+        # a caller timing out doesn't cancel the shared run for the others
+        slow = asyncio.ensure_future(flights.do("boeing", work))
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(flights.do("boeing", work), 0.001)
+        return results, await slow
+
+    results, slow = asyncio.run(main())
+    assert results == [{"ok": True}] * 5 and slow == {"ok": True}
+    assert len(calls) == 2
+    assert flights.stats() == {"in_flight": 0, "started": 2, "coalesced": 5, "abandoned": 0}
+
+
+def test_single_flight_stops_the_run_when_its_last_caller_leaves():
+    flights = SingleFlight()
+    runs = []
+
+    async def work():
+        runs.append("started")
+        try:
+            await asyncio.sleep(0.05)
+        except asyncio.CancelledError:
+            runs.append("cancelled")
+            raise
+        return "done"
+
+    async def main():
+        first = asyncio.ensure_future(flights.do("acme", work))
+        second = asyncio.ensure_future(flights.do("acme", work))
+        await asyncio.sleep(0)
+        first.cancel()  # one caller disconnects, the other still gets the result
+        assert await second == "done"
+
+        # every caller gone (disconnect, timeout): the run is cancelled, not orphaned
+        third = asyncio.ensure_future(flights.do("boeing", work))
+        await asyncio.sleep(0)
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(flights.do("boeing", work), 0.001)
+        third.cancel()
+        await asyncio.sleep(0.01)
+        # a new caller starts over instead of joining the cancelled run
+        assert await flights.do("boeing", work) == "done"
+
+    asyncio.run(main())
+    assert runs == ["started", "started", "cancelled", "started"]
+    assert flights.stats() == {"in_flight": 0, "started": 3, "coalesced": 2, "abandoned": 1}
@@ -0,0 +1,41 @@
+# deal sessions: the anchor is researched first, later runs get its findings and searches in their prompt
+
+from types import SimpleNamespace
+
+from api.deals import DealSession, report_excerpt, search_log
+
+
+def run_result(queries, urls):
+    searches = [SimpleNamespace(raw_item=SimpleNamespace(type="web_search_call", action=SimpleNamespace(query=q))) for q in queries]
+    annotations = [SimpleNamespace(type="url_citation", url=url) for url in urls]
+    message = SimpleNamespace(raw_item=SimpleNamespace(type="message", content=[SimpleNamespace(annotations=annotations)]))
+    return SimpleNamespace(new_items=[*searches, message])
+
+
+def test_anchor_is_the_manufacturer():
+    session = DealSession([("dealer", "foo motors"), ("asset", "x5"), ("manufacturer", "acme"), ("dealer", "foo motors")])
+    assert session.anchor == ("manufacturer", "acme")
+    assert session.related == [("dealer", "foo motors"), ("asset", "x5")]
+    assert DealSession([("asset", "x5"), ("dealer", "foo")]).anchor == ("dealer", "foo")
+
+
+def test_related_runs_get_the_findings_of_the_anchor():
+    session = DealSession([("manufacturer", "acme"), ("dealer", "foo motors")])
+    assert "vetted together with dealer: foo motors" in session.context_for("manufacturer", "acme")
+    report = "Acme is a listed group.\n\n```json\n{\"status\": \"active\"}\n```"
+    session.add("manufacturer", "acme", report, run_result(["acme annual report 2025"], ["https://acme.example/ir"]))
+
+    context = session.context_for("dealer", "foo motors")
+    assert "### manufacturer: acme\nAcme is a listed group." in context and "```json" not in context
+    assert '"acme annual report 2025"' in context and "https://acme.example/ir" in context
+    assert "### manufacturer" not in session.context_for("manufacturer", "acme")
+
+    session.add("dealer", "foo motors", "Foo sells Acme.")  # served from the research cache: no searches
+    assert session.report()["web_searches"] == {"manufacturer: acme": 1, "dealer: foo motors": 0}
+    assert search_log(SimpleNamespace(new_items=[])) == ([], [])
+
+
+def test_report_excerpt_cuts_at_a_paragraph():
+    text = "a" * 40 + "\n\n" + "b" * 40
+    assert report_excerpt(text, limit=60) == "a" * 40 + "\n[...]"
+    assert report_excerpt(text, limit=100) == text
@@ -0,0 +1,82 @@
+# tolerant JSON extraction: truncated / sloppy research output still yields the fields that did arrive
+
+import json
+
+import pytest
+
+from api.extract import IncrementalJSONParser, extract_json_from_markdown, parse_partial_json
+from api.rules.rules_logic import customer_concentration
+
+hypothesis = pytest.importorskip("hypothesis")
+from hypothesis import given, settings, strategies as st
+
+scalars = st.one_of(st.none(), st.booleans(), st.integers(), st.floats(allow_nan=False, allow_infinity=False), st.text(max_size=8))
+keys = st.text(max_size=8)
+documents = st.dictionaries(
+    keys,
+    st.recursive(scalars, lambda inner: st.lists(inner, max_size=3) | st.dictionaries(keys, inner, max_size=3), max_leaves=8),
+    max_size=4,
+)
+
+
+@pytest.mark.parametrize(
+    "text, expected",
+    [
+        ('{"status": "active", "registration_year": 2010,}', {"status": "active", "registration_year": 2010}),
+        ('{"status": "act', {"status": "Unknown"}),
+        ('{"status": "active", "top3_clients_share": 6', {"status": "active", "top3_clients_share": "Unknown"}),
+        ('{"status": "active", "top3_clients_share": -', {"status": "active", "top3_clients_share": "Unknown"}),
+        ('{"status": "active", "listed": true', {"status": "active", "listed": True}),
+        ('{"owner": {"name": "Jane", "country": "Roman', {"owner": {"name": "Jane", "country": "Unknown"}}),
+        ('{"status": "active", "registration_ye', {"status": "active"}),
+        ('{"status": "active", "listed": tru', {"status": "active", "listed": "Unknown"}),
+        ('{"product_lines": ["cameras", "endosc', {"product_lines": ["cameras"]}),
+    ],
+)
+def test_parse_partial_json(text, expected):
+    assert parse_partial_json(text) == expected
+
+
+def test_cut_off_value_is_unknown_not_a_wrong_number():
+    data = parse_partial_json('{"top_client_share": 10, "top3_clients_share": 6')
+    assert customer_concentration(data) == customer_concentration({"top_client_share": 10, "top3_clients_share": "Unknown"})
+    assert customer_concentration(data) != customer_concentration({"top_client_share": 10, "top3_clients_share": 6})
+    # the streamed preview still shows a string as far as it got
+    assert parse_partial_json('{"report_markdown": "# Acme\\nAcme is a', partial_values=True) == {"report_markdown": "# Acme\nAcme is a"}
+
+
+def test_extract_json_from_markdown_fallbacks():
+    assert extract_json_from_markdown('report\n```json\n{"status": "active", "incidents": "none"}\n```') == {
+        "status": "active",
+        "incidents": "none",
+    }
+    # trailing comma inside a closed block, then a block cut off by the token limit
+    assert extract_json_from_markdown('```json\n{"status": "active",}\n```') == {"status": "active"}
+    assert extract_json_from_markdown('report\n```json\n{"status": "active", "agency": "S&') == {
+        "status": "active",
+        "agency": "Unknown",
+    }
+    assert extract_json_from_markdown("no data block") is None
+
+
+@settings(max_examples=60, deadline=None)
+@given(documents)
+def test_every_prefix_parses(document):
+    text = json.dumps(document)
+    for end in range(len(text)):
+        value = parse_partial_json(text[:end])
+        assert value is None or isinstance(value, dict)
+    assert parse_partial_json(text) == document
+
+
+def test_incremental_parser_grows_report():
+    text = json.dumps({"report_markdown": "line one\nline \"two\"", "structured_data": {"status": "active"}})
+    parser = IncrementalJSONParser(parse_every=1)
+    seen = []
+    for i in range(0, len(text), 3):
+        parser.feed(text[i : i + 3])
+        report = (parser.snapshot() or {}).get("report_markdown")
+        if report:
+            seen.append(report)
+    assert all(b.startswith(a) for a, b in zip(seen, seen[1:]))
+    assert parser.snapshot(force=True) == json.loads(text)
@@ -0,0 +1,52 @@
+# gap fill: one follow-up run per rule with missing inputs, answers merged only where the field was missing
+
+import asyncio
+import json
+
+import pytest
+
+from api import runner
+from api.gapfill import fill_gaps, missing_field_groups
+from api.replay import StubRunner
+
+DATA = {"status": "Active", "registration_year": "Unknown", "traceability": "n/a", "top_client_share": 20}
+
+
+@pytest.fixture(autouse=True)
+def live_runner_afterwards():
+    yield
+    runner.use_runner(None)
+
+
+def test_each_missing_field_is_asked_for_once():
+    groups = missing_field_groups("manufacturer", DATA)
+    asked = [field for fields in groups.values() for field in fields]
+    assert len(asked) == len(set(asked))
+    assert "traceability" in asked and "registration_year" in asked
+    assert "status" not in asked and "top_client_share" not in asked
+
+
+def test_gap_fill_never_overwrites_a_known_value():
+    prompts = []
+
+    def answer(agent, prompt, stage_name):
+        prompts.append(prompt)
+        # every run answers more than it was asked, including a different status
+        return "```json\n" + json.dumps({"registration_year": 2001, "status": "Dissolved", "traceability": "Unknown"}) + "\n```"
+
+    runner.use_runner(StubRunner(answer))
+    merged, report = asyncio.run(fill_gaps("manufacturer", "acme", DATA))
+    assert merged["status"] == "Active" and merged["top_client_share"] == 20
+    assert merged["registration_year"] == 2001
+    assert merged["traceability"] == "n/a"  # answered Unknown, stays missing
+    assert "registration_year" in report["filled"] and "traceability" in report["still_missing"]
+    assert report["runs"] == len(prompts)
+
+
+def test_a_failed_run_leaves_the_fields_missing():
+    def answer(agent, prompt, stage_name):
+        raise RuntimeError("search failed")
+
+    runner.use_runner(StubRunner(answer))
+    merged, report = asyncio.run(fill_gaps("manufacturer", "acme", DATA))
+    assert merged == DATA and report["filled"] == []
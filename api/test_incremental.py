@@ -0,0 +1,56 @@
+# incremental re-evaluation: only the rules whose input fields changed are re-run, the other flags carried over
+
+from datetime import datetime
+
+from api.rules.incremental import changed_fields, reevaluate
+from api.rules.rule_engine import RuleEngine
+
+
+def test_every_field_a_rule_reads_is_in_its_fields():
+    plan = RuleEngine.compile("manufacturer")
+    fields = {rule.key: rule.fields for rule in plan.rules}
+    # read by the spec inputs, but in neither REQUIRED_DATA, key_fields nor the template
+    assert "traceability" in fields["asset_traceability"]
+    assert "number_of_clients" in fields["customer_concentration"]
+
+
+def test_one_changed_input_reruns_only_its_rule():
+    plan = RuleEngine.compile("asset")
+    old_data = {"traceability": "full GPS", "registration_year": 2001, "status": "Active"}
+    new_data = {**old_data, "traceability": "none"}
+    old_flags = plan.evaluate(old_data)
+    assert old_flags["asset_traceability"] == "OK"
+
+    result = reevaluate(plan, old_data, new_data, old_flags)
+    assert result["changed_fields"] == ["traceability"]
+    assert result["rerun_rules"] == ["asset_traceability"]
+    assert result["flags"] == plan.evaluate(new_data)
+    assert result["flags"]["asset_traceability"] == "Flag"
+
+
+def test_unchanged_data_reuses_every_flag_but_errors():
+    plan = RuleEngine.compile("dealer")
+    data = {"open_cases": "2", "pep": "no"}
+    flags = plan.evaluate(data)
+    flags[plan.rules[0].key] = "Error"
+    result = reevaluate(plan, data, dict(data), flags)
+    assert changed_fields(data, dict(data)) == set()
+    assert result["rerun_rules"] == [plan.rules[0].key]
+    assert result["flags"] == plan.evaluate(data)
+
+
+def test_flags_from_a_previous_year_rerun_the_rules_reading_current_year():
+    plan = RuleEngine.compile("dealer")
+    year = datetime.now().year
+    data = {"registration_year": year - 3, "last_report_year": year - 1, "status": "active", "open_cases": "2"}
+    # what the same data was flagged as last year, when the company was two years old
+    last_year = plan.evaluate({**data, "registration_year": year - 2, "last_report_year": year - 2})
+    old_flags = {**plan.evaluate(data), "business_age": last_year["business_age"]}
+    assert old_flags["business_age"] != plan.evaluate(data)["business_age"]
+
+    result = reevaluate(plan, data, dict(data), old_flags, old_year=year - 1)
+    assert result["rerun_rules"] == ["business_age"]
+    assert result["flags"] == plan.evaluate(data)
+
+    same_year = reevaluate(plan, data, dict(data), result["flags"], old_year=year)
+    assert same_year["rerun_rules"] == [] and same_year["flags"] == result["flags"]
@@ -0,0 +1,116 @@
+# SQLite job queue: priorities, idempotency keys, lease expiry, retries and the worker pool
+
+import asyncio
+
+from api.jobs import JobQueue, WorkerPool
+from api.metrics import stage
+
+
+def make_queue(tmp_path) -> JobQueue:
+    return JobQueue(str(tmp_path / "jobs.db"))
+
+
+def test_priority_then_age_and_idempotency(tmp_path):
+    queue = make_queue(tmp_path)
+    low, _ = queue.enqueue("research", {"topics": ["a"]})
+    high, _ = queue.enqueue("research", {"topics": ["b"]}, priority=5)
+    again, created = queue.enqueue("research", {"topics": ["c"]}, idempotency_key="import-42")
+    same, created_again = queue.enqueue("research", {"topics": ["c"]}, idempotency_key="import-42")
+    assert created and not created_again and same["id"] == again["id"]
+
+    assert [queue.claim("w")["id"] for _ in range(3)] == [high["id"], low["id"], again["id"]]
+    assert queue.claim("w") is None
+
+
+def test_expired_lease_is_claimed_again(tmp_path):
+    queue = make_queue(tmp_path)
+    job, _ = queue.enqueue("research", {"topics": ["a"]})
+    queue.claim("dead-worker", lease=-1)  # worker died, lease already over
+    reclaimed = queue.claim("w2")
+    assert reclaimed["id"] == job["id"] and reclaimed["attempts"] == 2 and reclaimed["worker"] == "w2"
+    assert [event["event"] for event in queue.events(job["id"])] == ["queued", "started", "lease_expired", "started"]
+
+
+def test_worker_pool_runs_retries_and_reports_progress(tmp_path):
+    queue = make_queue(tmp_path)
+    calls = {"flaky": 0}
+
+    async def ok(payload, emit):
+        with stage("research"):
+            await asyncio.sleep(0)
+        return {"echo": payload["topics"]}
+
+    async def flaky(payload, emit):
+        calls["flaky"] += 1
+        raise RuntimeError("upstream 500")
+
+    async def main():
+        pool = WorkerPool(queue, {"research": ok, "flaky": flaky}, concurrency=2, max_attempts=2, poll_interval=0.01, retry_base=0)
+        good, _ = queue.enqueue("research", {"topics": ["olympus"]})
+        bad, _ = queue.enqueue("flaky", {})
+        pool.start()
+        for _ in range(300):
+            if queue.get(good["id"])["status"] == "succeeded" and queue.get(bad["id"])["status"] == "failed":
+                break
+            await asyncio.sleep(0.01)
+        await pool.stop()
+        return good, bad
+
+    good, bad = asyncio.run(main())
+    job = queue.get(good["id"])
+    assert job["status"] == "succeeded" and job["result"] == {"echo": ["olympus"]}
+    assert [event["event"] for event in queue.events(good["id"])] == [
+        "queued", "started", "stage_started", "stage_finished", "succeeded"
+    ]
+    failed = queue.get(bad["id"])
+    assert failed["status"] == "failed" and "upstream 500" in failed["error"] and calls["flaky"] == 2
+
+
+def test_only_the_worker_holding_the_job_records_its_outcome(tmp_path):
+    queue = make_queue(tmp_path)
+    job, _ = queue.enqueue("research", {"topics": ["a"]})
+    queue.claim("slow-worker", lease=-1)
+    queue.claim("w2")
+    assert not queue.finish(job["id"], "slow-worker", "succeeded", result={"by": "slow-worker"})
+    assert not queue.retry(job["id"], "slow-worker", "late error", delay=0)
+    assert not queue.heartbeat(job["id"], "slow-worker")
+    assert queue.finish(job["id"], "w2", "succeeded", result={"by": "w2"})
+    assert queue.get(job["id"])["result"] == {"by": "w2"}
+
+
+def test_a_job_that_keeps_killing_its_worker_is_failed(tmp_path):
+    queue = make_queue(tmp_path)
+    job, _ = queue.enqueue("research", {"topics": ["a"]})
+    next_job, _ = queue.enqueue("research", {"topics": ["b"]})
+    queue.claim("w1", lease=-1, max_attempts=2)
+    queue.claim("w2", lease=-1, max_attempts=2)
+    # both attempts died: the job is failed, the next one is claimed instead
+    assert queue.claim("w3", max_attempts=2)["id"] == next_job["id"]
+    failed = queue.get(job["id"])
+    assert failed["status"] == "failed" and failed["attempts"] == 2 and "lease expired" in failed["error"]
+
+
+def test_heartbeat_keeps_a_long_job_from_running_twice(tmp_path):
+    queue = make_queue(tmp_path)
+    runs = []
+
+    async def slow(payload, emit):
+        runs.append(1)
+        await asyncio.sleep(0.3)
+        return {"ok": True}
+
+    async def main():
+        # the job runs for six leases, the idle second worker must not take it over
+        pool = WorkerPool(queue, {"research": slow}, concurrency=2, poll_interval=0.01, lease=0.05)
+        job, _ = queue.enqueue("research", {})
+        pool.start()
+        for _ in range(100):
+            if queue.get(job["id"])["status"] == "succeeded":
+                break
+            await asyncio.sleep(0.01)
+        await pool.stop()
+        return job
+
+    job = asyncio.run(main())
+    assert queue.get(job["id"])["status"] == "succeeded" and queue.get(job["id"])["attempts"] == 1
+    assert runs == [1]
@@ -0,0 +1,64 @@
+# typed structured_data record: lenient parsing once, an explicit Unknown, the rules read the parsed values
+
+import pickle
+
+import pytest
+
+from api.rules.record import MISSING, UNKNOWN, parse_float, parse_int, parse_lower, parse_year, record_type
+from api.rules.rule_engine import RuleEngine
+from api.rules.rules_logic import Record, product_dependency, supplier_concentration
+from api.rules.spec import RuleSet, SpecError
+
+
+@pytest.mark.parametrize("parse, value, expected", [
+    (parse_float, "35%", 35.0),
+    (parse_float, " 35 % ", 35.0),
+    (parse_float, "1,200.5", 1200.5),
+    (parse_float, 12, 12.0),
+    (parse_float, "Unknown", UNKNOWN),
+    (parse_float, None, UNKNOWN),
+    (parse_int, "12.0", 12),
+    (parse_int, "1e3", 1000),
+    (parse_int, float("nan"), UNKNOWN),
+    (parse_year, "2019-05-01", 2019),
+    (parse_year, "since 2019", 2019),
+    (parse_year, "n/a", UNKNOWN),
+    (parse_lower, True, "yes"),
+    (parse_lower, ["ISO 9001", "ISO 14001"], "iso 9001, iso 14001"),
+    (parse_lower, None, UNKNOWN),
+])
+def test_parsers(parse, value, expected):
+    result = parse(value)
+    assert result is UNKNOWN if expected is UNKNOWN else result == expected
+
+
+def test_percent_strings_are_scored_instead_of_falling_back():
+    assert product_dependency({"top_product_revenue_share": "35%"}) == "Flag"
+    assert product_dependency({"top_product_revenue_share": "Unknown"}) == "Review"  # on_error
+    with pytest.raises(ValueError, match="top_supplier_share"):
+        supplier_concentration({"top_supplier_share": "Unknown"})
+
+
+def test_record_is_parsed_once_and_scored_like_the_dict():
+    data = {"registration_year": "2001-03-01", "top_client_share": "55%", "status": "Active", "certifications": ["ISO 14001"]}
+    record = Record.from_data(data)
+    assert not hasattr(record, "__dict__")
+    assert record.registration_year == 2001 and record.top_client_share == 55.0
+    assert record.media_score is MISSING and "media_score" not in record.to_dict()
+    plan = RuleEngine.compile("manufacturer")
+    assert plan.evaluate(record) == plan.evaluate(data)
+    assert plan.evaluate(record)["customer_concentration"] == "Flag"
+    assert pickle.loads(pickle.dumps(UNKNOWN)) is UNKNOWN
+
+
+def test_record_fields_must_be_consistent():
+    with pytest.raises(ValueError):
+        record_type({"class": "int"})
+    with pytest.raises(ValueError):
+        record_type({"from_data": "int"})  # would shadow the generated classmethod
+    spec = {"rules": {
+        "a": {"inputs": {"x": {"field": "x", "as": "int"}}, "cases": [], "default": "OK"},
+        "b": {"inputs": {"x": {"field": "x", "as": "lower"}}, "cases": [], "default": "OK"},
+    }}
+    with pytest.raises(SpecError):
+        RuleSet(spec)
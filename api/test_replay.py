@@ -0,0 +1,54 @@
+# record / replay of agent runs: a recorded pipeline replays offline with the same outputs
+
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from api import runner
+from api.replay import FixtureStore, ReplayMiss, ReplayRunner, StubRunner
+
+agent = SimpleNamespace(name="Research Agent", model="gpt-4.1", instructions="Research the company.", output_type=None)
+
+
+def answer(agent, prompt, stage_name):
+    return f"{stage_name}: {prompt[::-1]}"
+
+
+@pytest.fixture(autouse=True)
+def live_runner_afterwards():
+    yield
+    runner.use_runner(None)
+
+
+def run(prompt, stage_name="research"):
+    return asyncio.run(runner.run_agent(agent, prompt, stage_name)).final_output
+
+
+def test_record_then_replay(tmp_path):
+    store = FixtureStore(str(tmp_path))
+    runner.use_runner(StubRunner(answer), record_to=store)
+    recorded = run("Today is May 01, 2026. Research Olympus.")
+    assert len(list(tmp_path.iterdir())) == 1
+
+    runner.use_runner(ReplayRunner(store))
+    # dates are masked in the key, a recording keeps replaying on later days
+    assert run("Today is June 30, 2027. Research Olympus.") == recorded
+    with pytest.raises(ReplayMiss):
+        run("Research Boeing.")
+    with pytest.raises(ReplayMiss):
+        run("Today is May 01, 2026. Research Olympus.", stage_name="gap_fill")
+
+
+def test_replayed_stream(tmp_path):
+    store = FixtureStore(str(tmp_path))
+    runner.use_runner(StubRunner(answer), record_to=store)
+    recorded = run("Research Olympus.")
+    runner.use_runner(ReplayRunner(store))
+
+    async def drain():
+        stream = runner.run_agent_streamed(agent, "Research Olympus.", "research")
+        deltas = [event.data.delta async for event in stream.stream_events()]
+        return "".join(deltas), stream.final_output
+
+    assert asyncio.run(drain()) == (recorded, recorded)
@@ -0,0 +1,49 @@
+# tiered model routing: cheap model first, escalation on a failed validation, savings per route
+
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from api import routing, runner
+from api.replay import StubRunner
+
+
+class Agent(SimpleNamespace):
+    def clone(self, **kwargs):
+        return Agent(**{**vars(self), **kwargs})
+
+
+formatter = Agent(name="Formatting Agent", model="o3", instructions="Format it.", output_type=None)
+
+
+@pytest.fixture(autouse=True)
+def fresh_stats(monkeypatch):
+    monkeypatch.setattr(routing, "route_stats", routing.RouteStats())
+    routing.use_router(routing.TieredRouter())
+    yield
+    routing.use_router(None)
+    runner.use_runner(None)
+
+
+def run(prompt, stage_name="newsletter", signals=None, validate=None):
+    return asyncio.run(routing.run_routed(formatter, prompt, stage_name, signals, validate)).final_output
+
+
+def test_cheap_model_kept_when_valid_and_escalated_when_not():
+    runner.use_runner(StubRunner(lambda agent, prompt, stage_name: f"# {agent.model}"))
+    assert run("short text", validate=lambda result: True) == "# gpt-4.1-mini"
+    assert run("short text", validate=lambda result: "o3" in result.final_output) == "# o3"
+
+    rows = {row["route"]: row for row in routing.route_stats.report()}
+    assert rows["gpt-4.1-mini"]["cost_saved_usd"] > 0
+    assert rows["gpt-4.1-mini>o3"]["escalations"] == 1
+
+
+def test_router_signals():
+    router = routing.TieredRouter(long_input=100, max_unknown=2)
+    assert router.route("research", "gpt-4.1", {"known": False}) == ["gpt-4.1"]
+    assert router.route("research", "gpt-4.1", {"known": True}) == ["gpt-4.1-mini", "gpt-4.1"]
+    assert router.route("newsletter", "o3", {"input_chars": 500}) == ["o3"]
+    assert router.route("risk_summary", "o3", {"unknown_fields": 3}) == ["o3"]
+    assert routing.FixedRouter().route("newsletter", "o3", {}) == ["o3"]
@@ -0,0 +1,104 @@
+# declarative rule spec: thresholds and keywords as data, compiled to per-rule functions and one evaluator
+
+import copy
+from datetime import datetime
+
+import pytest
+
+from api.rules.rule_engine import RuleEngine, evaluate_rule
+from api.rules.rules_logic import RULES, RULES_BY_MODULE, RULE_SET, customer_concentration
+from api.rules.spec import RuleSet, SpecError, load_spec
+
+
+@pytest.mark.parametrize("data, flag", [
+    ({"top_client_share": 55}, "Flag"),
+    ({"top_client_share": 10, "top3_clients_share": 60}, "Review"),
+    ({"top_client_share": 10, "top3_clients_share": 40}, "Monitor"),
+    ({"top_client_share": 10, "top3_clients_share": 25}, "OK"),
+    ({"top_client_share": 25, "top3_clients_share": 25}, "Review"),
+    ({"top_client_share": "n/a"}, "Review"),
+])
+def test_threshold_cases(data, flag):
+    assert customer_concentration(data) == flag
+
+
+def test_current_year_operands():
+    year = datetime.now().year
+    business_age = RULE_SET.functions["business_age"]
+    assert business_age({"registration_year": year - 5}) == "OK"
+    assert business_age({"registration_year": year - 2}) == "Monitor"
+    assert business_age({"registration_year": year, "status": "Dissolved"}) == "Flag"
+
+
+def test_evaluator_matches_the_rule_functions():
+    records = [
+        {},
+        {"registration_year": "unknown", "market_presence": "weak", "revenue_trends": "declining", "credit_rating": "bbb"},
+        {"certifications": ["ISO 27001"], "incidents": "minor", "open_cases": "many", "media_score": 1.5},
+        {"top_supplier_share": 40, "pep": "yes", "watchlist_hits": 2, "emission_standard": "Euro 6"},
+    ]
+    for module in RULES_BY_MODULE:
+        plan = RuleEngine.compile(module)
+        for data in records:
+            expected = {}
+            for rule in plan.rules:
+                try:
+                    expected[rule.key] = rule.func(data)
+                except Exception:
+                    expected[rule.key] = "Error"
+            assert plan.evaluate(data) == expected
+
+
+def test_flag_logic_names_the_rule_that_runs():
+    assert RULES["corporate_rating"]["flag_logic"] == "corporate_rating"
+    assert RuleEngine.compile("manufacturer").evaluate({"credit_rating": "ccc"})["corporate_rating"] == "Flag"
+
+
+def test_tuned_spec_without_code_change():
+    spec = copy.deepcopy(load_spec())
+    spec["rules"]["product_dependency"]["cases"][0]["if"]["share"]["<="] = 25
+    spec["rules"]["product_dependency"]["cases"][1]["if"]["share"][">"] = 25
+    tuned = RuleSet(spec)
+    assert RULE_SET.functions["product_dependency"]({"top_product_revenue_share": 18}) == "Monitor"
+    assert tuned.functions["product_dependency"]({"top_product_revenue_share": 18}) == "OK"
+    assert tuned.evaluator({"product_dependency": "product_dependency"})({"top_product_revenue_share": 18}) == {"product_dependency": "OK"}
+
+
+@pytest.mark.parametrize("rule", [
+    {"inputs": {"x": {"field": "x", "as": "decimal"}}, "cases": [], "default": "OK"},
+    {"inputs": {"x": {"field": "x"}}, "cases": [{"if": {"y": {">": 1}}, "then": "Flag"}], "default": "OK"},
+    {"inputs": {"x": {"field": "x"}}, "cases": [{"if": {"x": {">": 1}}, "then": "Red"}], "default": "OK"},
+    {"inputs": {"x": {"field": "x"}}, "cases": [{"if": {"x": {"contains": ""}}, "then": "Flag"}], "default": "OK"},
+    {"inputs": {"x": {"field": "x"}}, "cases": [{"if": {"x": {"matches": "a"}}, "then": "Flag"}], "default": "OK"},
+])
+def test_invalid_spec_is_rejected(rule):
+    with pytest.raises(SpecError):
+        RuleSet({"rules": {"broken": rule}})
+
+
+@pytest.mark.parametrize("key", ["class", "two words", "x(data):\n    import os\ndef y", "_now", "1st"])
+def test_rule_names_must_be_identifiers(key):
+    with pytest.raises(SpecError):
+        RuleSet({"rules": {key: {"inputs": {}, "cases": [], "default": "OK"}}})
+
+
+def test_trace_names_the_case_and_the_values_compared():
+    flag, trace = RULE_SET.traced("product_dependency")({"top_product_revenue_share": "35%"})
+    assert flag == trace["flag"] == "Flag"
+    assert trace["matched"] == "case 4" and trace["condition"] == {"share": {">": 30}}
+    assert trace["inputs"]["share"] == {"field": "top_product_revenue_share", "raw": "35%", "value": 35.0}
+    assert [(test["case"], test["against"], test["result"]) for test in trace["compared"]][-1] == (4, 30, True)
+
+    _, trace = RULE_SET.traced("business_age")({"registration_year": datetime.now().year})
+    assert trace["matched"] == "case 5" and trace["compared"][-1]["against"] == datetime.now().year - 1
+    assert RULE_SET.traced("supplier_concentration")({"top_supplier_share": "n/a"})[1]["matched"] == "on_error of input 'top1'"
+
+
+def test_traces_match_the_untraced_flags():
+    plan = RuleEngine.compile("dealer")
+    for data in ({}, {"open_cases": "12", "severity": "minor"}, {"pep": True, "media_score": "1.5"}):
+        assert {key: trace["flag"] for key, trace in plan.trace(data).items()} == plan.evaluate(data)
+    result = evaluate_rule("legal_disputes", {"open_cases": "4"}, trace=True)
+    assert result["flag"] == "Review" and result["trace"]["matched"] == "case 2"
+    assert "trace" not in evaluate_rule("legal_disputes", {"open_cases": "4"})
+    assert "_trace(" not in RULE_SET.sources["legal_disputes"]
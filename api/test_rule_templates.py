@@ -0,0 +1,28 @@
+# precompiled rule templates: missing fields render as Unknown instead of turning the rule into Error
+
+from api.rules.rule_engine import CompiledTemplate, RuleEngine, template_consistency
+
+
+def test_missing_and_none_fields_render_unknown():
+    simple = CompiledTemplate.parse("share={share}, flag={flag}")
+    assert simple.render({"flag": "OK"}) == "share=Unknown, flag=OK"
+    assert simple.render({"flag": "OK", "share": None}) == "share=Unknown, flag=OK"
+    assert simple.render({"flag": "OK", "share": 35}) == "share=35, flag=OK"
+    formatted = CompiledTemplate.parse("share={share:>4}%")
+    assert not formatted.simple and formatted.render({"share": 35}) == "share=  35%"
+    assert formatted.render({}) == "share=Unknown%"
+
+
+def test_rule_without_template_field_keeps_its_flag():
+    # the research schema asks for top_50_percent_revenue, the template reads top_client_share
+    data = {"top3_clients_share": 10, "top_50_percent_revenue": "Unknown"}
+    flags, explanations = RuleEngine.compile("manufacturer").evaluate_with_explanations(data)
+    assert flags["customer_concentration"] == "OK"
+    assert "top_client_share=Unknown" in next(e for e in explanations if e.startswith("### Customer Concentration"))
+
+
+def test_consistency_report():
+    issues = {(issue["rule"], issue["field"]): issue for issue in template_consistency({"registration_year", "status"})}
+    assert not issues[("customer_concentration", "top_client_share")]["in_required_data"]
+    assert ("business_age", "registration_year") not in issues
+    assert not issues[("business_age", "last_report_year")]["requested_from_research"]
@@ -0,0 +1,100 @@
+# web search proxy: normalized queries, a TTL cache, one upstream call per concurrent query, offline fixtures
+
+import asyncio
+import json
+from types import SimpleNamespace
+
+import pytest
+
+from api.cache import MemoryBackend
+from api.deals import search_log
+from api.search import FixtureIndex, SearchMiss, SearchProxy, build_search_proxy, format_result, normalize_query
+
+
+class CountingSearch:
+    def __init__(self, fail: bool = False):
+        self.queries = []
+        self.fail = fail
+
+    async def search(self, query):
+        self.queries.append(query)
+        await asyncio.sleep(0.01)
+        if self.fail:
+            raise RuntimeError("upstream down")
+        return {"query": query, "text": f"results for {query}", "sources": [{"title": "", "url": "https://example.com"}]}
+
+
+@pytest.mark.parametrize("a, b", [
+    ("listafirme.ro Dataworks SRL", "  dataworks   srl listafirme.ro "),
+    ("Société Générale annual report", "societe generale Annual Report?"),
+    ('"acme motors" parent company', 'parent company "Acme  Motors"'),
+    ("acme revenue 2024.", "acme, revenue, 2024"),
+])
+def test_variants_share_a_key(a, b):
+    assert normalize_query(a) == normalize_query(b)
+
+
+def test_quoted_phrases_keep_their_word_order():
+    assert normalize_query('"motors acme"') != normalize_query('"acme motors"')
+    assert normalize_query("acme 2023") != normalize_query("acme 2024")
+
+
+def test_cache_hit_and_ttl():
+    upstream = CountingSearch()
+    proxy = SearchProxy(upstream, MemoryBackend(), ttl=60)
+    first = asyncio.run(proxy.search("Acme revenue 2024"))
+    assert asyncio.run(proxy.search("acme  REVENUE 2024")) == first
+    assert upstream.queries == ["Acme revenue 2024"]
+    assert (proxy.hits, proxy.misses, proxy.upstream_calls) == (1, 1, 1)
+
+    expired = SearchProxy(upstream, MemoryBackend(), ttl=0)
+    asyncio.run(expired.search("acme"))
+    asyncio.run(expired.search("acme"))
+    assert expired.upstream_calls == 2
+
+
+def test_concurrent_identical_queries_go_upstream_once():
+    upstream = CountingSearch()
+    proxy = SearchProxy(upstream, MemoryBackend())
+
+    async def main():
+        return await asyncio.gather(*(proxy.search(query) for query in ["acme ceo", "ACME CEO", "ceo acme", "acme cfo"]))
+
+    results = asyncio.run(main())
+    assert len(upstream.queries) == 2 and results[0] == results[1] == results[2]
+    assert proxy.stats()["coalesced"] == 2
+
+
+def test_failures_are_not_cached():
+    upstream = CountingSearch(fail=True)
+    proxy = SearchProxy(upstream, MemoryBackend())
+    for _ in range(2):
+        with pytest.raises(RuntimeError):
+            asyncio.run(proxy.search("acme"))
+    assert proxy.upstream_calls == 2
+
+
+def test_recorded_results_replay_offline(tmp_path):
+    recording = SearchProxy(CountingSearch(), MemoryBackend(), fixtures=FixtureIndex(str(tmp_path)))
+    recorded = asyncio.run(recording.search("listafirme.ro Dataworks SRL"))
+    (tmp_path / "hand-written.json").write_text(json.dumps({"query": "Acme Motors dealer network", "text": "12 dealers"}))
+
+    offline = SearchProxy(FixtureIndex(str(tmp_path)), MemoryBackend())
+    assert asyncio.run(offline.search("dataworks srl listafirme.ro"))["text"] == recorded["text"]
+    assert format_result(asyncio.run(offline.search("acme motors dealer network"))) == "12 dealers"
+    with pytest.raises(SearchMiss):
+        asyncio.run(offline.search("never recorded"))
+
+
+def test_search_cache_has_its_own_sqlite_table(tmp_path, monkeypatch):
+    # shared with the research cache file, evicting search results must not evict research payloads
+    monkeypatch.setenv("SEARCH_CACHE_BACKEND", "sqlite")
+    monkeypatch.setenv("SEARCH_CACHE_PATH", str(tmp_path / "cache.db"))
+    assert build_search_proxy("fixtures").backend.table == "cache_search"
+
+
+def test_proxied_searches_are_logged_like_hosted_ones():
+    proxied = SimpleNamespace(raw_item=SimpleNamespace(type="function_call", name="web_search", arguments='{"query": "acme ceo"}'))
+    hosted = SimpleNamespace(raw_item=SimpleNamespace(type="web_search_call", action=SimpleNamespace(query="acme cfo")))
+    other = SimpleNamespace(raw_item=SimpleNamespace(type="function_call", name="lookup", arguments='{"query": "x"}'))
+    assert search_log(SimpleNamespace(new_items=[proxied, hosted, other])) == (["acme ceo", "acme cfo"], [])
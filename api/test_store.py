@@ -0,0 +1,36 @@
+# vetting store: append-only history per company, flag queries over the latest result or every result
+
+from api.store import VettingStore
+
+
+def result(company_name: str, flags: dict, entity_type: str = "manufacturer") -> dict:
+    return {"entity_type": entity_type, "company_name": company_name, "content": "report", "structured_data": {}, "flags": flags}
+
+
+def test_history_is_append_only_and_newest_first(tmp_path):
+    store = VettingStore(str(tmp_path / "vetting.db"))
+    first = store.record(result("Olympus ", {"reputation": "Flag"}), created_at=1.0)
+    second = store.record(result("olympus", {"reputation": "OK"}), created_at=2.0)
+    store.record(result("olympus", {"reputation": "OK"}, entity_type="dealer"), created_at=3.0)
+
+    history = store.history("OLYMPUS", "manufacturer")
+    assert [row["id"] for row in history] == [second, first]
+    assert history[0]["flags"] == {"reputation": "OK"} and history[1]["flags"] == {"reputation": "Flag"}
+    assert len(store.history("olympus")) == 3
+    assert store.latest("olympus", "manufacturer")["id"] == second
+    assert sorted(store.companies()) == [("dealer", "olympus"), ("manufacturer", "olympus")]
+
+
+def test_query_current_only_looks_at_the_latest_result(tmp_path):
+    store = VettingStore(str(tmp_path / "vetting.db"))
+    store.record(result("olympus", {"reputation": "Flag"}))
+    store.record(result("olympus", {"reputation": "OK"}))  # resolved since
+    still_flagged = store.record(result("boeing", {"reputation": "Flag"}))
+    store.record(result("boeing", {"reputation": "Flag"}, entity_type="dealer"))
+
+    current = store.query("reputation", "Flag", entity_type="manufacturer")
+    assert [(row["company_name"], row["result_id"]) for row in current] == [("boeing", still_flagged)]
+    every = store.query("reputation", "Flag", entity_type="manufacturer", current=False)
+    assert sorted(row["company_name"] for row in every) == ["boeing", "olympus"]
+    assert len(store.query("reputation", "Flag")) == 2  # both entity types
+    assert store.query("reputation", "Review") == []
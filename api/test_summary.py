@@ -0,0 +1,29 @@
+# local risk summary: precompiled sections from the rule metadata, no agent call
+
+import pytest
+
+from api.rules.rule_engine import RuleEngine
+from api.rules.rules_logic import RULES, RULES_BY_MODULE
+from api.rules.summary import compile_summary, format_value
+
+
+@pytest.mark.parametrize("module", sorted(RULES_BY_MODULE))
+def test_every_rule_and_flag_renders(module):
+    plan = compile_summary(module)
+    for flag in ("OK", "Monitor", "Review", "Flag", "Error"):
+        sections = plan.render_sections({rule.key: flag for rule in plan.rules}, {})
+        for key, section in sections.items():
+            assert section.startswith("### ") and RULES[key]["name"] in section and f"({flag})" in section
+
+
+def test_all_ok_company():
+    data = {"traceability": "full", "traceability_system": "RFID", "certifications": "ISO 14001", "incidents": "none"}
+    flags = RuleEngine.compile("asset").evaluate(data)
+    assert set(flags.values()) == {"OK"}
+    summary = compile_summary("asset").render(flags, data)
+    assert summary.count("✅") == 2 and "ISO 14001" in summary and RULES["asset_traceability"]["example_ok"] in summary
+
+
+def test_format_value():
+    assert [format_value(value) for value in (None, "", 35.0, 20.75, ["a", "b"], 2010)] == ["Unknown", "Unknown", "35", "20.75", "a, b", "2010"]
+    assert format_value(0.125) == "0.125" and format_value(1e-7) == "1e-07"  # numbers are never rounded
@@ -0,0 +1 @@
+# standalone benchmark scripts, run from the repo root with `python -m benchmarks.<name>`
@@ -0,0 +1,65 @@
+# compares scoring the columnar rules over a whole portfolio against calling the scalar rule functions record by record
+# on the same structured_data dicts: building the columns is timed as part of the columnar path, then rescoring them alone
+# usage: python -m benchmarks.columnar [--records 100000] [--repeat 3]
+
+import argparse
+import time
+
+from api.rules.columnar import VECTORIZED_RULES, columns_from_records, score_columns
+from api.rules.rules_logic import RULE_SET
+
+from .profiles import make_profiles
+
+
+def scalar_flags(records: list) -> dict:
+    flags = {}
+    for key in VECTORIZED_RULES:
+        rule = RULE_SET.functions[key]
+        column = []
+        for data in records:
+            try:
+                column.append(rule(data))
+            except Exception:
+                column.append("Error")
+        flags[key] = column
+    return flags
+
+
+def columnar_flags(records: list) -> dict:
+    return score_columns(columns_from_records(records))
+
+
+def bench(label: str, fn, records, repeat: int, n: int) -> float:
+    elapsed = min(_timed(fn, records) for _ in range(repeat))
+    print(f"{label:<34} {elapsed:8.3f}s  {elapsed / n * 1e6:8.2f} us/record")
+    return elapsed
+
+
+def _timed(fn, records) -> float:
+    started = time.perf_counter()
+    fn(records)
+    return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--records", type=int, default=100_000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    records = make_profiles(args.records)
+
+    # both paths must agree before their timings mean anything
+    expected = scalar_flags(records[:1000])
+    assert {key: list(flags) for key, flags in columnar_flags(records[:1000]).items()} == expected
+
+    print(f"{args.records} records, {len(VECTORIZED_RULES)} rules, best of {args.repeat}")
+    scalar = bench("scalar rule functions (dicts)", scalar_flags, records, args.repeat, args.records)
+    columnar = bench("columns_from_records + score", columnar_flags, records, args.repeat, args.records)
+    columns = columns_from_records(records)
+    rescored = bench("score_columns (columns built)", score_columns, columns, args.repeat, args.records)
+    print(f"speedup: {scalar / columnar:.2f}x from the dicts, {scalar / rescored:.2f}x rescoring built columns")
+
+
+if __name__ == "__main__":
+    main()
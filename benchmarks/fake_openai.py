@@ -0,0 +1,115 @@
+# minimal OpenAI-compatible server (Responses API) for exercising the client layer without a real key
+# answers POST /v1/responses (plain and stream=true) with a canned message after an optional latency,
+# can inject 429 / 5xx failures and enforces its own requests-per-minute limit like the real API
+# usage: python -m benchmarks.fake_openai [--port 8787] [--latency 0.2] [--fail-rate 0.1] [--rpm 60]
+#        then run the API with OPENAI_BASE_URL=http://127.0.0.1:8787/v1
+
+import argparse
+import asyncio
+import json
+import random
+import time
+import uuid
+from collections import deque
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+
+class FakeOpenAI:
+    def __init__(self, text: str = "fake answer", latency: float = 0.0, fail_rate: float = 0.0,
+                 fail_first: int = 0, fail_status: int = 429, retry_after: float = 0.05, rpm: int = 0):
+        self.text = text
+        self.latency = latency
+        self.fail_rate = fail_rate
+        self.fail_first = fail_first
+        self.fail_status = fail_status
+        self.retry_after = retry_after
+        self.rpm = rpm
+        self.requests = []  # (time, model, status) of every request
+        self._window = deque()
+        self.app = FastAPI()
+        self.app.post("/v1/responses")(self.responses)
+
+    def _rejection(self):
+        now = time.monotonic()
+        while self._window and now - self._window[0] > 60:
+            self._window.popleft()
+        if self.rpm and len(self._window) >= self.rpm:
+            return 429
+        self._window.append(now)
+        if len(self.requests) < self.fail_first or random.random() < self.fail_rate:
+            return self.fail_status
+        return None
+
+    def response(self, model: str, text: str, prompt_chars: int) -> dict:
+        return {
+            "id": f"resp_{uuid.uuid4().hex}",
+            "object": "response",
+            "created_at": int(time.time()),
+            "model": model,
+            "status": "completed",
+            "output": [{
+                "id": f"msg_{uuid.uuid4().hex}",
+                "type": "message",
+                "role": "assistant",
+                "status": "completed",
+                "content": [{"type": "output_text", "text": text, "annotations": []}],
+            }],
+            "parallel_tool_calls": True,
+            "tool_choice": "auto",
+            "tools": [],
+            "usage": {
+                "input_tokens": prompt_chars // 4,
+                "input_tokens_details": {"cached_tokens": 0},
+                "output_tokens": len(text) // 4,
+                "output_tokens_details": {"reasoning_tokens": 0},
+                "total_tokens": prompt_chars // 4 + len(text) // 4,
+            },
+        }
+
+    async def responses(self, request: Request):
+        body = await request.json()
+        model = body.get("model", "")
+        status = self._rejection()
+        self.requests.append((time.monotonic(), model, status or 200))
+        if status:
+            return JSONResponse(
+                {"error": {"message": "injected failure", "type": "rate_limit_error" if status == 429 else "server_error"}},
+                status_code=status,
+                headers={"retry-after-ms": str(int(self.retry_after * 1000))},
+            )
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        response = self.response(model, self.text, len(json.dumps(body.get("input", ""))))
+        if not body.get("stream"):
+            return response
+        return StreamingResponse(self.stream(response), media_type="text/event-stream")
+
+    async def stream(self, response: dict):
+        item_id = response["output"][0]["id"]
+        events = [{"type": "response.created", "response": {**response, "status": "in_progress", "output": []}}]
+        for i in range(0, len(self.text), 8):
+            events.append({"type": "response.output_text.delta", "item_id": item_id, "output_index": 0,
+                           "content_index": 0, "delta": self.text[i:i + 8], "logprobs": []})
+        events.append({"type": "response.completed", "response": response})
+        for sequence_number, event in enumerate(events):
+            yield f"event: {event['type']}\ndata: {json.dumps({**event, 'sequence_number': sequence_number})}\n\n"
+            await asyncio.sleep(0)
+
+
+def main():
+    import uvicorn
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, default=8787)
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--fail-rate", type=float, default=0.0)
+    parser.add_argument("--rpm", type=int, default=0)
+    args = parser.parse_args()
+    server = FakeOpenAI(latency=args.latency, fail_rate=args.fail_rate, rpm=args.rpm)
+    uvicorn.run(server.app, host="127.0.0.1", port=args.port)
+
+
+if __name__ == "__main__":
+    main()
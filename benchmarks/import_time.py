@@ -0,0 +1,65 @@
+# cold-start budget for the Vercel Python function
+# imports api.agents in fresh interpreters with `python -X importtime`, reports the heaviest modules and
+# exits non-zero when the median cumulative import time goes over budget or a deferred heavy
+# dependency (agents SDK, openai, numpy) sneaks back into the import path
+# usage: python -m benchmarks.import_time [--runs 5] [--budget-ms 500]
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+MODULE = "api.agents"
+DEFERRED = ("agents", "openai", "numpy")
+
+
+def measure(module: str) -> dict:
+    """{module name: cumulative microseconds} for one fresh interpreter"""
+    env = {**os.environ, "OPENAI_API_KEY": os.environ.get("OPENAI_API_KEY", "import-time-benchmark")}
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        env=env,
+        check=True,
+    )
+    cumulative = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, self_us, total_us, name = (part.strip() for part in line.replace("import time:", "|", 1).split("|"))
+        cumulative[name] = int(total_us)
+    return cumulative
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--budget-ms", type=float, default=float(os.getenv("IMPORT_TIME_BUDGET_MS", "500")))
+    parser.add_argument("--top", type=int, default=10)
+    args = parser.parse_args()
+
+    runs = [measure(MODULE) for _ in range(args.runs)]
+    median_ms = statistics.median(run[MODULE] for run in runs) / 1000
+    last = runs[-1]
+
+    print(f"{MODULE}: median {median_ms:.1f} ms over {args.runs} runs (budget {args.budget_ms:.0f} ms)")
+    print("heaviest top-level imports:")
+    top_level = {name: us for name, us in last.items() if "." not in name and name != MODULE.split(".")[0]}
+    for name, us in sorted(top_level.items(), key=lambda item: -item[1])[: args.top]:
+        print(f"  {name:<24} {us / 1000:8.1f} ms")
+
+    failures = []
+    if median_ms > args.budget_ms:
+        failures.append(f"import time {median_ms:.1f} ms is over the {args.budget_ms:.0f} ms budget")
+    leaked = [name for name in DEFERRED if name in last]
+    if leaked:
+        failures.append(f"deferred modules imported at startup: {', '.join(leaked)}")
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+# end-to-end pipeline benchmark without live LLM calls
+# drives /research, /format and /reevaluate (rule evaluation) through the FastAPI ASGI app in-process,
+# with every agent run answered by a StubRunner after a configurable latency (or by recorded fixtures)
+# reports throughput, p50 / p95 / p99 latency and traced memory per in-flight request per concurrency level
+# usage: python -m benchmarks.pipeline [--concurrency 1,4,16,64,256] [--requests 256] [--latency 0.05]
+#        [--endpoints research,format,rules] [--replay-dir api/fixtures/replay] [--json baseline.json]
+
+import argparse
+import asyncio
+import json
+import os
+import secrets
+import sys
+import tempfile
+import time
+import tracemalloc
+import zlib
+
+# isolated, throwaway state: the benchmark must not touch the real cache / history
+os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+_STATE_DIR = tempfile.mkdtemp(prefix="pipeline-bench-")
+os.environ["VETTING_DB_PATH"] = os.path.join(_STATE_DIR, "vetting.db")
+os.environ["JOBS_DB_PATH"] = os.path.join(_STATE_DIR, "jobs.db")
+os.environ["RESEARCH_CACHE_BACKEND"] = "memory"
+os.environ["RESEARCH_CACHE_PATH"] = os.path.join(_STATE_DIR, "research_cache.db")
+os.environ["SEARCH_CACHE_PATH"] = os.path.join(_STATE_DIR, "search_cache.db")
+
+import httpx
+
+from api import runner
+from api.agents import app
+from api.replay import FixtureStore, ReplayRunner, StubRunner
+
+from .profiles import make_profiles
+
+FILLER = "The company reported stable results and expanded its dealer network across Europe. " * 40
+
+
+def stub_output(agent, prompt, stage_name: str) -> str:
+    """deterministic, realistically sized answer for every stage of the pipeline"""
+    if stage_name == "research":
+        data = make_profiles(1, seed=zlib.crc32(prompt.encode("utf-8")))[0]
+        return f"**Company - Comprehensive Risk Analysis**\n\n{FILLER}\n\n```json\n{json.dumps(data, indent=2)}\n```"
+    if stage_name == "gap_fill":
+        return "```json\n{}\n```"
+    if stage_name == "risk_sections":
+        # echo the marked sections back, the way the formatting agent is asked to
+        return prompt.split("\n\n", 1)[1]
+    return "## Summary\n\n" + FILLER[:1500]
+
+
+def percentile(values: list, q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, int(round(q / 100 * len(ordered) + 0.5)) - 1))]
+
+
+def unique_company() -> str:
+    # random tokens so the name index never resolves two benchmark companies to one entry
+    return f"manufacturer: {secrets.token_hex(6)} {secrets.token_hex(4)}"
+
+
+def make_request(endpoint: str, i: int) -> tuple:
+    if endpoint == "research":
+        return "/research", {"topics": [unique_company()], "refresh": True}
+    if endpoint == "format":
+        return "/format", {"raw_content": FILLER, "topics": [unique_company()]}
+    data = make_profiles(1, seed=i)[0]
+    return "/reevaluate", {"entity_type": "manufacturer", "company_name": f"bench {i % 16}", "structured_data": data}
+
+
+async def drive(client: httpx.AsyncClient, endpoint: str, total: int, concurrency: int) -> tuple:
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+    errors = 0
+
+    async def one(i: int):
+        nonlocal errors
+        path, body = make_request(endpoint, i)
+        async with semaphore:
+            started = time.perf_counter()
+            response = await client.post(path, json=body)
+            latencies.append(time.perf_counter() - started)
+            if response.status_code != 200 or (response.json() or {}).get("error"):
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(total)))
+    return time.perf_counter() - started, latencies, errors
+
+
+async def measure_memory(client: httpx.AsyncClient, endpoint: str, concurrency: int) -> float:
+    """traced peak allocation of one wave of `concurrency` requests, per request (KiB)"""
+    tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+    tracemalloc.reset_peak()
+    await drive(client, endpoint, concurrency, concurrency)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return (peak - baseline) / concurrency / 1024
+
+
+async def run(args) -> list:
+    transport = httpx.ASGITransport(app=app)
+    rows = []
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        for endpoint in args.endpoints:
+            await drive(client, endpoint, 4, 4)  # warm-up: agent construction, compiled rule plans, sqlite
+            for concurrency in args.concurrency:
+                total = max(args.requests, concurrency)
+                elapsed, latencies, errors = await drive(client, endpoint, total, concurrency)
+                memory = await measure_memory(client, endpoint, concurrency) if args.memory else None
+                rows.append({
+                    "endpoint": endpoint,
+                    "concurrency": concurrency,
+                    "requests": total,
+                    "errors": errors,
+                    "throughput_rps": round(total / elapsed, 1),
+                    "p50_ms": round(percentile(latencies, 50) * 1000, 1),
+                    "p95_ms": round(percentile(latencies, 95) * 1000, 1),
+                    "p99_ms": round(percentile(latencies, 99) * 1000, 1),
+                    "kib_per_request": round(memory, 1) if memory is not None else None,
+                })
+                print_row(rows[-1])
+    return rows
+
+
+def print_row(row: dict) -> None:
+    memory = f"{row['kib_per_request']:>10.1f}" if row["kib_per_request"] is not None else f"{'-':>10}"
+    print(
+        f"{row['endpoint']:<10} {row['concurrency']:>5} {row['requests']:>7} {row['errors']:>6} "
+        f"{row['throughput_rps']:>9.1f} {row['p50_ms']:>9.1f} {row['p95_ms']:>9.1f} {row['p99_ms']:>9.1f} {memory}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--concurrency", default="1,2,4,8,16,32,64,128,256")
+    parser.add_argument("--requests", type=int, default=256, help="requests per level (at least the concurrency)")
+    parser.add_argument("--latency", type=float, default=0.05, help="stub seconds per agent run")
+    parser.add_argument("--research-latency", type=float, default=None, help="override for the research stage")
+    parser.add_argument("--endpoints", default="research,format,rules")
+    parser.add_argument("--replay-dir", default=None, help="answer from recorded fixtures instead of the stub")
+    parser.add_argument("--no-memory", dest="memory", action="store_false", help="skip the tracemalloc pass")
+    parser.add_argument("--json", default=None, help="write the rows to this file as a baseline")
+    args = parser.parse_args()
+    args.concurrency = [int(c) for c in args.concurrency.split(",")]
+    args.endpoints = args.endpoints.split(",")
+
+    if args.replay_dir:
+        runner.use_runner(ReplayRunner(FixtureStore(args.replay_dir), args.latency))
+    else:
+        stage_latency = {"research": args.research_latency} if args.research_latency is not None else None
+        runner.use_runner(StubRunner(stub_output, args.latency, stage_latency))
+
+    print(f"python {sys.version.split()[0]}, stub latency {args.latency}s per agent run")
+    print(f"{'endpoint':<10} {'conc':>5} {'reqs':>7} {'errors':>6} {'req/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'KiB/req':>10}")
+    rows = asyncio.run(run(args))
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"latency": args.latency, "rows": rows}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,40 @@
+# synthetic structured_data records shared by the benchmarks
+
+import random
+
+STATUSES = ["active", "inactive", "dormant", "liquidated", "dissolved", "Unknown"]
+PRESENCE = ["strong global brand", "moderate regional presence", "weak", "Unknown"]
+TRENDS = ["stable", "declining", "moderate growth", "Unknown"]
+INCIDENTS = ["none", "minor fine in 2021", "major breach", "Unknown"]
+
+
+def make_profile(rng: random.Random) -> dict:
+    return {
+        "registration_year": rng.choice([rng.randint(1950, 2026), "Unknown"]),
+        "status": rng.choice(STATUSES),
+        "last_report_year": rng.choice([rng.randint(2015, 2026), "Unknown"]),
+        "market_presence": rng.choice(PRESENCE),
+        "dealer_network": f"{rng.randint(0, 500)} dealers",
+        "revenue_trends": rng.choice(TRENDS),
+        "top_product_revenue_share": rng.choice([rng.uniform(0, 100), "35%", "Unknown"]),
+        "product_lines": "several",
+        "top_client_share": rng.uniform(0, 80),
+        "top3_clients_share": rng.uniform(0, 100),
+        "top_supplier_share": rng.uniform(0, 80),
+        "top3_suppliers_share": rng.uniform(0, 100),
+        "number_of_suppliers": rng.randint(1, 400),
+        "traceability_system": "GPS",
+        "methods": "QR codes",
+        "since": 2020,
+        "esg_policy": "yes",
+        "certifications": rng.choice(["ISO 14001", "none", ""]),
+        "measures": "ok",
+        "incidents": rng.choice(INCIDENTS),
+        "credit_rating": rng.choice(["BBB", "B", "CCC", "Unknown"]),
+        "agency": "S&P",
+    }
+
+
+def make_profiles(n: int, seed: int = 0) -> list:
+    rng = random.Random(seed)
+    return [make_profile(rng) for _ in range(n)]
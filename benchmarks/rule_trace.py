@@ -0,0 +1,73 @@
+# cost of rule tracing: none when it is off, what a trace costs when it is on
+# the traced rules are separate functions compiled on first use, plan.evaluate runs the same code object
+# before and after tracing was used; this times it on both sides and checks the code carries no trace calls
+# usage: python -m benchmarks.rule_trace [--records 20000] [--module manufacturer] [--repeat 5]
+
+import argparse
+import time
+
+from api.rules.rule_engine import RuleEngine, evaluate_rule
+from api.rules.rules_logic import RULE_SET, RULES_BY_MODULE
+
+from .profiles import make_profiles
+
+
+def best_of(fn, records: list, repeat: int) -> float:
+    """fastest of `repeat` passes, in us per record"""
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for data in records:
+            fn(data)
+        timings.append(time.perf_counter() - started)
+    return min(timings) / len(records) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--records", type=int, default=20_000)
+    parser.add_argument("--module", default="manufacturer", choices=sorted(RULES_BY_MODULE))
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    records = make_profiles(args.records)
+    plan = RuleEngine.compile(args.module)
+    keys = [rule.key for rule in plan.rules]
+    code = plan.evaluator.__code__
+
+    def per_key(trace):
+        def run(data):
+            for key in keys:
+                try:
+                    evaluate_rule(key, data, trace=trace)
+                except Exception:
+                    pass
+        return run
+
+    print(f"{args.records} records, module={args.module}, best of {args.repeat}")
+    before = best_of(plan.evaluate, records, args.repeat)
+    per_key_before = best_of(per_key(False), records, args.repeat)
+
+    # tracing on: compiles the traced variants and produces full traces
+    for data in records[:1000]:
+        assert {key: trace["flag"] for key, trace in plan.trace(data).items()} == plan.evaluate(data)
+    traced = best_of(plan.trace, records, args.repeat)
+    per_key_traced = best_of(per_key(True), records, args.repeat)
+
+    after = best_of(plan.evaluate, records, args.repeat)
+    per_key_after = best_of(per_key(False), records, args.repeat)
+    assert plan.evaluator.__code__ is code
+    assert "_trace" not in code.co_names
+    assert not [source for source in RULE_SET.sources.values() if "_trace(" in source]
+
+    print(f"{'plan.evaluate, tracing never used':<44} {before:8.2f} us/record")
+    print(f"{'plan.evaluate, after tracing was used':<44} {after:8.2f} us/record  ({after / before - 1:+.1%})")
+    print(f"{'evaluate_rule per key, trace=False':<44} {per_key_before:8.2f} us/record")
+    print(f"{'  after trace=True calls':<44} {per_key_after:8.2f} us/record  ({per_key_after / per_key_before - 1:+.1%})")
+    print(f"{'plan.trace (tracing on)':<44} {traced:8.2f} us/record")
+    print(f"{'evaluate_rule per key, trace=True':<44} {per_key_traced:8.2f} us/record")
+    print("untraced code object unchanged, no trace calls in it")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+# per-render cost of the rule prompt templates
+# str.format(**data) on a complete record (raises KeyError on a missing field) against the precompiled
+# CompiledTemplate.render, on complete records and on records with template fields missing (-> 'Unknown')
+# usage: python -m benchmarks.templates [--records 100000] [--module manufacturer] [--drop 0.3]
+
+import argparse
+import random
+import time
+
+from api.rules.rule_engine import RuleEngine, template_fields
+from api.rules.rules_logic import RULES_BY_MODULE
+
+from .profiles import make_profiles
+
+
+def bench(label: str, fn, records: list, renders: int) -> float:
+    started = time.perf_counter()
+    for data in records:
+        fn(data)
+    elapsed = time.perf_counter() - started
+    print(f"{label:<40} {elapsed:8.3f}s  {elapsed / renders * 1e9:8.0f} ns/render")
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--records", type=int, default=100_000)
+    parser.add_argument("--module", default="manufacturer", choices=sorted(RULES_BY_MODULE))
+    parser.add_argument("--drop", type=float, default=0.3, help="share of template fields removed in the sparse records")
+    args = parser.parse_args()
+
+    templates = [rule.template for rule in RuleEngine.compile(args.module).rules]
+    fields = sorted({field for template in templates for field in template_fields(template.source)} - {"flag"})
+    records = [{**data, "flag": "OK"} for data in make_profiles(args.records)]
+    rng = random.Random(1)
+    sparse = [{key: value for key, value in data.items() if key not in fields or rng.random() > args.drop} for data in records]
+
+    def str_format(data):
+        for template in templates:
+            template.source.format(**data)
+
+    def compiled(data):
+        for template in templates:
+            template.render(data)
+
+    def safe_format(data):
+        # the per-render alternative without precompiling: catch the KeyError and fall back
+        for template in templates:
+            try:
+                template.source.format(**data)
+            except KeyError:
+                template.source.format_map({field: data.get(field, "Unknown") for field in fields + ["flag"]})
+
+    renders = args.records * len(templates)
+    print(f"{args.records} records x {len(templates)} templates, module={args.module}")
+    bench("str.format, complete records", str_format, records, renders)
+    bench("CompiledTemplate.render, complete", compiled, records, renders)
+    bench("str.format + KeyError fallback, sparse", safe_format, sparse, renders)
+    bench("CompiledTemplate.render, sparse", compiled, sparse, renders)
+
+
+if __name__ == "__main__":
+    main()
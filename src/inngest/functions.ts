@@ -48,18 +48,12 @@ export const generateNewsletter = inngest.createFunction(
     }
 
     // Step 1: Call Python Agent
-    const rawAgentContentUnknown = await step.run("call-python-agent", () => callPythonAgent(topics, slug));
-    if (!rawAgentContentUnknown || typeof rawAgentContentUnknown !== 'object' || !('content' in rawAgentContentUnknown)) {
+    // /report runs research once, then formats the newsletter and the risk summary in parallel
+    const reportUnknown = await step.run("call-python-agent", () => callPythonAgent(topics, slug));
+    if (!reportUnknown || typeof reportUnknown !== 'object' || !('content' in reportUnknown)) {
       throw new Error('Python agent did not return expected content');
     }
-    const { content: rawAgentContent, riskSummary } = rawAgentContentUnknown as PythonAgentResponse;
-
-    // Step 2: Format Newsletter with Markdown Agent
-    const formattedContentUnknown = await step.run("format-newsletter", () => formatNewsletter(rawAgentContent, topics, slug));
-    if (typeof formattedContentUnknown !== 'string') {
-      throw new Error('Formatting agent did not return a string');
-    }
-    const formattedContent = formattedContentUnknown;
+    const { content: formattedContent, riskSummary } = reportUnknown as PythonAgentResponse;
 
 
     // Combine the formatted content with the risk summary
@@ -69,7 +63,7 @@ export const generateNewsletter = inngest.createFunction(
     // console.warn("[Inngest] Final content to save:", finalContent.slice(0, 200));
 
 
-    // Step 3: Save Newsletter to Blob
+    // Step 2: Save Newsletter to Blob
     const finalBlobUnknown = await step.run("save-to-blob", () => saveNewsletterToBlob(blobKey, finalContent, slug)).catch((error) => {
       console.error(`[Inngest] Error saving to blob for slug ${slug}:`, error);
       throw new Error(`Failed to save newsletter to blob for slug ${slug}`);
@@ -118,7 +112,7 @@ async function callPythonAgent(topics: string[], slug: string): Promise<PythonAg
   const pythonAgentUrl = getPythonAgentUrl();
   
   try {
-    const response = await fetch(`${pythonAgentUrl}/research`, {
+    const response = await fetch(`${pythonAgentUrl}/report`, {
       method: 'POST',
       headers: {
         'Content-Type': 'application/json',
@@ -154,54 +148,6 @@ async function callPythonAgent(topics: string[], slug: string): Promise<PythonAg
   }
 }
 
-async function formatNewsletter(rawContent: string, topics: string[], slug: string) {
-  // Build the appropriate URL based on environment
-  let pythonAgentUrl: string;
-  if (!process.env.VERCEL) {
-    // Local development
-    pythonAgentUrl = 'http://localhost:8000';
-  } else if (process.env.VERCEL_ENV === 'production' && process.env.VERCEL_PROJECT_PRODUCTION_URL) {
-    // Production environment - use the production URL
-    pythonAgentUrl = `https://${process.env.VERCEL_PROJECT_PRODUCTION_URL}/api/agents`;
-  } else if (process.env.VERCEL_BRANCH_URL) {
-    // Preview environment - use the branch URL which is more stable than VERCEL_URL
-    pythonAgentUrl = `https://${process.env.VERCEL_BRANCH_URL}/api/agents`;
-  } else {
-    // Fallback to deployment URL if nothing else is available
-    pythonAgentUrl = `https://${process.env.VERCEL_URL}/api/agents`;
-  }
-  
-  try {
-    const response = await fetch(`${pythonAgentUrl}/format`, {
-      method: 'POST',
-      headers: {
-        'Content-Type': 'application/json',
-      },
-      body: JSON.stringify({ 
-        raw_content: rawContent,
-        topics: topics 
-      }),
-    });
-
-    if (!response.ok) {
-      console.error(`[Inngest] Formatting agent request failed for slug ${slug}. Status: ${response.status}`);
-      throw new Error(`Formatting agent request failed with status ${response.status}`);
-    }
-
-    const data = await response.json();
-    const content = data.content;
-    
-    if (!content) {
-      throw new Error('Formatting agent returned no content');
-    }
-
-    return content;
-  } catch (error) {
-    console.error(`[Inngest] Formatting agent error for slug ${slug}:`, error);
-    throw error;
-  }
-}
-
 async function saveNewsletterToBlob(blobKey: string, aiFinalContent: string, slug: string) {
   if (typeof aiFinalContent !== "string") {
     console.error(`[Inngest] Invalid content type for slug ${slug}. Expected string, got ${typeof aiFinalContent}`);